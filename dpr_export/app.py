@@ -2,52 +2,605 @@
 from __future__ import annotations
 
 import typing as ty
+import os
+import json
+import time
+import logging
+import functools
+import threading
+from urllib.parse import urlsplit
 
-import sqlalchemy
-import yaml
 import click
-from .db import create_engine
-from .requester import Requester
-from .persistence import clean, unique_key, save
+from . import metrics
+
+if ty.TYPE_CHECKING:
+    import pandas as pd
+    import sqlalchemy as sa
+    from .requester import Requester
+    from .persistence import Persistence
+    from .scheduler import Scheduler
+    from .pipeline import Stage, Pipeline
+    from .planner import Planner
+    from .ledger import Ledger
+    from .lake import ParquetLake
+    from .workqueue import WorkQueue
+
+
+logger = logging.getLogger(__name__)
 
 
 class App(object):
+    """
+    The exporter, wired from the config file.
+
+    Every component (requester, engine, persistence, lake, ledger, ...) is built on first
+    use and its heavy dependencies imported only then, so commands that do not need a
+    database never connect to one. ``setup`` builds them all up front.
 
-    config: ty.Dict[str, ty.Any]
-    engine: sqlalchemy.engine.Engine
+    ``run`` exports the planned reports itself, ``enqueue`` hands them to the ``work``
+    of any number of workers sharing the work queue of the database instead.
+    """
 
+    COMPONENTS = ('scheduler', 'requester', 'engine', 'persistence', 'lake', 'ledger', 'queue')
 
     def __init__(self) -> None:
-        self.config = dict()
-        self.requester = Requester()
+        self.config_file: ty.Optional[str] = None
+        # name of the worker in worker mode, see ``work``
+        self.worker: ty.Optional[str] = None
+        self._slots: ty.Optional[threading.Semaphore] = None
+        self._pipeline: ty.Optional[Pipeline] = None
 
     def configure(self, config_file: ty.AnyStr | ty.Any):
-        with open(config_file, 'r') as f:
-            self.config = yaml.safe_load(f)
-
+        self.config_file = config_file
+        self.__dict__.pop('config', None)
         return self
 
+    @functools.cached_property
+    def config(self) -> ty.Dict[str, ty.Any]:
+        if self.config_file is None:
+            return dict()
+
+        import yaml
+        with open(self.config_file, 'r') as f:
+            return yaml.safe_load(f)
+
+    @functools.cached_property
+    def scheduler(self) -> Scheduler:
+        from .scheduler import Scheduler
+        return Scheduler.from_config(self.config.get('scheduler'))
+
+    @functools.cached_property
+    def requester(self) -> Requester:
+        from .requester import Requester
+        return Requester.from_config(self.config, pool_maxsize=self.scheduler.workers)
+
+    @functools.cached_property
+    def engine(self) -> ty.Optional[sa.engine.Engine]:
+        if not self.config.get('database_url'):
+            return None
+
+        from .db import create_engine
+        return create_engine(self.config['database_url'], **self.config.get('database', dict()))
+
+    @functools.cached_property
+    def persistence(self) -> ty.Optional[Persistence]:
+        if self.engine is None:
+            return None
+
+        from .persistence import Persistence
+        return Persistence(self.engine, loader=self.config.get('loader', 'upsert'),
+                           incremental=bool(self.config.get('incremental')),
+                           rollups=bool(self.config.get('rollups')))
+
+    @functools.cached_property
+    def lake(self) -> ty.Optional[ParquetLake]:
+        if not (self.config.get('lake') or dict()).get('directory'):
+            return None
+
+        from .lake import ParquetLake
+        return ParquetLake.from_config(self.config['lake'])
+
+    @functools.cached_property
+    def ledger(self) -> ty.Optional[Ledger]:
+        if 'ledger' not in self.config:
+            return None
+
+        from .ledger import Ledger
+        return Ledger.from_config(self.config['ledger'], engine=self.engine)
+
+    @functools.cached_property
+    def queue(self) -> ty.Optional[WorkQueue]:
+        if self.engine is None:
+            return None
+
+        from .workqueue import WorkQueue
+        return WorkQueue.from_config(self.config.get('queue'), self.engine)
+
     def setup(self):
-        self.engine = create_engine(self.config['database_url'])
-        return self
+        """
+        Build every configured component now, before worker threads share them.
+        """
+        for name in self.COMPONENTS:
+            getattr(self, name)
 
-    def run(self):
-        for fetch in self.config['fetch']:
-            district = fetch['district']
-            for period in fetch['periods']:
-                data = self.requester.fetch(district=district, **period)
-                df = clean(data)
-                df = unique_key(df, **period)
-                save(df, self.engine)
+        if self.persistence is None and self.lake is None:
+            raise ValueError('Configure a database_url, a lake directory or both')
 
         return self
 
+    def planner(self) -> Planner:
+        from .planner import Planner
+
+        config = self.config.get('planner') or dict()
+        return Planner(self.requester, districts=config.get('districts'))
+
+    def loaded(self, periods: ty.Optional[ty.Iterable[ty.Tuple[int, int]]] = None) -> ty.Set[ty.Tuple[str, int, int]]:
+        """
+        (district, year, month) of the reports already in the database or the lake, of the
+        (year, month) ``periods`` only if given.
+        """
+        periods = None if periods is None else set(periods)
+        loaded = set()
+        if self.persistence is not None:
+            loaded |= self.persistence.loaded(periods)
+        if self.lake is not None:
+            loaded |= {key for key in self.lake.partitions() if periods is None or key[1:] in periods}
+        return loaded
+
+    def plan(self, refresh: bool = False) -> ty.Dict[str, ty.List[ty.Dict[str, ty.Any]]]:
+        """
+        Reports to fetch (``units``) and the ones ``skipped`` because they are loaded already.
+        """
+        planner = self.planner()
+        units = planner.plan(self.config['fetch'])
+        if refresh:
+            return dict(units=units, skipped=list())
+
+        # only reports of closed program years are skipped, the others need not be looked up
+        closed = {(u['year'], u['month']) for u in units if self.requester.is_closed(year=u['year'], month=u['month'])}
+        units, skipped = planner.missing(units, self.loaded(closed))
+        return dict(units=units, skipped=skipped)
+
+    @property
+    def streaming(self) -> ty.Dict[str, ty.Any]:
+        return self.config.get('streaming') or dict()
+
+    @property
+    def pipeline_config(self) -> ty.Dict[str, ty.Any]:
+        return self.config.get('pipeline') or dict()
+
+    def fetch(self, unit: ty.Dict[str, ty.Any]) -> ty.Optional[ty.Dict[str, ty.Any]]:
+        """
+        Fetch stage: download the report, drop it when incremental sync knows it already.
+        """
+        # in worker mode the unit is claimed from the work queue already
+        if self.ledger is not None and not self.ledger.claim(unit) and self.worker is None:
+            logger.info('claimed by another worker or done, skipped: %s', unit)
+            return None
+
+        with self.scheduler.slot(self.host(unit)):
+            if self.streaming.get('enabled'):
+                return dict(unit=unit, stream=self.requester.stream(chunk_size=self.streaming.get('bytes'), **unit))
+
+            # the body is decoded by the parse stage, possibly in another process
+            data, encoding = self.requester.fetch_raw(**unit)
+
+        from .persistence import report_digest
+
+        if self.ledger is not None:
+            self.ledger.fetched(unit, len(data))
+
+        digest = report_digest(data)
+        if self.persistence is not None and self.persistence.is_unchanged(digest=digest, **unit):
+            logger.info('unchanged, skipped: %s', unit)
+            self.done(unit, rows=0)
+            return None
+
+        return dict(unit=unit, data=data, encoding=encoding, digest=digest)
+
+    def load(self, report: ty.Dict[str, ty.Any]) -> ty.Dict[str, ty.Any]:
+        """
+        Load stage: write a parsed report, or parse and write a streamed one chunk by chunk.
+        """
+        from .persistence import clean_chunks, unique_key, DigestReader
+
+        unit = report['unit']
+        if self.ledger is not None:
+            # the report may have waited in the queue, it is not claimed again mid-write
+            self.ledger.renew(unit)
+
+        for stage, seconds, fields in report.pop('timings', ()):
+            metrics.registry.record(stage, seconds, **fields)
+
+        if 'frame' in report:
+            rows = self.save((report['frame'], ), report=unit, digest=report['digest'])
+        else:
+            with report['stream'] as stream:
+                reader = DigestReader(stream)
+                chunks = clean_chunks(reader, chunksize=self.streaming.get('rows') or 5000)
+                rows = self.save((unique_key(df, year=unit['year'], month=unit['month']) for df in chunks),
+                                 report=unit, digest=reader.hexdigest)
+
+        self.done(unit, rows=rows)
+        return dict(unit=unit, rows=rows)
+
+    def done(self, unit: ty.Dict[str, ty.Any], rows: int | None = None) -> None:
+        if self.ledger is not None:
+            self.ledger.done(unit, rows=rows)
+        if self.worker is not None:
+            self.queue.done(unit, self.worker, rows=rows)
+            self._slots.release()
+
+    def failed(self, item: ty.Dict[str, ty.Any], error: Exception) -> None:
+        """
+        Record a report that failed in any stage in the ledger, ``resume`` retries it,
+        and in the work queue, which queues it again.
+        """
+        unit = item.get('unit', item)
+        logger.error('failed: %s: %s: %s', unit, type(error).__name__, error)
+        if self.ledger is not None:
+            self.ledger.failed(unit, error)
+        if self.worker is not None:
+            self.queue.failed(unit, self.worker, error)
+            self._slots.release()
+
+    def save(self, chunks: ty.Iterable[pd.DataFrame], report: ty.Dict[str, ty.Any],
+             digest: str | ty.Callable[[], str]) -> int:
+        """
+        Write the chunks of one report to the database, the lake or both. The lake files
+        are only committed once the database transaction is.
+        """
+        if self.lake is None:
+            return self.persistence.save_chunks(chunks, report=report, digest=digest)
+
+        with self.lake.writer() as writer:
+            if self.persistence is None:
+                for df in chunks:
+                    writer.write(df)
+            else:
+                self.persistence.save_chunks((writer.write(df) for df in chunks), report=report, digest=digest)
+
+        return writer.rows
+
+    def host(self, unit: ty.Dict[str, ty.Any]) -> str:
+        return urlsplit(self.requester.build_url(**unit)).hostname
+
+    def stages(self) -> ty.List[Stage]:
+        from .pipeline import Stage, Pipeline
+        from .persistence import parse_report
+
+        config = self.pipeline_config
+        fetch = config.get('fetch') or dict()
+        parse = config.get('parse') or dict()
+        load = config.get('load') or dict()
+
+        # with a ledger or a work queue a failed report is recorded and the others go on,
+        # without either the run stops
+        on_error = self.failed if self.ledger is not None or self.worker is not None else None
+
+        stages = [Stage('fetch', self.fetch, workers=fetch.get('workers') or self.scheduler.workers,
+                        on_error=on_error)]
+        if not self.streaming.get('enabled'):
+            # reports are parsed in a stage of their own, in processes for multi-core hosts
+            kind = parse.get('kind', 'thread')
+            workers = parse.get('workers', 1)
+            if kind == 'process' and not workers:
+                workers = os.cpu_count()
+            stages.append(Stage('parse', parse_report, workers=workers, kind=kind, on_error=on_error))
+        stages.append(Stage('load', self.load, workers=load.get('workers', 1),
+                            context=self.persistence.connect if self.persistence is not None else None,
+                            on_error=on_error))
+
+        return stages
+
+    def prepare(self, units: ty.List[ty.Dict[str, ty.Any]]) -> None:
+        if self.persistence is not None:
+            # partitions of years seen for the first time, before any loader writes to them
+            self.persistence.attach_partitions({unit['year'] for unit in units})
+
+    def run(self, refresh: bool = False):
+        plan = self.plan(refresh=refresh)
+        logger.info('planned %d reports, %d loaded already', len(plan['units']), len(plan['skipped']))
+
+        if self.ledger is not None:
+            self.ledger.add(plan['units'])
+
+        self.prepare(plan['units'])
+        return self.execute(plan['units'])
+
+    def resume(self):
+        """
+        Run the reports of the ledger that are not done: pending, failed or interrupted.
+        """
+        units = self.ledger.unfinished()
+        logger.info('resuming %d reports', len(units))
+        self.prepare(units)
+        return self.execute(units)
+
+    def enqueue(self, refresh: bool = False) -> int:
+        """
+        Coordinator: put the planned reports into the work queue for the workers.
+        """
+        plan = self.plan(refresh=refresh)
+        self.prepare(plan['units'])
+        queued = self.queue.enqueue(plan['units'])
+        logger.info('queued %d reports, %d loaded already', queued, len(plan['skipped']))
+        return queued
+
+    def claimed(self, wait: bool = False) -> ty.Iterator[ty.Dict[str, ty.Any]]:
+        """
+        Units claimed from the work queue, no more at once than ``queue.prefetch`` (the
+        fetch workers by default) so that the other workers get their share. Ends once
+        the queue is drained, or never with ``wait``, and when the pipeline of ``execute``
+        feeding on it aborts.
+        """
+        config = self.config.get('queue') or dict()
+        poll_seconds = config.get('poll_seconds') or 5
+
+        # the workers of an aborted pipeline stop without releasing the slots of their units
+        while not self._pipeline.aborted:
+            if not self._slots.acquire(timeout=poll_seconds):
+                continue
+
+            units = self.queue.claim(self.worker)
+            if units:
+                yield units[0]
+                continue
+
+            self._slots.release()
+            # units running elsewhere may still come back when their worker died
+            if not wait and self.queue.drained():
+                return
+            time.sleep(poll_seconds)
+
+    def work(self, worker: str | None = None, wait: bool = False):
+        """
+        Worker: export reports claimed from the work queue until it is drained.
+        """
+        from .workqueue import worker_name
+
+        config = self.config.get('queue') or dict()
+        fetch = self.pipeline_config.get('fetch') or dict()
+        self.worker = worker or worker_name()
+        self._slots = threading.Semaphore(config.get('prefetch') or fetch.get('workers') or self.scheduler.workers)
+
+        logger.info('worker %s started', self.worker)
+        try:
+            with self.queue.heartbeats(self.worker):
+                return self.execute(self.claimed(wait=wait))
+        finally:
+            self.worker = None
+
+    def execute(self, units: ty.Iterable[ty.Dict[str, ty.Any]]):
+        from .pipeline import Pipeline
+
+        self.setup()
+        config = self.config.get('metrics') or dict()
+        metrics.registry.configure(config.get('path'))
+        pipeline = self._pipeline = Pipeline(self.stages(), queue_size=self.pipeline_config.get('queue_size'))
+
+        try:
+            stats = pipeline.run(units)
+        finally:
+            metrics.registry.close()
+            if config.get('prometheus'):
+                with open(config['prometheus'], 'w') as f:
+                    f.write(metrics.registry.prometheus())
+
+        logger.info('pipeline: %s', stats)
+        if self.persistence is not None:
+            logger.info('persistence: %s', self.persistence.stats)
+        logger.info('stages: %s', json.dumps(metrics.registry.summary()))
+        if self.ledger is not None:
+            logger.info('ledger: %s', json.dumps(self.ledger.summary()))
+
+        return self
 
 
 @click.group()
 @click.option('--config', '-c', envvar='DPR_EXPORTER_CONFIG_FILE', type=click.Path(),
               default='config.yaml', help='Config file')
+@click.option('--profile', type=click.Path(dir_okay=False), default=None,
+              help='Profile the command with cProfile and tracemalloc, write the report to this file')
+@click.pass_context
+def cli(ctx, config, profile) -> None:
+    logging.basicConfig(level=logging.INFO)
+
+    if profile:
+        from .profiling import Profiler
+        ctx.call_on_close(Profiler(profile).start().stop)
+
+    # nothing is read or connected before a command needs it, `--help` stays instant
+    ctx.dpr_app = App().configure(config)
+
+
+@cli.command()
+@click.option('--refresh', is_flag=True, help='Fetch reports of closed program years again even if loaded')
+@click.pass_context
+def run(ctx, refresh) -> None:
+    ctx.find_root().dpr_app.run(refresh=refresh)
+
+
+@cli.command()
+@click.option('--year', 'years', type=int, multiple=True, help='Rebuild the report periods of these years only')
+@click.pass_context
+def rollups(ctx, years) -> None:
+    """Rebuild the area, division and district rollups from district_perf."""
+    from .rollups import rebuild
+
+    app = ctx.find_root().dpr_app
+    if app.engine is None:
+        raise click.ClickException('Rollups require a database_url')
+
+    click.echo(json.dumps(rebuild(app.engine, years=years or None), indent=2))
+
+
+@cli.command()
+@click.option('--refresh', is_flag=True, help='Queue reports of closed program years again even if loaded')
+@click.pass_context
+def enqueue(ctx, refresh) -> None:
+    """Queue the planned reports for `worker` processes."""
+    app = ctx.find_root().dpr_app
+    if app.queue is None:
+        raise click.ClickException('The work queue requires a database_url')
+
+    app.enqueue(refresh=refresh)
+    click.echo(json.dumps(app.queue.summary(), indent=2))
+
+
+@cli.command()
+@click.option('--name', default=None, help='Worker name, defaults to <host>-<pid>')
+@click.option('--wait', is_flag=True, help='Keep polling for new reports once the queue is drained')
+@click.pass_context
+def worker(ctx, name, wait) -> None:
+    """Export reports from the work queue, next to any number of other workers."""
+    app = ctx.find_root().dpr_app
+    if app.queue is None:
+        raise click.ClickException('The work queue requires a database_url')
+
+    app.work(worker=name, wait=wait)
+    click.echo(json.dumps(app.queue.summary(), indent=2))
+
+
+@cli.command()
+@click.option('--to', 'target', type=int, default=None, help='Apply the migrations up to this version only')
+@click.option('--list', 'list_', is_flag=True, help='List applied and pending migrations, apply nothing')
+@click.pass_context
+def migrate(ctx, target, list_) -> None:
+    """Apply the pending schema migrations of `etc` to the database."""
+    from .migrations import Migrator
+
+    app = ctx.find_root().dpr_app
+    if app.engine is None:
+        raise click.ClickException('Migrating requires a database_url')
+
+    migrator = Migrator(app.engine)
+    if list_:
+        output = dict(applied={'%03d' % v: str(m['applied_at']) for v, m in migrator.applied().items()},
+                      pending=['%03d-%s' % (m.version, m.name) for m in migrator.pending()])
+    else:
+        output = dict(applied=['%03d-%s' % (m.version, m.name) for m in migrator.migrate(target=target)])
+    click.echo(json.dumps(output, indent=2))
+
+
+@cli.command()
 @click.pass_context
-def cli(ctx, config) -> None:
-    app = App().configure(config).setup()
-    ctx.dpr_app = app
+def resume(ctx) -> None:
+    """Retry the reports of the ledger that are pending, failed or were interrupted."""
+    app = ctx.find_root().dpr_app
+    if app.ledger is None:
+        raise click.ClickException('Ledger is not enabled')
+
+    app.resume()
+    click.echo(json.dumps(dict(summary=app.ledger.summary(), failures=app.ledger.failures()), indent=2))
+
+
+@cli.command()
+@click.option('--refresh', is_flag=True, help='Plan reports of closed program years again even if loaded')
+@click.option('--verbose', '-v', is_flag=True, help='List every planned report')
+@click.pass_context
+def plan(ctx, refresh, verbose) -> None:
+    """Show which reports `run` would fetch."""
+    app = ctx.find_root().dpr_app
+    result = app.plan(refresh=refresh)
+
+    output = dict(fetch=len(result['units']), skip=len(result['skipped']))
+    if verbose:
+        output.update(units=result['units'], skipped=result['skipped'])
+    click.echo(json.dumps(output, indent=2))
+
+
+@cli.command()
+@click.option('--club', 'clubs', type=int, multiple=True, help='Crawl these clubs only')
+@click.option('--refresh', is_flag=True, help='Crawl every club again, not only the missing ones')
+@click.option('--workers', type=int, default=None, help='Concurrent page downloads')
+@click.option('--processes', type=int, default=None, help='Page parsing processes')
+@click.option('--rate', type=float, default=None, help='Maximum requests per second')
+@click.pass_context
+def crawl(ctx, clubs, refresh, workers, processes, rate) -> None:
+    """Crawl Find-a-Club details of the clubs in district_perf."""
+    from .crawler import ClubCrawler
+
+    app = ctx.find_root().dpr_app
+    config = dict(app.config.get('crawler') or dict())
+    config.update((k, v) for k, v in dict(workers=workers, processes=processes, rate=rate).items() if v)
+
+    if app.engine is None:
+        raise click.ClickException('Crawling requires a database_url')
+
+    crawler = ClubCrawler.from_config(app.engine, app.requester, config)
+    stats = crawler.run(clubs=list(clubs) or None, refresh=refresh)
+    click.echo(json.dumps(stats, indent=2))
+
+
+@cli.command()
+@click.option('--rebuild', is_flag=True, help='Build the index from every club instead of the changed ones')
+@click.pass_context
+def index(ctx, rebuild) -> None:
+    """Update the spatial index of club locations."""
+    from .spatial import ClubIndex
+
+    app = ctx.find_root().dpr_app
+    if app.engine is None:
+        raise click.ClickException('Indexing requires a database_url')
+
+    clubs = ClubIndex.from_config(app.config.get('spatial'), app.engine, rebuild=rebuild)
+    click.echo(json.dumps(dict(clubs=len(clubs), synced_at=str(clubs.synced_at)), indent=2))
+
+
+@cli.command()
+@click.argument('lat', type=float)
+@click.argument('lon', type=float)
+@click.option('--km', type=float, default=None, help='Clubs within this distance')
+@click.option('--k', type=int, default=10, show_default=True, help='Nearest clubs, unless --km is given')
+@click.option('--wgs84', is_flag=True, help='The point is WGS-84, not in the local frame of the clubs')
+@click.pass_context
+def nearby(ctx, lat, lon, km, k, wgs84) -> None:
+    """Clubs near a point, from the spatial index."""
+    from .spatial import ClubIndex
+
+    config = ctx.find_root().dpr_app.config.get('spatial') or dict()
+    if not config.get('path'):
+        raise click.ClickException('Spatial index path is not configured')
+
+    clubs = ClubIndex.load(config['path'])
+    frame = 'wgs84' if wgs84 else 'local'
+    if km is not None:
+        ids, meters = clubs.radius(lat, lon, km, frame=frame)[0]
+    else:
+        ids, meters = clubs.knn(lat, lon, k, frame=frame)
+        ids, meters = ids[0][ids[0] >= 0], meters[0][ids[0] >= 0]
+
+    click.echo(json.dumps([dict(club=int(i), meters=round(float(m), 1)) for i, m in zip(ids, meters)], indent=2))
+
+
+@cli.group()
+def cache() -> None:
+    """Inspect and purge the HTTP response cache."""
+
+
+@cache.command()
+@click.pass_context
+def info(ctx) -> None:
+    requester = ctx.find_root().dpr_app.requester
+    if requester.cache is None:
+        raise click.ClickException('Cache is not enabled')
+
+    click.echo(json.dumps(requester.cache.info(), indent=2))
+
+
+@cache.command()
+@click.option('--volatile', is_flag=True, help='Only purge entries of open program years')
+@click.option('--max-bytes', type=int, default=None, help='Evict least recently used entries down to this size')
+@click.pass_context
+def purge(ctx, volatile, max_bytes) -> None:
+    requester = ctx.find_root().dpr_app.requester
+    if requester.cache is None:
+        raise click.ClickException('Cache is not enabled')
+
+    if max_bytes is not None:
+        removed = requester.cache.evict(max_bytes)
+    else:
+        removed = requester.cache.purge(volatile_only=volatile)
+
+    click.echo('%d entries removed' % removed)
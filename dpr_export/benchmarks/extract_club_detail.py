@@ -0,0 +1,45 @@
+# -*- coding:utf-8 -*-
+"""
+Per-page micro-benchmark of the club detail extractors.
+
+    $ python -m dpr_export.benchmarks.extract_club_detail [page.html ...]
+"""
+from __future__ import annotations
+
+import typing as ty
+import os
+import sys
+import timeit
+
+from dpr_export.extractors.club_detail import ClubDetailExtractor
+from dpr_export.extractors.club_detail_fast import FastClubDetailExtractor
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'tests', 'fixtures', 'club_detail.html')
+
+
+def bench(html: bytes, number: int = 200) -> ty.Dict[str, float]:
+    results = dict()
+    for extractor in (ClubDetailExtractor(), FastClubDetailExtractor()):
+        seconds = min(timeit.repeat(lambda: extractor.extract(html), number=number, repeat=5))
+        results[type(extractor).__name__] = seconds / number
+
+    return results
+
+
+def main(paths: ty.List[str]) -> None:
+    for path in paths or [FIXTURE]:
+        with open(path, 'rb') as f:
+            html = f.read()
+
+        if ClubDetailExtractor().extract(html) != FastClubDetailExtractor().extract(html):
+            raise SystemExit('%s: extractors disagree' % path)
+
+        results = bench(html)
+        slow = results['ClubDetailExtractor']
+        fast = results['FastClubDetailExtractor']
+        print('%s: %.1f us -> %.1f us per page (%.1fx)' % (os.path.basename(path), slow * 1e6, fast * 1e6, slow / fast))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+# -*- coding:utf-8 -*-
+"""
+Import time of the CLI, measured with ``python -X importtime`` in fresh interpreters.
+
+    $ python -m dpr_export.benchmarks.importtime --budget-ms 100
+
+Exits with 1 when importing ``dpr_export.app`` takes longer than the budget, or pulls
+in one of the ``HEAVY_MODULES`` that only commands doing actual work may import.
+"""
+from __future__ import annotations
+
+import typing as ty
+import re
+import sys
+import json
+import subprocess
+
+import click
+
+
+MODULE = 'dpr_export.app'
+HEAVY_MODULES = ('pandas', 'numpy', 'sqlalchemy', 'requests', 'urllib3', 'bs4', 'lxml', 'yaml', 'pyarrow')
+DEFAULT_BUDGET_MS = 100.0
+DEFAULT_RUNS = 5
+
+PATTERN_IMPORTTIME = re.compile(r'^import time:\s+(?P<self>\d+)\s+\|\s+(?P<cumulative>\d+)\s+\|\s+(?P<name>.+)$')
+
+
+def import_seconds(module: str = MODULE) -> float:
+    """
+    Cumulative import time of ``module`` in a fresh interpreter.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        m = PATTERN_IMPORTTIME.match(line)
+        if m and m.group('name').strip() == module:
+            return int(m.group('cumulative')) / 1e6
+
+    raise RuntimeError('%s not found in the -X importtime output' % module)
+
+
+def heavy_imports(module: str = MODULE) -> ty.List[str]:
+    """
+    The ``HEAVY_MODULES`` loaded as a side effect of importing ``module``.
+    """
+    code = 'import sys, json, %s; print(json.dumps(sorted(sys.modules)))' % module
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    loaded = set(json.loads(result.stdout))
+    return [name for name in HEAVY_MODULES if name in loaded]
+
+
+def measure(module: str = MODULE, runs: int = DEFAULT_RUNS) -> ty.Dict[str, ty.Any]:
+    timings = [import_seconds(module) for _ in range(runs)]
+    return dict(module=module, seconds=min(timings), runs=runs, heavy_imports=heavy_imports(module))
+
+
+@click.command()
+@click.option('--module', default=MODULE)
+@click.option('--runs', default=DEFAULT_RUNS, help='Fresh interpreters, the fastest is kept')
+@click.option('--budget-ms', default=DEFAULT_BUDGET_MS, help='Allowed import time')
+def main(module, runs, budget_ms) -> None:
+    result = measure(module, runs=runs)
+    click.echo(json.dumps(result, indent=2))
+
+    if result['heavy_imports']:
+        click.echo('%s imports %s' % (module, ', '.join(result['heavy_imports'])), err=True)
+        sys.exit(1)
+    if result['seconds'] * 1000 > budget_ms:
+        click.echo('%s takes %.1f ms to import, budget %.1f ms' % (module, result['seconds'] * 1000, budget_ms),
+                   err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+# -*- coding:utf-8 -*-
+"""
+Offline benchmark suite on synthetic data, results stored as JSON for comparing commits.
+
+    $ python -m dpr_export.benchmarks.suite --output before.json
+    $ git checkout feature
+    $ python -m dpr_export.benchmarks.suite --output after.json --compare before.json
+
+The ``save`` benchmarks need a PostgreSQL to write to, pass a throwaway database with
+``--database-url`` (or ``DPR_BENCH_DATABASE_URL``), they are skipped otherwise. Rows are
+written with report year ``BENCH_YEAR`` and deleted again afterwards, as is the partition
+of that year when the benchmark created it.
+"""
+from __future__ import annotations
+
+import typing as ty
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import statistics
+import subprocess
+
+import click
+import numpy as np
+import pandas as pd
+
+from dpr_export.benchmarks import synthetic
+
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_PAGES = 200
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.1
+
+BENCH_YEAR = 1900
+BENCH_MONTH = 1
+
+
+def measure(func: ty.Callable[[], ty.Any], items: int, repeat: int,
+            setup: ty.Optional[ty.Callable[[], ty.Any]] = None) -> ty.Dict[str, float]:
+    """
+    Run ``func`` ``repeat`` times, ``setup`` untimed before every run.
+    """
+    timings = list()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        begin = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - begin)
+
+    best = min(timings)
+    return dict(items=items,
+                seconds=best,
+                median_seconds=statistics.median(timings),
+                per_second=items / best if best > 0 else None)
+
+
+def bench_persistence(size: int, repeat: int) -> ty.Dict[str, ty.Dict[str, float]]:
+    from dpr_export.persistence import clean, unique_key
+
+    report = synthetic.district_report(size)
+    df = clean(report)
+
+    return {
+        'clean[%d]' % size: measure(lambda: clean(report), size, repeat),
+        'unique_key[%d]' % size: measure(lambda: unique_key(df.copy(), year=2023, month=6), size, repeat),
+    }
+
+
+def bench_parse(size: int, repeat: int, processes: ty.Iterable[int]) -> ty.Dict[str, ty.Dict[str, float]]:
+    """
+    ``parse_report`` over one raw report per process, to see how parsing scales with cores.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    from dpr_export.persistence import parse_report
+
+    data = synthetic.district_report(size).encode('utf-8')
+    results = dict()
+    for workers in processes:
+        reports = [dict(unit=dict(district=88, year=2023, month=6), data=data, encoding='utf-8')] * workers
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(parse_report, reports))  # warm up the workers
+            results['parse_report[%d]x%d' % (size, workers)] = measure(
+                lambda: list(pool.map(parse_report, reports)), size * workers, repeat)
+
+    return results
+
+
+def bench_save(size: int, repeat: int, database_url: str) -> ty.Dict[str, ty.Dict[str, float]]:
+    import sqlalchemy as sa
+    from dpr_export import schema
+    from dpr_export.db import create_engine
+    from dpr_export.migrations import partitions
+    from dpr_export.persistence import clean, unique_key, LOADERS, Persistence
+
+    engine = create_engine(database_url)
+    schema.metadata.create_all(engine, tables=[schema.district_perf])
+    table = schema.district_perf
+    df = unique_key(clean(synthetic.district_report(size)), year=BENCH_YEAR, month=BENCH_MONTH)
+
+    with engine.connect() as conn:
+        existed = BENCH_YEAR in partitions(conn, table.name)
+
+    def truncate():
+        with engine.begin() as conn:
+            conn.execute(sa.delete(table).where(table.c.report_year == BENCH_YEAR))
+
+    def drop_partition():
+        # saving attaches a partition for BENCH_YEAR to a partitioned table, not left behind
+        with engine.begin() as conn:
+            partition = partitions(conn, table.name).get(BENCH_YEAR)
+            if partition is not None and not existed:
+                conn.exec_driver_sql('DROP TABLE %s' % engine.dialect.identifier_preparer.quote(partition))
+
+    results = dict()
+    try:
+        for loader in LOADERS:
+            persistence = Persistence(engine, loader=loader)
+            results['save_%s[%d]' % (loader, size)] = measure(lambda: persistence.save(df), size, repeat,
+                                                              setup=truncate)
+    finally:
+        truncate()
+        drop_partition()
+        engine.dispose()
+
+    return results
+
+
+def bench_extract(pages: int, repeat: int) -> ty.Dict[str, ty.Dict[str, float]]:
+    from dpr_export.extractors.club_detail import ClubDetailExtractor
+    from dpr_export.extractors.club_detail_fast import FastClubDetailExtractor
+
+    html = synthetic.club_detail_pages(pages)
+    results = dict()
+    for extractor in (ClubDetailExtractor(), FastClubDetailExtractor()):
+        results['%s.extract[%d]' % (type(extractor).__name__, pages)] = measure(
+            lambda: [extractor.extract(page) for page in html], pages, repeat)
+
+    return results
+
+
+def bench_eviltransform(size: int, repeat: int) -> ty.Dict[str, ty.Dict[str, float]]:
+    from dpr_export.common import eviltransform as et
+
+    lat, lng = synthetic.coordinates(size)
+    lat_a, lng_a = np.asarray(lat), np.asarray(lng)
+    pairs = list(zip(lat, lng))
+
+    results = dict()
+    for name in ('wgs2gcj', 'gcj2wgs', 'gcj2wgs_exact', 'wgs2bd'):
+        scalar = getattr(et, name)
+        batch = getattr(et, name + '_batch')
+        results['%s[%d]' % (name, size)] = measure(lambda: [scalar(a, b) for a, b in pairs], size, repeat)
+        results['%s_batch[%d]' % (name, size)] = measure(lambda: batch(lat_a, lng_a), size, repeat)
+
+    results['distance[%d]' % size] = measure(
+        lambda: [et.distance(a, b, 39.9, 116.4) for a, b in pairs], size, repeat)
+    results['distance_batch[%d]' % size] = measure(
+        lambda: et.distance_batch(lat_a, lng_a, 39.9, 116.4), size, repeat)
+
+    return results
+
+
+def bench_startup(repeat: int) -> ty.Dict[str, ty.Dict[str, float]]:
+    from dpr_export.benchmarks.importtime import MODULE, import_seconds
+
+    timings = [import_seconds(MODULE) for _ in range(repeat)]
+    return {'import[%s]' % MODULE: dict(items=1, seconds=min(timings), median_seconds=statistics.median(timings),
+                                        per_second=1 / min(timings))}
+
+
+def git_commit() -> ty.Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(__file__)).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+GROUPS = ('persistence', 'parse', 'save', 'extract', 'eviltransform', 'startup')
+
+
+def run(sizes: ty.Iterable[int] = DEFAULT_SIZES, pages: int = DEFAULT_PAGES, repeat: int = DEFAULT_REPEAT,
+        database_url: str | None = None, only: ty.Optional[ty.Iterable[str]] = None,
+        processes: ty.Optional[ty.Iterable[int]] = None) -> ty.Dict[str, ty.Any]:
+    """
+    Run the benchmark groups (see ``GROUPS``), all of them unless ``only`` names some.
+    ``parse`` runs with every number of ``processes``, 1 and all cores by default.
+    """
+    only = set(only or GROUPS)
+    processes = sorted(set(processes or (1, os.cpu_count() or 1)))
+    sizes = list(sizes)
+    results = dict()
+
+    for size in sizes:
+        if 'persistence' in only:
+            results.update(bench_persistence(size, repeat))
+        if 'parse' in only:
+            results.update(bench_parse(size, repeat, processes))
+        if 'save' in only and database_url:
+            results.update(bench_save(size, repeat, database_url))
+        if 'eviltransform' in only:
+            results.update(bench_eviltransform(size, repeat))
+
+    if 'extract' in only:
+        results.update(bench_extract(pages, repeat))
+    if 'startup' in only:
+        results.update(bench_startup(repeat))
+
+    meta = dict(commit=git_commit(),
+                created_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                python=platform.python_version(),
+                platform=platform.platform(),
+                pandas=pd.__version__,
+                numpy=np.__version__,
+                sizes=sizes,
+                pages=pages,
+                repeat=repeat,
+                processes=processes,
+                cpu_count=os.cpu_count(),
+                save=bool(database_url))
+
+    return dict(meta=meta, results=results)
+
+
+def compare(baseline: ty.Dict[str, ty.Any], current: ty.Dict[str, ty.Any],
+            tolerance: float = DEFAULT_TOLERANCE) -> ty.List[ty.Tuple[str, float, float, float]]:
+    """
+    Benchmarks of ``current`` slower than in ``baseline`` by more than ``tolerance``,
+    as (name, baseline seconds, current seconds, ratio), slowest first.
+    """
+    regressions = list()
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base or not base['seconds']:
+            continue
+
+        ratio = result['seconds'] / base['seconds']
+        if ratio > 1 + tolerance:
+            regressions.append((name, base['seconds'], result['seconds'], ratio))
+
+    return sorted(regressions, key=lambda r: r[3], reverse=True)
+
+
+@click.command()
+@click.option('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='Comma separated club counts')
+@click.option('--pages', default=DEFAULT_PAGES, help='Club detail pages to extract')
+@click.option('--repeat', default=DEFAULT_REPEAT, help='Runs per benchmark, the fastest is kept')
+@click.option('--only', multiple=True, type=click.Choice(GROUPS))
+@click.option('--processes', default=None, help='Comma separated process counts for the parse benchmark')
+@click.option('--database-url', envvar='DPR_BENCH_DATABASE_URL', default=None,
+              help='Throwaway PostgreSQL for the save benchmarks')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Write the results as JSON')
+@click.option('--compare', 'baseline', type=click.Path(exists=True, dir_okay=False), default=None,
+              help='Results of an earlier run, exit with 1 on regressions')
+@click.option('--tolerance', default=DEFAULT_TOLERANCE, help='Allowed slowdown against --compare')
+def main(sizes, pages, repeat, only, processes, database_url, output, baseline, tolerance) -> None:
+    results = run(sizes=[int(s) for s in sizes.split(',') if s], pages=pages, repeat=repeat,
+                  database_url=database_url, only=only,
+                  processes=[int(p) for p in processes.split(',') if p] if processes else None)
+
+    for name, result in results['results'].items():
+        click.echo('%-40s %12.6f s %14.1f /s' % (name, result['seconds'], result['per_second'] or 0))
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            regressions = compare(json.load(f), results, tolerance=tolerance)
+
+        for name, before, after, ratio in regressions:
+            click.echo('REGRESSION %s: %.6f s -> %.6f s (%.2fx)' % (name, before, after, ratio), err=True)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+"""
+Synthetic district performance reports and Find-a-Club pages for offline benchmarks.
+
+Everything is derived from a seed, so the same arguments always give the same bytes.
+"""
+from __future__ import annotations
+
+import typing as ty
+import io
+import csv
+import random
+
+from dpr_export.persistence import COLUMN_MAP
+
+
+DIVISIONS = 'ABCDEFGHIJ'
+STATUSES = ('', '', '', 'D', 'S', 'P')
+WEEK_DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+CLUB_DETAIL_PAGE = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <title>Find a Club | Toastmasters International</title>
+</head>
+<body>
+<div class="container">
+    <div class="club-header">
+        <h1 class="title">
+            %(name)s
+        </h1>
+    </div>
+    <div class="club-detail">
+        <div class="contact-info">
+            <h3>Address</h3>
+            <div class="contact-info-body">
+                Room %(room)d, Tower %(division)s&nbsp;Zhongguancun Plaza
+                <br>
+                No. %(street)d  Zhongguancun Street
+                <br>
+                Haidian District, Beijing 100080
+                <br>
+                China
+                <br>
+            </div>
+            <h3>Meeting Times</h3>
+            <div class="contact-info-meeting-times">
+                <span class="icon"></span>
+                %(day)ss&nbsp;%(begin)02d:00-%(end)02d:00
+                <br>
+            </div>
+            <a class="directions" href="https://www.bing.com/maps?rtp=~pos.%(lat).5f_%(lon).5f_Club&amp;lvl=15" target="_blank">Get Directions</a>
+        </div>
+        <div class="club-info">
+            <p>Club Number:&nbsp;
+                %(club)08d, %(district)d, Area %(division)s%(area)02d</p>
+            <p>Online Attendance: Yes</p>
+        </div>
+    </div>
+</div>
+</body>
+</html>
+'''
+
+
+def charter_suspend(rnd: random.Random) -> str:
+    date = lambda: '%02d/%02d/%02d' % (rnd.randint(1, 12), rnd.randint(1, 28), rnd.randint(0, 23))
+
+    kind = rnd.random()
+    if kind < 0.6:
+        return 'Charter %s' % date()
+    if kind < 0.75:
+        return 'Charter %s Susp %s' % (date(), date())
+    if kind < 0.85:
+        return 'Susp %s' % date()
+    return ''
+
+
+def district_report(clubs: int, district: int = 88, year: int = 2023, month: int = 6, seed: int = 0) -> str:
+    """
+    A report in the DPR CSV export format with ``clubs`` rows, footer line included.
+    """
+    rnd = random.Random(seed)
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    writer.writerow(COLUMN_MAP.keys())
+
+    for i in range(clubs):
+        new, late, oct_, apr = (rnd.randint(0, 20) for _ in range(4))
+        writer.writerow([district, DIVISIONS[i % len(DIVISIONS)], '%02d' % (i // 50 % 99 + 1),
+                         1000000 + i, 'Synthetic %d Toastmasters Club' % i,
+                         new, late, oct_, apr, late + oct_ + apr, rnd.randint(0, 1), new + late + oct_ + apr,
+                         rnd.choice(STATUSES), charter_suspend(rnd)])
+
+    out.write('Month of %s, As of %02d/01/%d\n' % (('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug',
+                                                  'Sep', 'Oct', 'Nov', 'Dec')[month - 1], month % 12 + 1, year))
+    return out.getvalue()
+
+
+def coordinates(points: int, seed: int = 0) -> ty.Tuple[ty.List[float], ty.List[float]]:
+    """
+    ``points`` latitudes and longitudes scattered over China.
+    """
+    rnd = random.Random(seed)
+    return ([rnd.uniform(18.0, 53.0) for _ in range(points)],
+            [rnd.uniform(74.0, 134.0) for _ in range(points)])
+
+
+def club_detail_page(club: int, district: int = 88, seed: int = 0) -> bytes:
+    rnd = random.Random('%d-%d' % (seed, club))
+    begin = rnd.randint(7, 20)
+    return (CLUB_DETAIL_PAGE % dict(name='Synthetic %d Toastmasters Club' % club,
+                                    room=rnd.randint(100, 2999),
+                                    street=rnd.randint(1, 200),
+                                    day=rnd.choice(WEEK_DAYS),
+                                    begin=begin,
+                                    end=begin + 2,
+                                    lat=rnd.uniform(18.0, 53.0),
+                                    lon=rnd.uniform(74.0, 134.0),
+                                    club=club,
+                                    district=district,
+                                    division=rnd.choice(DIVISIONS),
+                                    area=rnd.randint(1, 99))).encode('utf-8')
+
+
+def club_detail_pages(pages: int, seed: int = 0) -> ty.List[bytes]:
+    return [club_detail_page(1000000 + i, seed=seed) for i in range(pages)]
@@ -0,0 +1,301 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import collections
+
+
+class CacheEntry(dict):
+    """
+    Metadata of one cached response, stored as JSON in the index.
+
+    Keys: ``url``, ``digest`` (SHA-256 of the body), ``size``, ``content_type``,
+    ``etag``, ``last_modified``, ``permanent``, ``stored_at`` and ``accessed_at``.
+    """
+
+    @property
+    def digest(self) -> str:
+        return self['digest']
+
+    @property
+    def permanent(self) -> bool:
+        return bool(self.get('permanent'))
+
+    def conditional_headers(self) -> ty.Dict[str, str]:
+        headers = dict()
+        if self.get('etag'):
+            headers['If-None-Match'] = self['etag']
+        if self.get('last_modified'):
+            headers['If-Modified-Since'] = self['last_modified']
+        return headers
+
+
+class CacheWriter(object):
+    """
+    Writes a response body into the cache chunk by chunk, hashing it on the fly.
+    Nothing is visible in the cache before ``commit``.
+    """
+
+    def __init__(self, cache: "ResponseCache", url: str, headers: ty.Mapping[str, str], permanent: bool) -> None:
+        self.cache = cache
+        self.url = url
+        self.headers = headers
+        self.permanent = permanent
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+        fd, self.path = tempfile.mkstemp(dir=cache.directory, prefix='.tmp-')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk: bytes) -> None:
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def abort(self) -> None:
+        self.file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def commit(self) -> CacheEntry:
+        self.file.close()
+        return self.cache.commit(self.url, self.path, self.hash.hexdigest(), self.size,
+                                 self.headers, self.permanent)
+
+
+class ResponseCache(object):
+    """
+    Content-addressed on-disk cache of HTTP responses.
+
+    Bodies live in ``objects/<digest[:2]>/<digest>`` keyed by their SHA-256 so identical
+    reports are stored once; ``index/<sha256(url)>.json`` maps every URL to its body.
+    Permanent entries are served without touching the network, the others are revalidated
+    with ``If-None-Match``/``If-Modified-Since``. Once the cache grows past ``max_bytes``,
+    least recently used entries are evicted, volatile ones first, down to ``EVICT_TO`` of
+    ``max_bytes`` so that the next downloads do not evict again right away.
+
+    The size of the cache is kept in memory, counted once from the index and updated on
+    every commit and removal, so the index is only read again when there is something
+    to evict.
+    """
+
+    DEFAULT_DIRECTORY = os.path.join('~', '.cache', 'dpr_export')
+    EVICT_TO = 0.9
+
+    def __init__(self, directory: str, max_bytes: int | None = None) -> None:
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # url -> digest, references and size per digest, bytes of all digests
+        self._digests: ty.Optional[ty.Dict[str, str]] = None
+        self._references: ty.Counter[str] = collections.Counter()
+        self._sizes: ty.Dict[str, int] = dict()
+        self._bytes = 0
+
+        os.makedirs(os.path.join(self.directory, 'index'), exist_ok=True)
+        os.makedirs(os.path.join(self.directory, 'objects'), exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]]) -> ty.Optional["ResponseCache"]:
+        if not config or not config.get('enabled', True):
+            return None
+
+        return cls(directory=config.get('directory') or cls.DEFAULT_DIRECTORY,
+                   max_bytes=config.get('max_bytes'))
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def index_path(self, url: str) -> str:
+        return os.path.join(self.directory, 'index', '%s.json' % self.key(url))
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _write_json(self, path: str, data: ty.Dict[str, ty.Any]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def entries(self) -> ty.Iterator[CacheEntry]:
+        index = os.path.join(self.directory, 'index')
+        for name in os.listdir(index):
+            try:
+                with open(os.path.join(index, name), 'r') as f:
+                    yield CacheEntry(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+    def _count(self, entries: ty.Iterable[CacheEntry]) -> None:
+        """
+        Start the size accounting over from ``entries``, with the lock held.
+        """
+        self._digests = dict()
+        self._references = collections.Counter()
+        self._sizes = dict()
+        self._bytes = 0
+        for entry in entries:
+            self._account(entry['url'], entry.digest, entry['size'])
+
+    def _account(self, url: str, digest: ty.Optional[str], size: int = 0) -> None:
+        """
+        Point ``url`` at ``digest``, or at nothing, in the size accounting.
+        """
+        previous = self._digests.pop(url, None)
+        if previous is not None:
+            self._references[previous] -= 1
+            if not self._references[previous]:
+                del self._references[previous]
+                self._bytes -= self._sizes.pop(previous)
+
+        if digest is not None:
+            self._digests[url] = digest
+            self._references[digest] += 1
+            if digest not in self._sizes:
+                self._sizes[digest] = size
+                self._bytes += size
+
+    @property
+    def total_bytes(self) -> int:
+        with self._lock:
+            if self._digests is None:
+                self._count(self.entries())
+            return self._bytes
+
+    def get(self, url: str) -> ty.Optional[CacheEntry]:
+        try:
+            with open(self.index_path(url), 'r') as f:
+                entry = CacheEntry(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+        if not os.path.exists(self.object_path(entry.digest)):
+            return None
+
+        return entry
+
+    def touch(self, entry: CacheEntry) -> None:
+        entry['accessed_at'] = time.time()
+        self._write_json(self.index_path(entry['url']), entry)
+
+    def read(self, entry: CacheEntry) -> bytes:
+        with open(self.object_path(entry.digest), 'rb') as f:
+            return f.read()
+
+    def open(self, entry: CacheEntry) -> ty.BinaryIO:
+        return open(self.object_path(entry.digest), 'rb')
+
+    def writer(self, url: str, headers: ty.Mapping[str, str], permanent: bool) -> CacheWriter:
+        return CacheWriter(self, url, headers, permanent)
+
+    def put(self, url: str, content: bytes, headers: ty.Mapping[str, str], permanent: bool) -> CacheEntry:
+        writer = self.writer(url, headers, permanent)
+        try:
+            writer.write(content)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def commit(self, url: str, path: str, digest: str, size: int,
+               headers: ty.Mapping[str, str], permanent: bool) -> CacheEntry:
+        target = self.object_path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+        now = time.time()
+        entry = CacheEntry(url=url, digest=digest, size=size,
+                           content_type=headers.get('Content-Type', ''),
+                           etag=headers.get('ETag'),
+                           last_modified=headers.get('Last-Modified'),
+                           permanent=permanent,
+                           stored_at=now,
+                           accessed_at=now)
+        self._write_json(self.index_path(url), entry)
+
+        if self.max_bytes:
+            with self._lock:
+                if self._digests is None:
+                    self._count(self.entries())
+                else:
+                    self._account(url, digest, size)
+                full = self._bytes > self.max_bytes
+
+            if full:
+                self.evict(int(self.max_bytes * self.EVICT_TO))
+
+        return entry
+
+    def _remove(self, entry: CacheEntry, unreferenced: bool) -> None:
+        """
+        Remove the entry, and its body once no other entry references it.
+        """
+        try:
+            os.unlink(self.index_path(entry['url']))
+        except FileNotFoundError:
+            pass
+
+        if unreferenced:
+            try:
+                os.unlink(self.object_path(entry.digest))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_bytes: int) -> int:
+        """
+        Drop least recently used entries until the bodies fit into ``max_bytes``,
+        returns the number of entries removed.
+        """
+        with self._lock:
+            entries = list(self.entries())
+            self._count(entries)
+            if self._bytes <= max_bytes:
+                return 0
+
+            entries.sort(key=lambda e: (e.permanent, e.get('accessed_at', 0)))
+            removed = 0
+
+            for entry in entries:
+                if self._bytes <= max_bytes:
+                    break
+
+                unreferenced = self._references[entry.digest] == 1
+                self._remove(entry, unreferenced)
+                self._account(entry['url'], None)
+                removed += 1
+
+            return removed
+
+    def purge(self, volatile_only: bool = False) -> int:
+        with self._lock:
+            entries = list(self.entries())
+            self._count(entries)
+
+            removed = 0
+            for entry in entries:
+                if volatile_only and entry.permanent:
+                    continue
+                self._remove(entry, self._references[entry.digest] == 1)
+                self._account(entry['url'], None)
+                removed += 1
+
+            return removed
+
+    def info(self) -> ty.Dict[str, ty.Any]:
+        entries = list(self.entries())
+        sizes = {entry.digest: entry['size'] for entry in entries}
+
+        return dict(directory=self.directory,
+                    entries=len(entries),
+                    permanent=sum(1 for e in entries if e.permanent),
+                    objects=len(sizes),
+                    bytes=sum(sizes.values()),
+                    max_bytes=self.max_bytes)
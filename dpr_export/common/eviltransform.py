@@ -32,9 +32,14 @@ Source: https://github.com/googollee/eviltransform/blob/master/python/eviltransf
 """
 import math
 
+import numpy as np
+
 
 __all__ = ['wgs2gcj', 'gcj2wgs', 'gcj2wgs_exact',
-           'distance', 'gcj2bd', 'bd2gcj', 'wgs2bd', 'bd2wgs']
+           'distance', 'gcj2bd', 'bd2gcj', 'wgs2bd', 'bd2wgs',
+           'outOfChina_batch', 'wgs2gcj_batch', 'gcj2wgs_batch', 'gcj2wgs_exact_batch',
+           'distance_batch', 'distance_matrix', 'gcj2bd_batch', 'bd2gcj_batch',
+           'wgs2bd_batch', 'bd2wgs_batch']
 
 earthR = 6378137.0
 
@@ -171,3 +176,170 @@ def wgs2bd(wgsLat, wgsLng):
 
 def bd2wgs(bdLat, bdLng):
     return gcj2wgs(*bd2gcj(bdLat, bdLng))
+
+
+# Vectorized counterparts of the functions above, accepting array-likes of
+# latitudes/longitudes (any matching shapes) and returning float64 arrays.
+
+def outOfChina_batch(lat, lng):
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    return ~((72.004 <= lng) & (lng <= 137.8347) & (0.8293 <= lat) & (lat <= 55.8271))
+
+
+def transform_batch(x, y):
+    xy = x * y
+    absX = np.sqrt(np.abs(x))
+    xPi = x * math.pi
+    yPi = y * math.pi
+    d = 20.0*np.sin(6.0*xPi) + 20.0*np.sin(2.0*xPi)
+
+    lat = d + 20.0*np.sin(yPi) + 40.0*np.sin(yPi/3.0)
+    lng = d + 20.0*np.sin(xPi) + 40.0*np.sin(xPi/3.0)
+
+    lat += 160.0*np.sin(yPi/12.0) + 320*np.sin(yPi/30.0)
+    lng += 150.0*np.sin(xPi/12.0) + 300.0*np.sin(xPi/30.0)
+
+    lat *= 2.0 / 3.0
+    lng *= 2.0 / 3.0
+
+    lat += -100.0 + 2.0*x + 3.0*y + 0.2*y*y + 0.1*xy + 0.2*absX
+    lng += 300.0 + x + 2.0*y + 0.1*x*x + 0.1*xy + 0.1*absX
+
+    return lat, lng
+
+
+def delta_batch(lat, lng):
+    ee = 0.00669342162296594323
+    dLat, dLng = transform_batch(lng-105.0, lat-35.0)
+    radLat = lat / 180.0 * math.pi
+    magic = np.sin(radLat)
+    magic = 1 - ee * magic * magic
+    sqrtMagic = np.sqrt(magic)
+    dLat = (dLat * 180.0) / ((earthR * (1 - ee)) / (magic * sqrtMagic) * math.pi)
+    dLng = (dLng * 180.0) / (earthR / sqrtMagic * np.cos(radLat) * math.pi)
+    return dLat, dLng
+
+
+def wgs2gcj_batch(wgsLat, wgsLng):
+    wgsLat, wgsLng = np.broadcast_arrays(np.asarray(wgsLat, dtype=np.float64),
+                                         np.asarray(wgsLng, dtype=np.float64))
+    inChina = ~outOfChina_batch(wgsLat, wgsLng)
+    dlat, dlng = delta_batch(wgsLat, wgsLng)
+    return np.where(inChina, wgsLat + dlat, wgsLat), np.where(inChina, wgsLng + dlng, wgsLng)
+
+
+def gcj2wgs_batch(gcjLat, gcjLng):
+    gcjLat, gcjLng = np.broadcast_arrays(np.asarray(gcjLat, dtype=np.float64),
+                                         np.asarray(gcjLng, dtype=np.float64))
+    inChina = ~outOfChina_batch(gcjLat, gcjLng)
+    dlat, dlng = delta_batch(gcjLat, gcjLng)
+    return np.where(inChina, gcjLat - dlat, gcjLat), np.where(inChina, gcjLng - dlng, gcjLng)
+
+
+def gcj2wgs_exact_batch(gcjLat, gcjLng):
+    """
+    Bisection of ``gcj2wgs_exact`` run on every point at once, points drop out
+    of the working set as soon as they converge.
+    """
+    gcjLat, gcjLng = np.broadcast_arrays(np.asarray(gcjLat, dtype=np.float64),
+                                         np.asarray(gcjLng, dtype=np.float64))
+    shape = gcjLat.shape
+    gcjLat = gcjLat.ravel()
+    gcjLng = gcjLng.ravel()
+
+    initDelta = 0.01
+    threshold = 0.000001
+    mLat = gcjLat - initDelta
+    mLng = gcjLng - initDelta
+    pLat = gcjLat + initDelta
+    pLng = gcjLng + initDelta
+    wgsLat = np.empty_like(gcjLat)
+    wgsLng = np.empty_like(gcjLng)
+    active = np.arange(gcjLat.size)
+
+    for i in range(30):
+        lat = (mLat[active] + pLat[active]) / 2
+        lng = (mLng[active] + pLng[active]) / 2
+        wgsLat[active] = lat
+        wgsLng[active] = lng
+
+        tmplat, tmplng = wgs2gcj_batch(lat, lng)
+        dLat = tmplat - gcjLat[active]
+        dLng = tmplng - gcjLng[active]
+
+        moving = ~((np.abs(dLat) < threshold) & (np.abs(dLng) < threshold))
+        active, lat, lng, dLat, dLng = active[moving], lat[moving], lng[moving], dLat[moving], dLng[moving]
+        if not active.size:
+            break
+
+        up = dLat > 0
+        pLat[active[up]] = lat[up]
+        mLat[active[~up]] = lat[~up]
+        up = dLng > 0
+        pLng[active[up]] = lng[up]
+        mLng[active[~up]] = lng[~up]
+
+    return wgsLat.reshape(shape), wgsLng.reshape(shape)
+
+
+def distance_batch(latA, lngA, latB, lngB):
+    pi180 = math.pi / 180
+    arcLatA = np.asarray(latA, dtype=np.float64) * pi180
+    arcLatB = np.asarray(latB, dtype=np.float64) * pi180
+    x = (np.cos(arcLatA) * np.cos(arcLatB) *
+         np.cos((np.asarray(lngA, dtype=np.float64) - np.asarray(lngB, dtype=np.float64)) * pi180))
+    y = np.sin(arcLatA) * np.sin(arcLatB)
+    s = np.clip(x + y, -1, 1)
+    return np.arccos(s) * earthR
+
+
+def distance_matrix(latA, lngA, latB=None, lngB=None):
+    """
+    Pairwise distances in meters, ``[i, j]`` is from point ``i`` of A to point ``j``
+    of B; B defaults to A.
+    """
+    latA = np.ravel(np.asarray(latA, dtype=np.float64))
+    lngA = np.ravel(np.asarray(lngA, dtype=np.float64))
+    if latB is None:
+        latB, lngB = latA, lngA
+    latB = np.ravel(np.asarray(latB, dtype=np.float64))
+    lngB = np.ravel(np.asarray(lngB, dtype=np.float64))
+
+    return distance_batch(latA[:, np.newaxis], lngA[:, np.newaxis], latB[np.newaxis, :], lngB[np.newaxis, :])
+
+
+def gcj2bd_batch(gcjLat, gcjLng):
+    gcjLat, gcjLng = np.broadcast_arrays(np.asarray(gcjLat, dtype=np.float64),
+                                         np.asarray(gcjLng, dtype=np.float64))
+    inChina = ~outOfChina_batch(gcjLat, gcjLng)
+
+    x = gcjLng
+    y = gcjLat
+    z = np.hypot(x, y) + 0.00002 * np.sin(y * math.pi)
+    theta = np.arctan2(y, x) + 0.000003 * np.cos(x * math.pi)
+    bdLng = z * np.cos(theta) + 0.0065
+    bdLat = z * np.sin(theta) + 0.006
+    return np.where(inChina, bdLat, gcjLat), np.where(inChina, bdLng, gcjLng)
+
+
+def bd2gcj_batch(bdLat, bdLng):
+    bdLat, bdLng = np.broadcast_arrays(np.asarray(bdLat, dtype=np.float64),
+                                       np.asarray(bdLng, dtype=np.float64))
+    inChina = ~outOfChina_batch(bdLat, bdLng)
+
+    x = bdLng - 0.0065
+    y = bdLat - 0.006
+    z = np.hypot(x, y) - 0.00002 * np.sin(y * math.pi)
+    theta = np.arctan2(y, x) - 0.000003 * np.cos(x * math.pi)
+    gcjLng = z * np.cos(theta)
+    gcjLat = z * np.sin(theta)
+    return np.where(inChina, gcjLat, bdLat), np.where(inChina, gcjLng, bdLng)
+
+
+def wgs2bd_batch(wgsLat, wgsLng):
+    return gcj2bd_batch(*wgs2gcj_batch(wgsLat, wgsLng))
+
+
+def bd2wgs_batch(bdLat, bdLng):
+    return gcj2wgs_batch(*bd2gcj_batch(bdLat, bdLng))
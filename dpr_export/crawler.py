@@ -0,0 +1,159 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import time
+import logging
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import sqlalchemy as sa
+
+from . import schema
+from .requester import Requester
+from .ratelimit import RateLimiter
+from .extractors.club_detail_fast import FastClubDetailExtractor
+
+
+logger = logging.getLogger(__name__)
+
+
+def extract_club_detail(club: int, html: bytes | None,
+                        error: str | None) -> ty.Dict[str, ty.Any]:
+    """
+    Turn a Find-a-Club page into a ``club_detail`` row, runs in the process pool.
+    """
+    row = dict(club=club, error=error)
+    if html is None:
+        return row
+
+    try:
+        detail = FastClubDetailExtractor().extract(html=html)
+    except Exception as e:
+        row['error'] = '%s: %s' % (type(e).__name__, e)
+        return row
+
+    meeting_time = detail['meeting_time'] or dict()
+    location_ti = detail['location_ti'] or (None, None)
+    location_local = detail['location_local'] or (None, None)
+
+    row.update(name=detail['name'],
+               address=detail['address'],
+               district=detail['district'],
+               division=detail['division'],
+               area=detail['area'],
+               meeting_day=meeting_time.get('day'),
+               time_begin=meeting_time.get('time_begin'),
+               time_end=meeting_time.get('time_end'),
+               lat=location_ti[0],
+               lon=location_ti[1],
+               lat_local=location_local[0],
+               lon_local=location_local[1])
+    return row
+
+
+class ClubCrawler(object):
+    """
+    Fetch the Find-a-Club page of every club in ``district_perf`` into ``club_detail``.
+
+    Pages are downloaded by a bounded thread pool, rate limited per host, and parsed in
+    a process pool. Clubs are handled in batches, every batch is committed before the
+    next one starts, so an interrupted crawl resumes with the clubs that are still missing
+    (or failed last time).
+    """
+
+    DEFAULT_WORKERS = 8
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, engine: sa.engine.Engine, requester: Requester,
+                 workers: int | None = None, processes: int | None = None,
+                 rate: float | None = None, batch_size: int | None = None) -> None:
+        self.engine = engine
+        self.requester = requester
+        self.workers = workers or self.DEFAULT_WORKERS
+        self.processes = processes
+        self.batch_size = batch_size or self.DEFAULT_BATCH_SIZE
+        self.limiter = RateLimiter(default=rate)
+        self.host = urlsplit(self.requester.FIND_CLUBS_BASE_URL).hostname
+        self.stats = dict(clubs=0, failed=0, bytes=0, fetch_seconds=0.0, extract_seconds=0.0, seconds=0.0)
+
+    @classmethod
+    def from_config(cls, engine: sa.engine.Engine, requester: Requester,
+                    config: ty.Optional[ty.Dict[str, ty.Any]]) -> "ClubCrawler":
+        config = config or dict()
+        return cls(engine, requester,
+                   workers=config.get('workers'),
+                   processes=config.get('processes'),
+                   rate=config.get('rate'),
+                   batch_size=config.get('batch_size'))
+
+    def pending(self, refresh: bool = False) -> ty.List[int]:
+        """
+        Distinct clubs of ``district_perf`` without details yet, or all of them with ``refresh``.
+        """
+        perf = schema.district_perf
+        detail = schema.club_detail
+
+        stmt = sa.select(perf.c.club).distinct().order_by(perf.c.club)
+        if not refresh:
+            done = sa.select(detail.c.club).where(detail.c.error.is_(None))
+            stmt = stmt.where(perf.c.club.not_in(done))
+
+        with self.engine.connect() as conn:
+            return [row[0] for row in conn.execute(stmt)]
+
+    def fetch(self, club: int) -> ty.Tuple[int, bytes | None, str | None]:
+        self.limiter.acquire(self.host)
+        try:
+            html = self.requester.fetch_club_detail('%08d' % club)
+        except Exception as e:
+            return club, None, '%s: %s' % (type(e).__name__, e)
+
+        return club, html, None
+
+    def save(self, rows: ty.List[ty.Dict[str, ty.Any]]) -> None:
+        table = schema.club_detail
+        insert_stmt = sa.dialects.postgresql.insert(table)
+        update_stmt = {c.key: c for c in insert_stmt.excluded if c.key != 'club'}
+        update_stmt['fetched_at'] = sa.func.now()
+
+        columns = [c.key for c in table.c if c.key != 'fetched_at']
+        rows = [{k: row.get(k) for k in columns} for row in rows]
+
+        with self.engine.begin() as conn:
+            conn.execute(insert_stmt.on_conflict_do_update(index_elements=[table.c.club], set_=update_stmt), rows)
+
+    def _batches(self, clubs: ty.List[int]) -> ty.Iterator[ty.List[int]]:
+        for i in range(0, len(clubs), self.batch_size):
+            yield clubs[i:i + self.batch_size]
+
+    def run(self, clubs: ty.Optional[ty.List[int]] = None, refresh: bool = False) -> ty.Dict[str, ty.Any]:
+        clubs = self.pending(refresh=refresh) if clubs is None else list(clubs)
+        total = len(clubs)
+        begin = time.monotonic()
+
+        logger.info('crawling %d clubs', total)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dpr-crawl') as threads, \
+                ProcessPoolExecutor(max_workers=self.processes) as processes:
+            for batch in self._batches(clubs):
+                started = time.monotonic()
+                pages = list(threads.map(self.fetch, batch))
+                fetched = time.monotonic()
+
+                rows = list(processes.map(extract_club_detail, *zip(*pages)))
+                self.save(rows)
+
+                self.stats['clubs'] += len(rows)
+                self.stats['failed'] += sum(1 for row in rows if row['error'])
+                self.stats['bytes'] += sum(len(html) for _, html, _ in pages if html)
+                self.stats['fetch_seconds'] += fetched - started
+                self.stats['extract_seconds'] += time.monotonic() - fetched
+
+                elapsed = time.monotonic() - begin
+                logger.info('checkpoint: %d/%d clubs, %d failed, %.1f pages/s, %.1f KiB/s',
+                            self.stats['clubs'], total, self.stats['failed'],
+                            self.stats['clubs'] / elapsed, self.stats['bytes'] / 1024 / elapsed)
+
+        self.stats['seconds'] = time.monotonic() - begin
+        return self.stats
@@ -1,9 +1,19 @@
 # -*- coding:utf-8 -*-
+import typing as ty
+
 import sqlalchemy as sa
 
 
+ENGINE_OPTIONS = ('echo', 'pool_size', 'max_overflow', 'pool_recycle', 'pool_pre_ping', 'pool_timeout')
 
-def create_engine(url: str):
-    _engine = sa.create_engine(url, echo=True)
-    return _engine
 
+def create_engine(url: str, **options: ty.Any):
+    """
+    Create the engine, ``options`` are the ``database`` section of the config,
+    only the keys listed in ``ENGINE_OPTIONS`` are passed through.
+    """
+    kwargs = dict(echo=False)
+    kwargs.update((k, v) for k, v in options.items() if k in ENGINE_OPTIONS and v is not None)
+
+    _engine = sa.create_engine(url, **kwargs)
+    return _engine
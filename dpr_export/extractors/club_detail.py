@@ -25,7 +25,10 @@ class ClubDetailExtractor(BaseExtractor):
     PATTERN_CLUB_DISTRICT_AREA = re.compile(r'Club Number:[\s\n]+\d{8}, (?P<district>\d{1,3}), Area (?P<division>[A-Z])(?P<area>\d{2})')
 
     def extract_club_district_area(self, soap: BeautifulSoup) -> ty.Optional[ty.Tuple[str, str, str]]:
-        t = soap.text.replace(self.CHR_0xa0, ' ')
+        return self.parse_club_district_area(soap.text)
+
+    def parse_club_district_area(self, text: str) -> ty.Optional[ty.Tuple[str, str, str]]:
+        t = text.replace(self.CHR_0xa0, ' ')
         m = self.PATTERN_CLUB_DISTRICT_AREA.search(t)
         if not m:
             return None
@@ -44,9 +47,12 @@ class ClubDetailExtractor(BaseExtractor):
         base = soap.select('div.contact-info-body')
         base = base[0]
 
+        return self.parse_address(base.contents)
+
+    def parse_address(self, contents: ty.Iterable[ty.Any]) -> ty.List[str]:
         results = list()
 
-        for child in base.contents:
+        for child in contents:
             if not isinstance(child, str):
                 continue
 
@@ -62,7 +68,10 @@ class ClubDetailExtractor(BaseExtractor):
         return results
 
     def extract_location_wgs84(self, soap: BeautifulSoup) -> ty.Optional[ty.Tuple[float, float]]:
-        m = self.PATTERN_CLUB_LOCATION.search(str(soap))
+        return self.parse_location_wgs84(self.PATTERN_CLUB_LOCATION.search(str(soap)))
+
+    @staticmethod
+    def parse_location_wgs84(m: ty.Optional[ty.Match]) -> ty.Optional[ty.Tuple[float, float]]:
         if not m:
             return None
 
@@ -83,9 +92,12 @@ class ClubDetailExtractor(BaseExtractor):
         base = soap.select('div.contact-info-meeting-times')
         base = base[0]
 
+        return self.parse_meeting_times(base.contents)
+
+    def parse_meeting_times(self, contents: ty.Iterable[ty.Any]) -> ty.Optional[ty.Dict[str, ty.Any]]:
         result = ''
 
-        for child in base.contents:
+        for child in contents:
             if not isinstance(child, str):
                 continue
 
@@ -116,7 +128,17 @@ class ClubDetailExtractor(BaseExtractor):
         name = self.extract_club_name(soap)
         address = self.extract_address(soap)
         location_ti = self.extract_location_wgs84(soap)
-        district, division, area = self.extract_club_district_area(soap)
+        district_area = self.extract_club_district_area(soap)
+        meeting_time = self.extract_meeting_times(soap)
+
+        return self.build_result(name=name, address=address, location_ti=location_ti,
+                                 district_area=district_area, meeting_time=meeting_time)
+
+    @staticmethod
+    def build_result(name: str, address: ty.List[str], location_ti: ty.Optional[ty.Tuple[float, float]],
+                     district_area: ty.Optional[ty.Tuple[str, str, str]],
+                     meeting_time: ty.Optional[ty.Dict[str, ty.Any]]) -> ty.Dict[str, ty.Any]:
+        district, division, area = district_area
 
         if location_ti:
             lat, lon = location_ti
@@ -125,8 +147,6 @@ class ClubDetailExtractor(BaseExtractor):
         else:
             location_local = None
 
-        meeting_time = self.extract_meeting_times(soap)
-
         result = dict(name=name,
                       address=address,
                       district=district,
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+
+import re
+import lxml.html
+from .club_detail import ClubDetailExtractor
+
+
+class FastClubDetailExtractor(ClubDetailExtractor):
+    """
+    Drop-in replacement of ``ClubDetailExtractor.extract`` with the same output.
+
+    The page is parsed once with ``lxml.html`` and every field is collected in a single
+    walk over the tree, without CSS selectors. The map link is matched against the raw
+    bytes and the district/area against the text of the element holding ``Club Number:``
+    only, instead of re-serialising or flattening the whole document.
+    """
+
+    PATTERN_CLUB_LOCATION_BYTES = re.compile(ClubDetailExtractor.PATTERN_CLUB_LOCATION.pattern.encode('ascii'))
+    PATTERN_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+    CLUB_NUMBER = 'Club Number:'
+    DEFAULT_ENCODING = 'utf-8'
+
+    @staticmethod
+    def direct_strings(element: lxml.html.HtmlElement) -> ty.List[str]:
+        """
+        The text nodes directly under ``element``, comments included, like ``Tag.contents`` does.
+        """
+        strings = list()
+        if element.text is not None:
+            strings.append(element.text)
+
+        for child in element:
+            if not isinstance(child.tag, str) and child.text is not None:
+                strings.append(child.text)
+            if child.tail is not None:
+                strings.append(child.tail)
+
+        return strings
+
+    def parse(self, html: ty.AnyStr) -> lxml.html.HtmlElement:
+        if isinstance(html, str):
+            return lxml.html.document_fromstring(html)
+
+        m = self.PATTERN_META_CHARSET.search(html, 0, 4096)
+        encoding = m.group(1).decode('ascii') if m else self.DEFAULT_ENCODING
+        return lxml.html.document_fromstring(html, parser=lxml.html.HTMLParser(encoding=encoding))
+
+    def extract(self, html: ty.AnyStr) -> ty.Dict[str, ty.Any]:
+        root = self.parse(html)
+
+        titles = list()
+        bodies = list()
+        meeting_times = list()
+        club_number = None
+
+        for element in root.iter():
+            tag = element.tag
+            if not isinstance(tag, str):
+                continue
+
+            if tag in ('h1', 'div'):
+                classes = (element.get('class') or '').split()
+                if tag == 'h1' and 'title' in classes:
+                    titles.append(element)
+                elif 'contact-info-body' in classes:
+                    bodies.append(element)
+                elif 'contact-info-meeting-times' in classes:
+                    meeting_times.append(element)
+
+            if club_number is None and element.text and self.CLUB_NUMBER in element.text:
+                club_number = element
+
+        if isinstance(html, str):
+            location = self.PATTERN_CLUB_LOCATION.search(html)
+        else:
+            location = self.PATTERN_CLUB_LOCATION_BYTES.search(html)
+
+        district_area = None
+        if club_number is not None:
+            district_area = self.parse_club_district_area(club_number.text_content())
+        if district_area is None:
+            district_area = self.parse_club_district_area(root.text_content())
+
+        name = titles[0].text_content().strip()
+        address = self.parse_address(self.direct_strings(bodies[0]))
+        meeting_time = self.parse_meeting_times(self.direct_strings(meeting_times[0]))
+
+        return self.build_result(name=name,
+                                 address=address,
+                                 location_ti=self.parse_location_wgs84(location),
+                                 district_area=district_area,
+                                 meeting_time=meeting_time)
@@ -0,0 +1,176 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import os
+import uuid
+import contextlib
+
+import pandas as pd
+import sqlalchemy as sa
+
+from . import schema
+from . import metrics
+from .persistence import DTYPES, typed
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, see README
+    pa = None
+
+
+PARTITION_COLUMNS = ('district', 'report_year', 'report_month')
+
+Filters = ty.List[ty.Tuple[str, str, ty.Any]]
+
+
+def arrow_type(column: sa.Column) -> "pa.DataType":
+    if DTYPES[column.key] == 'category':
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(column.type, sa.Integer):
+        return pa.int32()
+    if isinstance(column.type, sa.Date):
+        return pa.date32()
+    return pa.string()
+
+
+def arrow_schema(table: sa.Table) -> "pa.Schema":
+    """
+    Arrow schema of the columns of ``table`` a report frame holds, see ``persistence.DTYPES``.
+    """
+    return pa.schema([pa.field(c.key, arrow_type(c), nullable=c.nullable)
+                      for c in table.c if c.key in DTYPES])
+
+
+class LakeWriter(object):
+    """
+    Writes report frames into their partitions of a ``ParquetLake``, one Parquet file per
+    partition. Files are written next to their destination under a hidden name and only
+    renamed into place by ``commit``, so readers see either the previous or the new data.
+    """
+
+    def __init__(self, lake: "ParquetLake") -> None:
+        self.lake = lake
+        self.writers: ty.Dict[ty.Tuple[ty.Any, ...], ty.Tuple[str, "pq.ParquetWriter"]] = dict()
+        self.rows = 0
+
+    def write(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Append ``df`` to the files of its partitions, returns ``df`` for chaining with other sinks.
+        """
+        with metrics.registry.timer('lake', rows=len(df)):
+            df = typed(df)
+            for key, part in df.groupby(list(PARTITION_COLUMNS), observed=True, sort=False):
+                _, writer = self._writer(key)
+                writer.write_table(pa.Table.from_pandas(part, schema=self.lake.file_schema, preserve_index=False))
+
+        self.rows += len(df)
+        return df
+
+    def _writer(self, key: ty.Tuple[ty.Any, ...]) -> ty.Tuple[str, "pq.ParquetWriter"]:
+        key = tuple(str(value) for value in key)
+        if key not in self.writers:
+            directory = self.lake.partition_path(*key)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, '.%s.tmp' % uuid.uuid4().hex)
+            self.writers[key] = path, pq.ParquetWriter(path, self.lake.file_schema,
+                                                       compression=self.lake.compression)
+        return self.writers[key]
+
+    def abort(self) -> None:
+        for path, writer in self.writers.values():
+            writer.close()
+            if os.path.exists(path):
+                os.unlink(path)
+        self.writers.clear()
+
+    def commit(self) -> int:
+        for key, (path, writer) in self.writers.items():
+            writer.close()
+            os.replace(path, os.path.join(self.lake.partition_path(*key), self.lake.FILE_NAME))
+        self.writers.clear()
+        return self.rows
+
+
+class ParquetLake(object):
+    """
+    Cleaned reports as a Parquet dataset, hive partitioned by district, report year and month:
+    ``<directory>/district=88/report_year=2023/report_month=6/part-0.parquet``.
+
+    A report is a full snapshot of its period, so writing it again replaces the partition.
+    ``read`` prunes partitions and row groups with the given filters before loading anything.
+    """
+
+    FILE_NAME = 'part-0.parquet'
+    DEFAULT_COMPRESSION = 'zstd'
+
+    def __init__(self, directory: str, compression: str | None = None, table: sa.Table = schema.district_perf) -> None:
+        if pa is None:
+            raise RuntimeError('ParquetLake requires pyarrow, install it with `pip install pyarrow`')
+
+        self.directory = os.path.expanduser(directory)
+        self.compression = compression or self.DEFAULT_COMPRESSION
+        self.schema = arrow_schema(table)
+        # partition values live in the directory names only, and read back as plain strings
+        self.file_schema = pa.schema([f for f in self.schema if f.name not in PARTITION_COLUMNS])
+        self.partition_schema = pa.schema([pa.field(f.name, f.type.value_type if pa.types.is_dictionary(f.type)
+                                                    else f.type) for f in map(self.schema.field, PARTITION_COLUMNS)])
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]]) -> ty.Optional["ParquetLake"]:
+        config = config or dict()
+        if not config.get('directory'):
+            return None
+
+        return cls(config['directory'], compression=config.get('compression'))
+
+    def partition_path(self, district: ty.Any, report_year: ty.Any, report_month: ty.Any) -> str:
+        return os.path.join(self.directory, 'district=%s' % district, 'report_year=%s' % report_year,
+                            'report_month=%s' % report_month)
+
+    @contextlib.contextmanager
+    def writer(self) -> ty.Iterator[LakeWriter]:
+        """
+        Everything written inside the block is committed at once when it exits cleanly.
+        """
+        writer = LakeWriter(self)
+        try:
+            yield writer
+        except BaseException:
+            writer.abort()
+            raise
+        writer.commit()
+
+    def write(self, df: pd.DataFrame) -> int:
+        with self.writer() as writer:
+            writer.write(df)
+        return writer.rows
+
+    def dataset(self) -> "ds.Dataset":
+        return ds.dataset(self.directory, format='parquet',
+                          partitioning=ds.partitioning(self.partition_schema, flavor='hive'),
+                          schema=pa.unify_schemas([self.file_schema, self.partition_schema]))
+
+    def scan(self, columns: ty.Optional[ty.List[str]] = None, filters: ty.Optional[Filters] = None) -> "pa.Table":
+        """
+        Read ``columns`` of the rows matching ``filters``, a list of ``(column, op, value)``
+        conditions combined with AND (see ``pyarrow.parquet.filters_to_expression``).
+        """
+        expression = pq.filters_to_expression(filters) if filters else None
+        return self.dataset().to_table(columns=columns, filter=expression)
+
+    def read(self, columns: ty.Optional[ty.List[str]] = None, filters: ty.Optional[Filters] = None) -> pd.DataFrame:
+        return typed(self.scan(columns=columns, filters=filters).to_pandas())
+
+    def partitions(self) -> ty.List[ty.Tuple[str, int, int]]:
+        """
+        (district, report year, report month) of every report in the lake.
+        """
+        result = list()
+        for fragment in self.dataset().get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            result.append(tuple(keys[c] for c in PARTITION_COLUMNS))
+        return sorted(result)
@@ -0,0 +1,199 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import datetime
+
+import sqlalchemy as sa
+
+from . import schema
+
+
+Unit = ty.Dict[str, ty.Any]
+
+
+def now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class Ledger(object):
+    """
+    Status of every report of a run, one row per (district, year, month) in ``job_ledger``.
+
+    A unit goes ``pending`` -> ``running`` -> ``done`` or ``failed``, with its attempts,
+    bytes, rows and duration. ``claim`` only hands a unit to one worker at a time, so
+    several threads or processes can share a ledger; a ``running`` unit whose worker
+    died is claimable again once its ``lease_seconds`` are over. ``resume`` works off
+    ``unfinished``.
+
+    The ledger lives in a SQLite file (``sqlite:///path``) or in the exporter's own
+    PostgreSQL database (``etc/003-create_job_ledger.sql``).
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    DEFAULT_LEASE_SECONDS = 600
+    SQLITE_BUSY_TIMEOUT_MS = 30000
+
+    def __init__(self, engine: sa.engine.Engine, lease_seconds: int | None = None) -> None:
+        self.engine = engine
+        self.table = schema.job_ledger
+        self.lease_seconds = lease_seconds or self.DEFAULT_LEASE_SECONDS
+
+        if engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'connect', self._sqlite_connect)
+            schema.metadata.create_all(engine, tables=[self.table])
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]],
+                    engine: ty.Optional[sa.engine.Engine] = None) -> ty.Optional["Ledger"]:
+        """
+        ``url`` of the ledger database, the exporter's ``engine`` when left out.
+        """
+        config = config or dict()
+        if not config.get('enabled', True):
+            return None
+
+        if config.get('url'):
+            engine = sa.create_engine(config['url'])
+        elif engine is None:
+            raise ValueError('The ledger needs a url or the database_url')
+
+        return cls(engine, lease_seconds=config.get('lease_seconds'))
+
+    def _sqlite_connect(self, connection, _) -> None:
+        # WAL lets readers and one writer work concurrently, writers wait for each other
+        cursor = connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA busy_timeout=%d' % self.SQLITE_BUSY_TIMEOUT_MS)
+        cursor.close()
+
+    def _key(self, unit: Unit) -> sa.ColumnElement[bool]:
+        table = self.table
+        return sa.and_(table.c.district == str(unit['district']),
+                       table.c.report_year == unit['year'],
+                       table.c.report_month == unit['month'])
+
+    def _insert(self):
+        if self.engine.dialect.name == 'sqlite':
+            return sa.dialects.sqlite.insert(self.table)
+        return sa.dialects.postgresql.insert(self.table)
+
+    def add(self, units: ty.Iterable[Unit]) -> int:
+        """
+        Mark ``units`` pending, new ones are added and finished ones queued again. Units
+        another worker holds, or finished within the last ``lease_seconds``, are left
+        alone: two runs of the same reports do not both export them.
+        Returns the number of units.
+        """
+        table = self.table
+        timestamp = now()
+        stale = timestamp - datetime.timedelta(seconds=self.lease_seconds)
+        rows = [dict(district=str(u['district']), report_year=u['year'], report_month=u['month'],
+                     status=self.PENDING, attempts=0, updated_at=timestamp) for u in units]
+        if not rows:
+            return 0
+
+        stmt = self._insert()
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.district, table.c.report_year, table.c.report_month],
+            set_=dict(status=stmt.excluded.status, error=None, updated_at=stmt.excluded.updated_at),
+            # no IN here, expanding parameters do not go with executemany
+            where=sa.or_(table.c.status == self.PENDING, table.c.status == self.FAILED, table.c.updated_at < stale))
+
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+        return len(rows)
+
+    def claim(self, unit: Unit) -> bool:
+        """
+        Mark ``unit`` running unless another worker holds it or it is done already.
+        """
+        table = self.table
+        timestamp = now()
+        stale = timestamp - datetime.timedelta(seconds=self.lease_seconds)
+
+        stmt = sa.update(table).where(
+            self._key(unit),
+            sa.or_(table.c.status.in_((self.PENDING, self.FAILED)),
+                   sa.and_(table.c.status == self.RUNNING, table.c.updated_at < stale)),
+        ).values(status=self.RUNNING, attempts=table.c.attempts + 1, error=None,
+                 started_at=timestamp, updated_at=timestamp)
+
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).rowcount == 1
+
+    def _finish(self, unit: Unit, status: str, **values: ty.Any) -> None:
+        table = self.table
+        timestamp = now()
+
+        with self.engine.begin() as conn:
+            started_at = conn.execute(sa.select(table.c.started_at).where(self._key(unit))).scalar()
+            if started_at is not None:
+                if started_at.tzinfo is None:  # SQLite keeps no time zone
+                    started_at = started_at.replace(tzinfo=datetime.timezone.utc)
+                values['seconds'] = (timestamp - started_at).total_seconds()
+
+            conn.execute(sa.update(table).where(self._key(unit)).values(status=status, updated_at=timestamp,
+                                                                           **values))
+
+    def fetched(self, unit: Unit, size: int) -> None:
+        """
+        Record the report size, and renew the lease of the running unit.
+        """
+        with self.engine.begin() as conn:
+            conn.execute(sa.update(self.table).where(self._key(unit)).values(bytes=size, updated_at=now()))
+
+    def renew(self, unit: Unit) -> None:
+        """
+        Renew the lease of the running unit, e.g. before loading it takes a while.
+        """
+        table = self.table
+        with self.engine.begin() as conn:
+            conn.execute(sa.update(table).where(self._key(unit), table.c.status == self.RUNNING).values(
+                updated_at=now()))
+
+    def done(self, unit: Unit, rows: int | None = None) -> None:
+        self._finish(unit, self.DONE, rows=rows)
+
+    def failed(self, unit: Unit, error: BaseException | str) -> None:
+        if isinstance(error, BaseException):
+            error = '%s: %s' % (type(error).__name__, error)
+        self._finish(unit, self.FAILED, error=error)
+
+    def unfinished(self) -> ty.List[Unit]:
+        """
+        Units still pending, failed, or running when their run was interrupted.
+        """
+        table = self.table
+        stmt = sa.select(table.c.district, table.c.report_year, table.c.report_month).where(
+            table.c.status != self.DONE).order_by(table.c.district, table.c.report_year, table.c.report_month)
+
+        with self.engine.connect() as conn:
+            return [dict(district=int(d) if d.isdigit() else d, year=y, month=m) for d, y, m in conn.execute(stmt)]
+
+    def summary(self) -> ty.Dict[str, ty.Dict[str, ty.Any]]:
+        """
+        Units, attempts, bytes, rows and seconds per status.
+        """
+        table = self.table
+        stmt = sa.select(table.c.status, sa.func.count(), sa.func.sum(table.c.attempts), sa.func.sum(table.c.bytes),
+                         sa.func.sum(table.c.rows), sa.func.sum(table.c.seconds)).group_by(table.c.status)
+
+        with self.engine.connect() as conn:
+            # PostgreSQL sums bigints to numeric
+            return {status: dict(units=units, attempts=int(attempts or 0), bytes=int(size or 0),
+                                 rows=int(rows or 0), seconds=round(float(seconds or 0), 3))
+                    for status, units, attempts, size, rows, seconds in conn.execute(stmt)}
+
+    def failures(self) -> ty.List[ty.Dict[str, ty.Any]]:
+        table = self.table
+        stmt = sa.select(table.c.district, table.c.report_year, table.c.report_month, table.c.attempts,
+                         table.c.error).where(table.c.status == self.FAILED)
+
+        with self.engine.connect() as conn:
+            return [dict(row._mapping) for row in conn.execute(stmt)]
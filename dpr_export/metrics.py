@@ -0,0 +1,98 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import json
+import time
+import threading
+import contextlib
+
+
+class Metrics(object):
+    """
+    Per-stage timing registry.
+
+    Every measurement is aggregated per stage (count, seconds, bytes, rows) and, once
+    ``configure`` gave it a sink, also written as one JSON line. ``prometheus`` renders
+    the aggregates in the Prometheus text exposition format.
+
+    Stages used by the exporter: ``fetch`` (HTTP, bytes), ``decode`` (bytes),
+    ``parse`` (``read_csv``, rows), ``transform`` (rows), ``load`` (rows) and ``rollup``
+    (rollup rows).
+    """
+
+    PREFIX = 'dpr_export'
+    FIELDS = ('bytes', 'rows')
+
+    def __init__(self) -> None:
+        self.totals: ty.Dict[str, ty.Dict[str, float]] = dict()
+        self.sink: ty.Optional[ty.TextIO] = None
+        self._lock = threading.Lock()
+
+    def configure(self, path: str | None = None) -> "Metrics":
+        if self.sink is not None:
+            self.sink.close()
+        self.sink = open(path, 'a', buffering=1) if path else None
+        return self
+
+    def close(self) -> None:
+        self.configure(None)
+
+    def record(self, stage: str, seconds: float, **fields: ty.Any) -> None:
+        with self._lock:
+            totals = self.totals.setdefault(stage, dict(count=0, seconds=0.0, bytes=0, rows=0))
+            totals['count'] += 1
+            totals['seconds'] += seconds
+            for key in self.FIELDS:
+                totals[key] += fields.get(key) or 0
+
+            if self.sink is not None:
+                event = dict(ts=round(time.time(), 6), stage=stage, seconds=round(seconds, 6))
+                event.update(fields)
+                self.sink.write(json.dumps(event, default=str) + '\n')
+
+    @contextlib.contextmanager
+    def timer(self, stage: str, **fields: ty.Any) -> ty.Iterator[ty.Dict[str, ty.Any]]:
+        """
+        Time the block, the yielded dict can be filled with ``bytes``/``rows`` on the way.
+        """
+        begin = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(stage, time.perf_counter() - begin, **fields)
+
+    def summary(self) -> ty.Dict[str, ty.Dict[str, float]]:
+        with self._lock:
+            result = dict()
+            for stage, totals in self.totals.items():
+                seconds = totals['seconds']
+                result[stage] = dict(totals)
+                for key in self.FIELDS:
+                    if totals[key] and seconds:
+                        result[stage]['%s_per_second' % key] = round(totals[key] / seconds, 3)
+            return result
+
+    def prometheus(self) -> str:
+        lines = list()
+        series = (('count', 'counter', 'Measurements'),
+                  ('seconds', 'counter', 'Seconds spent'),
+                  ('bytes', 'counter', 'Bytes handled'),
+                  ('rows', 'counter', 'Rows handled'))
+
+        with self._lock:
+            for key, kind, help_ in series:
+                name = '%s_stage_%s_total' % (self.PREFIX, key)
+                lines.append('# HELP %s %s per stage.' % (name, help_))
+                lines.append('# TYPE %s %s' % (name, kind))
+                for stage, totals in sorted(self.totals.items()):
+                    lines.append('%s{stage="%s"} %s' % (name, stage, totals[key]))
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self) -> None:
+        with self._lock:
+            self.totals.clear()
+
+
+registry = Metrics()
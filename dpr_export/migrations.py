@@ -0,0 +1,149 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import os
+import re
+import logging
+
+import sqlalchemy as sa
+
+from . import schema
+
+
+logger = logging.getLogger(__name__)
+
+# The SQL scripts of ``etc``, applied in the order of their number.
+MIGRATIONS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'etc')
+MIGRATION_FILE = re.compile(r'^(\d+)-([\w-]+)\.sql$')
+
+# Migrations and partition changes of concurrent exporters are serialized on this advisory lock.
+LOCK = 0x647072  # 'dpr'
+
+PARTITION_BOUND = re.compile(r'FROM \((\d+)\) TO \((\d+)\)')
+
+
+class Migration(ty.NamedTuple):
+    version: int
+    name: str
+    path: str
+
+    def sql(self) -> str:
+        with open(self.path, 'r') as f:
+            return f.read()
+
+
+def migrations(directory: str | None = None) -> ty.List[Migration]:
+    directory = directory or MIGRATIONS_DIRECTORY
+    result = list()
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            result.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+
+    return sorted(result)
+
+
+class Migrator(object):
+    """
+    Apply the versioned SQL migrations of ``etc`` to a PostgreSQL database.
+
+    Applied versions are recorded in ``schema_migrations``, every migration runs in a
+    transaction of its own together with its record, so a failed one is simply retried
+    by the next ``migrate``. The scripts of a database set up by hand before migrations
+    existed only create what is missing.
+    """
+
+    def __init__(self, engine: sa.engine.Engine, directory: str | None = None) -> None:
+        self.engine = engine
+        self.directory = directory
+        self.table = schema.schema_migrations
+
+    def applied(self) -> ty.Dict[int, ty.Dict[str, ty.Any]]:
+        schema.metadata.create_all(self.engine, tables=[self.table])
+
+        table = self.table
+        with self.engine.connect() as conn:
+            return {row.version: dict(row._mapping) for row in conn.execute(sa.select(table).order_by(table.c.version))}
+
+    def pending(self) -> ty.List[Migration]:
+        applied = self.applied()
+        return [m for m in migrations(self.directory) if m.version not in applied]
+
+    def migrate(self, target: int | None = None) -> ty.List[Migration]:
+        """
+        Apply the pending migrations up to ``target``, all of them by default.
+        """
+        done = list()
+        for migration in self.pending():
+            if target is not None and migration.version > target:
+                break
+
+            with self.engine.begin() as conn:
+                conn.execute(sa.select(sa.func.pg_advisory_xact_lock(LOCK)))
+                exists = sa.select(self.table.c.version).where(self.table.c.version == migration.version)
+                if conn.execute(exists).first() is not None:  # applied by a concurrent migrate
+                    continue
+
+                logger.info('applying migration %03d %s', migration.version, migration.name)
+                # a raw cursor, scripts are run as they are without parameter interpolation
+                cursor = conn.connection.cursor()
+                try:
+                    cursor.execute(migration.sql())
+                finally:
+                    cursor.close()
+                conn.execute(self.table.insert().values(version=migration.version, name=migration.name))
+
+            done.append(migration)
+
+        return done
+
+
+def partition_name(table: str, year: int) -> str:
+    return '%s_y%d' % (table, year)
+
+
+def is_partitioned(conn: sa.engine.Connection, table: str) -> bool:
+    stmt = sa.text('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))')
+    return bool(conn.execute(stmt, dict(table=table)).scalar())
+
+
+def partitions(conn: sa.engine.Connection, table: str) -> ty.Dict[int, str]:
+    """
+    Name of the partition of ``table`` holding every report year.
+    """
+    stmt = sa.text('SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+                   'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table)')
+
+    result = dict()
+    for name, bound in conn.execute(stmt, dict(table=table)):
+        match = PARTITION_BOUND.search(bound or '')
+        if match:
+            for year in range(int(match.group(1)), int(match.group(2))):
+                result[year] = name
+
+    return result
+
+
+def attach_partitions(engine: sa.engine.Engine, table: str, years: ty.Iterable[int]) -> ty.Dict[int, str]:
+    """
+    Create the partitions of ``table`` missing for ``years``, returns every partition.
+    """
+    years = {int(year) for year in years}
+    quote = engine.dialect.identifier_preparer.quote
+
+    with engine.begin() as conn:
+        existing = partitions(conn, table)
+        if years.issubset(existing):
+            return existing
+
+        conn.execute(sa.select(sa.func.pg_advisory_xact_lock(LOCK)))
+        existing = partitions(conn, table)
+        for year in sorted(years - set(existing)):
+            name = partition_name(table, year)
+            logger.info('attaching partition %s', name)
+            conn.exec_driver_sql('CREATE TABLE %s PARTITION OF %s FOR VALUES FROM (%d) TO (%d)'
+                                 % (quote(name), quote(table), year, year + 1))
+            existing[year] = name
+
+    return existing
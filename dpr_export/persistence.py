@@ -3,11 +3,21 @@ from __future__ import annotations
 
 import typing as ty
 import io
+import contextlib
+import hashlib
+import threading
+import time
+import re
 import datetime
 import sqlalchemy as sa
 import pandas as pd
 import numpy as np
 
+from . import schema
+from . import metrics
+from . import migrations
+from .rollups import frame_keys, stored_keys, refresh as refresh_rollups
+
 COLUMN_MAP = {
     'District': 'district',
     'Division': 'division',
@@ -25,6 +35,38 @@ COLUMN_MAP = {
     'Charter Date/Suspend Date': 'charter_suspend_date'
 }
 
+CATEGORY_COLUMNS = ('district', 'division', 'area', 'distinguished_status')
+
+
+def frame_dtypes(table: sa.Table) -> ty.Dict[str, str]:
+    """
+    pandas dtypes of the columns of ``table``: nullable ``Int32`` for integers,
+    ``category`` for the low-cardinality codes, ``datetime64`` for dates.
+    """
+    dtypes = dict()
+    for column in table.c:
+        if column.primary_key or column.key == 'updated_at':
+            continue
+        if isinstance(column.type, sa.Integer):
+            dtypes[column.key] = 'Int32'
+        elif isinstance(column.type, sa.Date):
+            dtypes[column.key] = 'datetime64[ns]'
+        elif column.key in CATEGORY_COLUMNS:
+            dtypes[column.key] = 'category'
+        else:
+            dtypes[column.key] = 'string'
+
+    return dtypes
+
+
+# Typed layout of a cleaned report, shared by the parser and the loaders.
+DTYPES = frame_dtypes(schema.district_perf)
+
+# Text columns are read as strings straight away, the rest is cast by ``typed`` once the
+# footer row is gone: the footer would pollute the categories, and ``read_csv`` parses
+# nullable integers several times slower than casting its float columns afterwards.
+READ_DTYPES = {header: str for header, column in COLUMN_MAP.items() if DTYPES.get(column) in ('category', 'string')}
+
 
 def charter_or_suspend_date(in_: ty.AnyStr | ty.Any) -> np.ndarray:
     """
@@ -65,22 +107,112 @@ def charter_or_suspend_date(in_: ty.AnyStr | ty.Any) -> np.ndarray:
     return result
 
 
-def clean(origin: str) -> pd.DataFrame:
-    df = pd.read_csv(io.StringIO(origin))
-    df.drop(df.tail(1).index, inplace=True)
+PATTERN_CHARTER_SUSPEND_DATE = r'^\s*(?:charter\s+(?P<charter_date>\S+))?\s*(?:susp\s+(?P<suspend_date>\S+))?'
+CHARTER_SUSPEND_DATE_FORMAT = '%m/%d/%y'
+
+
+def charter_suspend_dates(column: pd.Series) -> pd.DataFrame:
+    """
+    Columnar counterpart of ``charter_or_suspend_date``, parses the whole column in one pass.
+
+    Returns a frame with ``charter_date`` and ``suspend_date`` columns of ``datetime64``,
+    missing dates are ``NaT``.
+    """
+    matched = column.str.extract(PATTERN_CHARTER_SUSPEND_DATE, flags=re.IGNORECASE)
+
+    result = pd.DataFrame(index=column.index)
+    for field in ('charter_date', 'suspend_date'):
+        result[field] = pd.to_datetime(matched[field], format=CHARTER_SUSPEND_DATE_FORMAT)
+
+    return result
+
+
+def typed(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns of ``df`` declared in ``DTYPES``, columns already typed are left as they are.
+    """
+    dtypes = {column: DTYPES[column] for column in df.columns
+              if column in DTYPES and df[column].dtype != DTYPES[column]}
+    return df.astype(dtypes) if dtypes else df
+
+
+def transform(df: pd.DataFrame) -> pd.DataFrame:
     df.rename(columns=COLUMN_MAP, inplace=True)
 
-    df[['charter_date', 'suspend_date']] = df.apply(lambda x: charter_or_suspend_date(x['charter_suspend_date']),
-                                                    axis=1, result_type='expand')
+    # "04" and "4" are the same area, stored without the padding like the club pages do
+    area = df['area'].astype('string').str.lstrip('0')
+    df['area'] = area.mask(area == '', '0')
+
+    df[['charter_date', 'suspend_date']] = charter_suspend_dates(df['charter_suspend_date'].astype('string'))
+
+    return typed(df)
 
+
+def read_report(origin: str | bytes, encoding: str | None = None) -> pd.DataFrame:
+    """
+    Parse a report, raw bytes are decoded by the CSV parser itself.
+    """
+    source = io.BytesIO(origin) if isinstance(origin, bytes) else io.StringIO(origin)
+    df = pd.read_csv(source, dtype=READ_DTYPES, encoding=encoding)
+    df.drop(df.tail(1).index, inplace=True)
     return df
 
 
+def clean(origin: str) -> pd.DataFrame:
+    return transform(read_report(origin))
+
+
+def clean_chunks(source: ty.IO, chunksize: int) -> ty.Iterator[pd.DataFrame]:
+    """
+    Streaming counterpart of ``clean``, reads ``source`` ``chunksize`` rows at a time.
+
+    Every chunk is held back until the next one arrives, so the trailing footer row
+    is dropped from the last chunk wherever the chunk boundary falls.
+    """
+    previous = None
+
+    for chunk in pd.read_csv(source, chunksize=chunksize, dtype=READ_DTYPES):
+        if previous is not None:
+            yield transform(previous)
+        previous = chunk
+
+    if previous is None:
+        return
+
+    previous = previous.iloc[:-1].copy()
+    if len(previous):
+        yield transform(previous)
+
+
 def unique_key(df: pd.DataFrame, year: int, month: int) -> pd.DataFrame:
-    df[['report_year', 'report_month']] = df.apply(lambda x: (year, month), axis=1, result_type='expand')
+    df['report_year'] = pd.Series(year, index=df.index, dtype=DTYPES['report_year'])
+    df['report_month'] = pd.Series(month, index=df.index, dtype=DTYPES['report_month'])
     return df
 
 
+def parse_report(report: ty.Dict[str, ty.Any]) -> ty.Dict[str, ty.Any]:
+    """
+    Pipeline step turning ``report['data']`` into ``report['frame']``, picklable so it
+    can run in a process pool. ``data`` may be the raw body with its ``encoding``, so
+    decoding happens in the worker as well. Timings are returned in ``report['timings']``
+    for the parent process to record.
+    """
+    report = dict(report)
+    unit = report['unit']
+    timings = report.setdefault('timings', list())
+
+    begin = time.perf_counter()
+    df = read_report(report.pop('data'), encoding=report.pop('encoding', None))
+    timings.append(('parse', time.perf_counter() - begin, dict(rows=len(df))))
+
+    begin = time.perf_counter()
+    df = unique_key(transform(df), year=unit['year'], month=unit['month'])
+    timings.append(('transform', time.perf_counter() - begin, dict(rows=len(df))))
+
+    report['frame'] = df
+    return report
+
+
 def create_upsert_method(meta: sa.MetaData, extra_update_fields: ty.Optional[ty.Dict[str, str]],
                          constraint: str):
     """
@@ -90,8 +222,11 @@ def create_upsert_method(meta: sa.MetaData, extra_update_fields: ty.Optional[ty.
     """
 
     def method(table, conn, keys, data_iter):
-        # select table that data is being inserted to (from pandas' context)
-        sql_table = sa.Table(table.name, meta, autoload_with=conn)
+        # select table that data is being inserted to (from pandas' context),
+        # reflected only the first time it is seen by ``meta``
+        sql_table = meta.tables.get(table.name)
+        if sql_table is None:
+            sql_table = sa.Table(table.name, meta, autoload_with=conn)
 
         # list of dictionaries {col_name: value} of data to insert
         values_to_insert = [dict(zip(keys, data)) for data in data_iter]
@@ -117,7 +252,135 @@ def create_upsert_method(meta: sa.MetaData, extra_update_fields: ty.Optional[ty.
     return method
 
 
-def save(df: pd.DataFrame, conn) -> None:
+def integral_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast float columns holding only whole numbers back to nullable integers,
+    ``read_csv`` turns count columns into floats as soon as one cell is empty.
+    """
+    df = df.copy()
+    for column in df.select_dtypes(include='floating').columns:
+        values = df[column].dropna()
+        if (values == values.round()).all():
+            df[column] = df[column].astype('Int64')
+
+    return df
+
+
+def copy_upsert(df: pd.DataFrame, conn, table: str, constraint: str,
+                extra_update_fields: ty.Optional[ty.Dict[str, str]], only_changed: bool = False,
+                index_elements: ty.Optional[ty.Sequence[str]] = None) -> int:
+    """
+    Stream the frame into a temporary staging table with ``COPY FROM STDIN`` and
+    merge it into ``table`` with one set-based ``INSERT ... SELECT ... ON CONFLICT``.
+    The staging table lives until the transaction ends, the chunks of a report written
+    in one transaction share it.
+
+    Conflicts are detected on ``index_elements`` when given, on ``constraint`` otherwise.
+    With ``only_changed`` existing rows are only updated when one of the columns differs.
+    Returns the number of rows inserted or updated.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    columns = [quote(c) for c in df.columns]
+    staging = quote('%s_staging' % table)
+    target = quote(table)
+
+    updates = ['%s = EXCLUDED.%s' % (c, c) for c in columns]
+    if extra_update_fields:
+        updates.extend('%s = %s' % (quote(k), v) for k, v in extra_update_fields.items())
+
+    guard = ''
+    if only_changed:
+        guard = ' WHERE (%s) IS DISTINCT FROM (%s)' % (
+            ', '.join('%s.%s' % (target, c) for c in columns),
+            ', '.join('EXCLUDED.%s' % c for c in columns))
+
+    if index_elements:
+        conflict = '(%s)' % ', '.join(quote(c) for c in index_elements)
+    else:
+        conflict = 'ON CONSTRAINT %s' % quote(constraint)
+
+    buffer = io.StringIO()
+    integral_columns(df).to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute('CREATE TEMPORARY TABLE IF NOT EXISTS %s (LIKE %s INCLUDING DEFAULTS) ON COMMIT DROP'
+                       % (staging, target))
+        cursor.execute('TRUNCATE %s' % staging)
+        cursor.copy_expert('COPY %(staging)s (%(columns)s) FROM STDIN WITH (FORMAT csv, FORCE_NULL (%(columns)s))'
+                           % dict(staging=staging, columns=', '.join(columns)), buffer)
+        cursor.execute('INSERT INTO %(target)s (%(columns)s) SELECT %(columns)s FROM %(staging)s '
+                       'ON CONFLICT %(conflict)s DO UPDATE SET %(updates)s%(guard)s' % dict(
+                           target=target, staging=staging, columns=', '.join(columns),
+                           conflict=conflict, updates=', '.join(updates), guard=guard))
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def frame_records(df: pd.DataFrame) -> ty.List[ty.Dict[str, ty.Any]]:
+    """
+    Rows as dicts ready for parameter binding, missing values become ``None``.
+    """
+    df = integral_columns(df).astype(object)
+    return df.where(df.notna(), None).to_dict('records')
+
+
+def upsert(df: pd.DataFrame, conn, table: sa.Table, constraint: str,
+           extra_update_fields: ty.Optional[ty.Dict[str, str]], only_changed: bool = False,
+           index_elements: ty.Optional[ty.Sequence[str]] = None) -> int:
+    """
+    ``INSERT ... ON CONFLICT DO UPDATE`` the frame into ``table``.
+
+    Conflicts are detected on ``index_elements`` when given, on ``constraint`` otherwise.
+    With ``only_changed`` existing rows are only updated when one of the columns differs.
+    Returns the number of rows inserted or updated.
+    """
+    insert_stmt = sa.dialects.postgresql.insert(table).values(frame_records(df))
+
+    update_stmt = {exc_k.key: exc_k for exc_k in insert_stmt.excluded}
+    if extra_update_fields:
+        update_stmt.update(extra_update_fields)
+
+    where = None
+    if only_changed:
+        where = sa.tuple_(*[table.c[k] for k in df.columns]).is_distinct_from(
+            sa.tuple_(*[insert_stmt.excluded[k] for k in df.columns]))
+
+    if index_elements:
+        upsert_stmt = insert_stmt.on_conflict_do_update(index_elements=[table.c[c] for c in index_elements],
+                                                        set_=update_stmt, where=where)
+    else:
+        upsert_stmt = insert_stmt.on_conflict_do_update(constraint=constraint, set_=update_stmt, where=where)
+    return conn.execute(upsert_stmt).rowcount
+
+
+def report_digest(data: str | bytes) -> str:
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
+
+class DigestReader(object):
+    """
+    Text stream wrapper hashing everything read through it, for ``pd.read_csv``.
+    """
+
+    def __init__(self, source: ty.TextIO) -> None:
+        self.source = source
+        self.hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> str:
+        data = self.source.read(size)
+        self.hash.update(data.encode('utf-8'))
+        return data
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
+def save_upsert(df: pd.DataFrame, conn) -> None:
     meta = sa.MetaData()
     extra_update_fields = {"updated_at": "NOW()"}
 
@@ -128,3 +391,254 @@ def save(df: pd.DataFrame, conn) -> None:
               index=False,
               if_exists='append',
               method=method)
+
+
+def save_copy(df: pd.DataFrame, conn) -> None:
+    extra_update_fields = {"updated_at": "NOW()"}
+
+    if isinstance(conn, sa.engine.Engine):
+        with conn.begin() as connection:
+            copy_upsert(df, connection, 'district_perf', 'district_pref_uniq', extra_update_fields)
+    else:
+        copy_upsert(df, conn, 'district_perf', 'district_pref_uniq', extra_update_fields)
+
+
+LOADERS = {
+    'upsert': save_upsert,
+    'copy': save_copy,
+}
+
+
+def save(df: pd.DataFrame, conn, loader: str = 'upsert') -> None:
+    try:
+        method = LOADERS[loader]
+    except KeyError:
+        raise ValueError('Unknown loader: %s' % loader)
+
+    method(df, conn)
+
+
+class Persistence(object):
+    """
+    Writes reports for the lifetime of an ``App``.
+
+    The target table is declared statically in ``schema`` so it is never reflected,
+    and every report saved inside ``connect()`` reuses the same pooled connection,
+    one transaction per report. Connections are per thread, so several loader
+    threads can share one ``Persistence``.
+
+    When the table is partitioned by report year (see ``migrations``), the partition of
+    a report is attached before its transaction begins and rows are written straight
+    into it, sparing PostgreSQL the routing through the parent table.
+
+    With ``rollups`` the totals per area, division and district (see ``rollups``) of the
+    areas a report changed are recomputed in the transaction of the report.
+    """
+
+    CONSTRAINT = 'district_pref_uniq'
+    CONFLICT_COLUMNS = ('report_year', 'report_month', 'club')
+    EXTRA_UPDATE_FIELDS = {"updated_at": "NOW()"}
+
+    def __init__(self, engine: sa.engine.Engine, loader: str = 'upsert',
+                 table: sa.Table = schema.district_perf, incremental: bool = False, rollups: bool = False) -> None:
+        if loader not in LOADERS:
+            raise ValueError('Unknown loader: %s' % loader)
+
+        self.engine = engine
+        self.loader = loader
+        self.table = table
+        self.incremental = incremental
+        self.rollups = rollups
+        self._local = threading.local()
+        # guards the stats only, statements of every thread are counted under it
+        self._lock = threading.Lock()
+        # guards the partitions, held while attaching them, never taken by a writing transaction
+        self._partition_lock = threading.Lock()
+        # report year -> partition, once known that the table is partitioned at all
+        self._partitioned: ty.Optional[bool] = None
+        self._partitions: ty.Dict[int, sa.Table] = dict()
+        self._partition_metadata = sa.MetaData()
+        self.stats = dict(saves=0, statements=0, reflections_saved=0, connections_reused=0,
+                          rows=0, rows_written=0, reports_skipped=0, rollup_rows=0)
+
+    @property
+    def connection(self) -> ty.Optional[sa.engine.Connection]:
+        return getattr(self._local, 'connection', None)
+
+    @connection.setter
+    def connection(self, connection: ty.Optional[sa.engine.Connection]) -> None:
+        self._local.connection = connection
+
+    def _count(self, key: str, value: int | float = 1) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+    def _count_statement(self, *args, **kwargs) -> None:
+        self._count('statements')
+
+    @contextlib.contextmanager
+    def connect(self) -> ty.Iterator[sa.engine.Connection]:
+        if self.connection is not None:
+            yield self.connection
+            return
+
+        with self.engine.connect() as connection:
+            sa.event.listen(connection, 'before_cursor_execute', self._count_statement)
+            self.connection = connection
+            try:
+                yield connection
+            finally:
+                self.connection = None
+
+    def attach_partitions(self, years: ty.Iterable[int]) -> ty.List[str]:
+        """
+        Make sure a partitioned table has the partitions of ``years``, must not be called
+        inside a transaction writing to the table. Returns the partitions of ``years``.
+        """
+        years = {int(year) for year in years}
+
+        with self._partition_lock:
+            if self._partitioned is None:
+                with self.engine.connect() as conn:
+                    self._partitioned = migrations.is_partitioned(conn, self.table.name)
+            if not self._partitioned:
+                return list()
+
+            if not years.issubset(self._partitions):
+                for year, name in migrations.attach_partitions(self.engine, self.table.name, years).items():
+                    table = self._partition_metadata.tables.get(name)
+                    self._partitions[year] = table if table is not None else \
+                        self.table.to_metadata(self._partition_metadata, name=name)
+
+            return sorted({self._partitions[year].name for year in years})
+
+    def _targets(self, df: pd.DataFrame) -> ty.Iterator[ty.Tuple[sa.Table, pd.DataFrame]]:
+        """
+        The frame split by the partitions it goes to, or the table itself.
+        """
+        partitions = self._partitions
+        if not self._partitioned or not set(df['report_year'].dropna().unique()).issubset(partitions):
+            yield self.table, df
+            return
+
+        for year, part in df.groupby('report_year', sort=False):
+            yield partitions[int(year)], part
+
+    def _write(self, df: pd.DataFrame, connection: sa.engine.Connection) -> int:
+        df = typed(df)
+        written = 0
+        for table, part in self._targets(df):
+            # a partition has its own unique index, matched by its columns
+            index_elements = self.CONFLICT_COLUMNS if table is not self.table else None
+            if self.loader == 'copy':
+                written += copy_upsert(part, connection, table.name, self.CONSTRAINT, self.EXTRA_UPDATE_FIELDS,
+                                       only_changed=self.incremental, index_elements=index_elements)
+                continue
+
+            written += upsert(part, connection, table, self.CONSTRAINT, self.EXTRA_UPDATE_FIELDS,
+                              only_changed=self.incremental, index_elements=index_elements)
+            self._count('reflections_saved')
+        return written
+
+    def digest(self, district: int | str, year: int, month: int) -> ty.Optional[str]:
+        """
+        Digest of the report last loaded for the period, if any.
+        """
+        table = schema.report_digest
+        stmt = sa.select(table.c.digest).where(table.c.district == str(district),
+                                               table.c.report_year == year,
+                                               table.c.report_month == month)
+
+        with self.connect() as connection:
+            digest = connection.execute(stmt).scalar()
+            connection.commit()
+
+        return digest
+
+    def loaded(self, periods: ty.Optional[ty.Iterable[ty.Tuple[int, int]]] = None) -> ty.Set[ty.Tuple[str, int, int]]:
+        """
+        (district, year, month) of every report in the table, of the (year, month) ``periods`` only
+        if given, which spares reading the whole table.
+        """
+        table = self.table
+        stmt = sa.select(table.c.district, table.c.report_year, table.c.report_month).group_by(
+            table.c.district, table.c.report_year, table.c.report_month)
+        if periods is not None:
+            periods = sorted(set(periods))
+            if not periods:
+                return set()
+            # report_year alone lets PostgreSQL prune the partitions of the other years
+            stmt = stmt.where(table.c.report_year.in_(sorted({y for y, _ in periods})),
+                              sa.tuple_(table.c.report_year, table.c.report_month).in_(periods))
+
+        with self.connect() as connection:
+            loaded = {(str(d), y, m) for d, y, m in connection.execute(stmt)}
+            connection.commit()
+
+        return loaded
+
+    def is_unchanged(self, district: int | str, year: int, month: int, digest: str) -> bool:
+        if not self.incremental or self.digest(district, year, month) != digest:
+            return False
+
+        self._count('reports_skipped')
+        return True
+
+    def _record_digest(self, connection: sa.engine.Connection, district: int | str, year: int, month: int,
+                       digest: str, rows: int) -> None:
+        table = schema.report_digest
+        insert_stmt = sa.dialects.postgresql.insert(table).values(
+            district=str(district), report_year=year, report_month=month, digest=digest, rows=rows)
+        connection.execute(insert_stmt.on_conflict_do_update(
+            index_elements=[table.c.district, table.c.report_year, table.c.report_month],
+            set_=dict(digest=insert_stmt.excluded.digest, rows=insert_stmt.excluded.rows,
+                      updated_at=sa.func.now())))
+
+    def save(self, df: pd.DataFrame, report: ty.Optional[ty.Dict[str, ty.Any]] = None,
+             digest: str | ty.Callable[[], str] | None = None) -> int:
+        self.attach_partitions(df['report_year'].dropna().unique())
+        return self.save_chunks((df, ), report=report, digest=digest)
+
+    def save_chunks(self, chunks: ty.Iterable[pd.DataFrame], report: ty.Optional[ty.Dict[str, ty.Any]] = None,
+                    digest: str | ty.Callable[[], str] | None = None) -> int:
+        """
+        Write every chunk of one report inside a single transaction, returns the row count.
+
+        In incremental mode the ``digest`` of the ``report`` (``district``, ``year``, ``month``)
+        is recorded in the same transaction, a callable is evaluated once every chunk is written.
+        So are the rollups of the areas whose rows were written, and of the areas clubs left.
+        """
+        reused = self.connection is not None
+        rows = 0
+        if report:
+            self.attach_partitions([report['year']])
+
+        with metrics.registry.timer('load', loader=self.loader) as fields, self.connect() as connection:
+            if reused:
+                self._count('connections_reused')
+
+            with connection.begin():
+                touched = set()
+                for df in chunks:
+                    stored = stored_keys(connection, df, self.table) if self.rollups else set()
+                    written = self._write(df, connection)
+                    if self.rollups and written:
+                        touched |= stored | frame_keys(df)
+                    self._count('rows_written', written)
+                    rows += len(df)
+
+                if touched:
+                    with metrics.registry.timer('rollup') as rollup:
+                        rollup.update(rows=refresh_rollups(connection, touched, self.table))
+                    self._count('rollup_rows', rollup['rows'])
+
+                if self.incremental and report and digest:
+                    digest = digest() if callable(digest) else digest
+                    self._record_digest(connection, report['district'], report['year'], report['month'],
+                                        digest, rows)
+
+            fields.update(rows=rows)
+
+        self._count('saves')
+        self._count('rows', rows)
+        return rows
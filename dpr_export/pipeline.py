@@ -0,0 +1,221 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import time
+import queue
+import logging
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class StageStats(object):
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.queue_depth = 0
+        self.queue_peak = 0
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, dropped: bool) -> None:
+        with self._lock:
+            self.processed += 1
+            self.dropped += int(dropped)
+            self.busy_seconds += seconds
+
+    def observe(self, depth: int) -> None:
+        self.queue_depth = depth
+        self.queue_peak = max(self.queue_peak, depth)
+
+    def as_dict(self) -> ty.Dict[str, ty.Any]:
+        elapsed = (self.finished_at or time.monotonic()) - (self.started_at or time.monotonic())
+        return dict(processed=self.processed,
+                    dropped=self.dropped,
+                    busy_seconds=round(self.busy_seconds, 3),
+                    per_second=round(self.processed / elapsed, 3) if elapsed > 0 else None,
+                    queue_depth=self.queue_depth,
+                    queue_peak=self.queue_peak)
+
+
+class Stage(object):
+    """
+    One step of a ``Pipeline``: ``func`` maps an item to the item handed to the next
+    stage, returning ``None`` drops it.
+
+    ``kind`` is ``thread`` for I/O-bound work or ``process`` for CPU-bound work, in which
+    case ``func`` and the items must be picklable. ``context``, when given, is entered
+    once by every worker thread around its whole lifetime, e.g. to hold a connection.
+    ``on_error``, when given, is called with the item and the exception of a failed
+    ``func`` call, the item is dropped and the pipeline goes on instead of stopping.
+    """
+
+    KINDS = ('thread', 'process')
+
+    def __init__(self, name: str, func: ty.Callable[[ty.Any], ty.Any], workers: int = 1, kind: str = 'thread',
+                 context: ty.Optional[ty.Callable[[], ty.ContextManager]] = None,
+                 on_error: ty.Optional[ty.Callable[[ty.Any, Exception], None]] = None) -> None:
+        if kind not in self.KINDS:
+            raise ValueError('Unknown stage kind: %s' % kind)
+
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers or 1))
+        self.kind = kind
+        self.context = context
+        self.on_error = on_error
+
+
+class Pipeline(object):
+    """
+    Run items through stages connected by bounded queues.
+
+    Every stage has its own workers; a full queue blocks the stage feeding it, so a slow
+    stage applies back-pressure upstream instead of letting items pile up in memory.
+    The first error stops the whole pipeline and is raised by ``run``.
+    """
+
+    DEFAULT_QUEUE_SIZE = 16
+    POLL_SECONDS = 0.1
+
+    def __init__(self, stages: ty.List[Stage], queue_size: int | None = None) -> None:
+        self.stages = stages
+        self.queue_size = queue_size or self.DEFAULT_QUEUE_SIZE
+        self.stats = {stage.name: StageStats(stage.name) for stage in stages}
+        self._error: BaseException | None = None
+        self._abort = threading.Event()
+
+    @property
+    def aborted(self) -> bool:
+        """
+        Whether an error stopped the pipeline, item sources that block should give up.
+        """
+        return self._abort.is_set()
+
+    def _put(self, q: queue.Queue, item: ty.Any) -> bool:
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> ty.Any:
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, e: BaseException) -> None:
+        if self._error is None:
+            self._error = e
+        self._abort.set()
+
+    def _feed(self, items: ty.Iterable[ty.Any], output: queue.Queue) -> None:
+        try:
+            for item in items:
+                if not self._put(output, item):
+                    return
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._put(output, _DONE)
+
+    def _work(self, stage: Stage, pool: ProcessPoolExecutor | None,
+              input: queue.Queue, output: queue.Queue | None) -> None:
+        stats = self.stats[stage.name]
+        context = stage.context() if stage.context else contextlib.nullcontext()
+
+        try:
+            with context:
+                while True:
+                    item = self._get(input)
+                    stats.observe(input.qsize())
+                    if item is _DONE:
+                        # let the sibling workers see the end of the stream too
+                        self._put(input, _DONE)
+                        return
+
+                    begin = time.monotonic()
+                    try:
+                        if pool is not None:
+                            result = pool.submit(stage.func, item).result()
+                        else:
+                            result = stage.func(item)
+                    except Exception as e:
+                        if stage.on_error is None:
+                            raise
+                        stage.on_error(item, e)
+                        result = None
+                    stats.record(time.monotonic() - begin, dropped=result is None)
+
+                    if result is not None and output is not None:
+                        if not self._put(output, result):
+                            return
+        except BaseException as e:
+            self._fail(e)
+
+    def run(self, items: ty.Iterable[ty.Any]) -> ty.Dict[str, ty.Dict[str, ty.Any]]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        pools: ty.List[ProcessPoolExecutor] = list()
+        threads = list()
+
+        feeder = threading.Thread(target=self._feed, args=(items, queues[0]), name='dpr-feed', daemon=True)
+        feeder.start()
+
+        try:
+            for i, stage in enumerate(self.stages):
+                pool = None
+                if stage.kind == 'process':
+                    pool = ProcessPoolExecutor(max_workers=stage.workers)
+                    pools.append(pool)
+
+                output = queues[i + 1] if i + 1 < len(self.stages) else None
+                workers = list()
+                for n in range(stage.workers):
+                    thread = threading.Thread(target=self._work, args=(stage, pool, queues[i], output),
+                                              name='dpr-%s-%d' % (stage.name, n), daemon=True)
+                    workers.append(thread)
+                threads.append(workers)
+
+                self.stats[stage.name].started_at = time.monotonic()
+                for thread in workers:
+                    thread.start()
+
+            # wait stage by stage, once every worker of a stage is done so is its output
+            for i, (stage, workers) in enumerate(zip(self.stages, threads)):
+                for thread in workers:
+                    thread.join()
+                self.stats[stage.name].finished_at = time.monotonic()
+
+                if i + 1 < len(self.stages):
+                    self._put(queues[i + 1], _DONE)
+
+            feeder.join()
+        except BaseException as e:
+            self._fail(e)
+            raise
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=True, cancel_futures=True)
+
+        if self._error is not None:
+            raise self._error
+
+        return self.report()
+
+    def report(self) -> ty.Dict[str, ty.Dict[str, ty.Any]]:
+        return {name: stats.as_dict() for name, stats in self.stats.items()}
@@ -0,0 +1,139 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import datetime
+import fnmatch
+
+if ty.TYPE_CHECKING:
+    from .requester import Requester
+
+
+# Districts globs are matched against, override with ``planner.districts`` in the config.
+KNOWN_DISTRICTS = tuple(str(d) for d in range(1, 131)) + ('U', )
+
+GRANULARITIES = ('month', 'program-year-end')
+
+Unit = ty.Dict[str, ty.Any]
+
+
+def parse_month(value: ty.Any) -> ty.Tuple[int, int]:
+    """
+    ``2009-07``, ``2009-7`` or a date as (year, month).
+    """
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.year, value.month
+
+    year, month = str(value).split('-')[:2]
+    month = int(month)
+    if not 1 <= month <= 12:
+        raise ValueError('Invalid month: %s' % value)
+
+    return int(year), month
+
+
+def months(begin: ty.Tuple[int, int], end: ty.Tuple[int, int]) -> ty.Iterator[ty.Tuple[int, int]]:
+    year, month = begin
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+class Planner(object):
+    """
+    Expand the ``fetch`` section of the config into the reports to download.
+
+    Besides explicit ``periods``, an entry may give a range and districts, globs allowed:
+
+        - districts: [88, 85, '1*']
+          from: 2009-07
+          to: 2024-06               # defaults to the current month
+          granularity: month        # or program-year-end
+
+    An export is cumulative through its ``to_date``, so ``program-year-end`` fetches a
+    single report per program year (June, or the current month for the running year).
+    Periods in the future are dropped and the same export is never planned twice.
+    """
+
+    def __init__(self, requester: Requester, districts: ty.Optional[ty.Iterable[ty.Any]] = None,
+                 today: datetime.date | None = None) -> None:
+        self.requester = requester
+        self.districts = [str(d) for d in districts] if districts else list(KNOWN_DISTRICTS)
+        self.today = today or datetime.date.today()
+
+    def expand_districts(self, patterns: ty.Iterable[ty.Any]) -> ty.List[str]:
+        result = list()
+        for pattern in patterns:
+            pattern = str(pattern)
+            if any(c in pattern for c in '*?['):
+                matched = [d for d in self.districts if fnmatch.fnmatchcase(d, pattern)]
+            else:
+                matched = [pattern]
+
+            result.extend(d for d in matched if d not in result)
+
+        return result
+
+    def periods(self, begin: ty.Any, end: ty.Any = None, granularity: str = 'month') -> ty.List[ty.Tuple[int, int]]:
+        if granularity not in GRANULARITIES:
+            raise ValueError('Unknown granularity: %s' % granularity)
+
+        current = (self.today.year, self.today.month)
+        end = min(parse_month(end), current) if end else current
+        periods = list(months(parse_month(begin), end))
+
+        if granularity == 'month':
+            return periods
+
+        # the last period of every program year in the range
+        result = dict()
+        for year, month in periods:
+            result[self.requester.build_tm_year(year=year, month=month)] = (year, month)
+        return list(result.values())
+
+    def expand(self, entry: ty.Dict[str, ty.Any]) -> ty.Iterator[Unit]:
+        if 'districts' in entry:
+            districts = self.expand_districts(entry['districts'])
+        else:
+            districts = self.expand_districts([entry['district']])
+
+        if 'periods' in entry:
+            periods = [(p['year'], p['month']) for p in entry['periods']]
+        else:
+            periods = self.periods(entry['from'], entry.get('to'), entry.get('granularity', 'month'))
+
+        for district in districts:
+            for year, month in periods:
+                yield dict(district=int(district) if district.isdigit() else district, year=year, month=month)
+
+    def plan(self, fetch: ty.Iterable[ty.Dict[str, ty.Any]]) -> ty.List[Unit]:
+        """
+        Every report of the ``fetch`` entries, each export URL once.
+        """
+        seen = set()
+        units = list()
+        for entry in fetch:
+            for unit in self.expand(entry):
+                url = self.requester.build_url(**unit)
+                if url not in seen:
+                    seen.add(url)
+                    units.append(unit)
+
+        return units
+
+    def missing(self, units: ty.Iterable[Unit],
+                loaded: ty.Container[ty.Tuple[str, int, int]]) -> ty.Tuple[ty.List[Unit], ty.List[Unit]]:
+        """
+        Split ``units`` into the ones to fetch and the ones already ``loaded`` (district,
+        year, month). Only closed program years are skipped, open ones may still change.
+        """
+        todo = list()
+        skipped = list()
+        for unit in units:
+            key = (str(unit['district']), unit['year'], unit['month'])
+            if key in loaded and self.requester.is_closed(year=unit['year'], month=unit['month']):
+                skipped.append(unit)
+            else:
+                todo.append(unit)
+
+        return todo, skipped
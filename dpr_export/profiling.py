@@ -0,0 +1,88 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import io
+import sys
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+
+class Profiler(object):
+    """
+    cProfile plus tracemalloc around a whole command.
+
+    A cProfile profile only sees the thread that enabled it, so every thread started
+    while profiling (the pipeline's stage workers) gets a profile of its own, merged
+    into the report. Work done in processes is not profiled.
+
+    ``stop`` writes a text report to ``path`` (hottest functions by cumulative time,
+    peak traced memory and the biggest allocation sites) and the raw profile to
+    ``path + '.prof'`` for snakeviz/pstats.
+    """
+
+    TOP_FUNCTIONS = 40
+    TOP_ALLOCATIONS = 20
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.thread_profiles: ty.List[cProfile.Profile] = list()
+        self._lock = threading.Lock()
+
+    def _profile_thread(self, *args: ty.Any) -> None:
+        # installed by ``threading.setprofile``, runs once in every new thread
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Python >= 3.12: the profile of ``start`` sees every thread already
+            return
+
+        with self._lock:
+            self.thread_profiles.append(profile)
+
+    def start(self) -> "Profiler":
+        tracemalloc.start()
+        threading.setprofile(self._profile_thread)
+        self.profile.enable()
+        return self
+
+    def stats(self, stream: ty.Optional[ty.TextIO] = None) -> pstats.Stats:
+        """
+        The profile of the calling thread merged with the ones of every other thread.
+        """
+        stats = pstats.Stats(self.profile, stream=stream)
+        with self._lock:
+            for profile in self.thread_profiles:
+                stats.add(profile)
+        return stats
+
+    def stop(self) -> None:
+        self.profile.disable()
+        threading.setprofile(None)
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        out = io.StringIO()
+        stats = self.stats(stream=out)
+        stats.dump_stats(self.path + '.prof')
+
+        out.write('== Memory: %.1f MiB current, %.1f MiB peak\n\n' % (current / 2 ** 20, peak / 2 ** 20))
+        for stat in snapshot.statistics('lineno')[:self.TOP_ALLOCATIONS]:
+            out.write('%s\n' % stat)
+
+        out.write('\n== CPU, by cumulative time\n\n')
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.TOP_FUNCTIONS)
+
+        with open(self.path, 'w') as f:
+            f.write(out.getvalue())
+
+    def __enter__(self) -> "Profiler":
+        return self.start()
+
+    def __exit__(self, *exc_info: ty.Any) -> None:
+        self.stop()
@@ -0,0 +1,69 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import time
+import threading
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket, ``rate`` tokens per second with bursts of up to ``burst``.
+    """
+
+    def __init__(self, rate: float, burst: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1.0))
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until ``tokens`` are available, returns the time spent waiting.
+        """
+        waited = 0.0
+
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+
+                delay = (tokens - self.tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter(object):
+    """
+    One ``TokenBucket`` per host, hosts without a configured rate are not limited.
+    """
+
+    def __init__(self, rates: ty.Optional[ty.Dict[str, float]] = None, default: float | None = None) -> None:
+        self.rates = dict(rates or dict())
+        self.default = default
+        self._buckets: ty.Dict[str, TokenBucket] = dict()
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> ty.Optional[TokenBucket]:
+        with self._lock:
+            if host not in self._buckets:
+                rate = self.rates.get(host, self.default)
+                self._buckets[host] = TokenBucket(rate) if rate else None
+            return self._buckets[host]
+
+    def acquire(self, host: str) -> float:
+        bucket = self.bucket(host)
+        if bucket is None:
+            return 0.0
+        return bucket.acquire()
@@ -2,24 +2,155 @@
 from __future__ import annotations
 
 import typing as ty
+import io
 import datetime
+import logging
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
 from .constants import TOASTMASTER_YEAR_LEAP, DEFAULT_CONTENT_TYPE
+from .cache import ResponseCache, CacheEntry, CacheWriter
+from .ratelimit import RateLimiter
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class IterStream(io.RawIOBase):
+    """
+    Read-only binary file over an iterator of byte chunks, e.g. ``Response.iter_content``.
+    """
+
+    def __init__(self, chunks: ty.Iterable[bytes], on_close: ty.Optional[ty.Callable[[], None]] = None) -> None:
+        super().__init__()
+        self.chunks = iter(chunks)
+        self.on_close = on_close
+        self.pending = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.pending:
+            try:
+                self.pending = next(self.chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            if hasattr(self.chunks, 'close'):
+                self.chunks.close()
+            if self.on_close:
+                self.on_close()
+        super().close()
+
+
+def tee(chunks: ty.Iterable[bytes], writer: CacheWriter) -> ty.Iterator[bytes]:
+    """
+    Pass chunks through while writing them to the cache, committed only once exhausted.
+    """
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.commit()
 
 
 class Requester(object):
 
+    STREAM_CHUNK_SIZE = 64 * 1024
+
     BASE_URL = 'https://dashboards.toastmasters.org/%(tm_year)s/export.aspx' \
                '?type=CSV&report=districtperformance~%(district)s~%(to_date)s~~2000-%(current_year)s'
     FIND_CLUBS_BASE_URL = 'https://www.toastmasters.org/Find-a-Club/%(club_id)s'
 
-    def __init__(self) -> None:
+    # Days after the end of a program year before its reports are considered final.
+    DEFAULT_CLOSED_AFTER_DAYS = 60
+
+    # (connect, read) timeouts in seconds.
+    DEFAULT_TIMEOUT = (10.0, 60.0)
+    DEFAULT_RETRIES = 5
+    DEFAULT_BACKOFF_FACTOR = 0.5
+    DEFAULT_BACKOFF_JITTER = 0.5
+    DEFAULT_BACKOFF_MAX = 60.0
+    DEFAULT_POOL_MAXSIZE = 10
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, cache: ResponseCache | None = None, closed_after_days: int | None = None,
+                 timeout: float | ty.Tuple[float, float] | None = None,
+                 retries: int | None = None,
+                 backoff_factor: float | None = None,
+                 backoff_jitter: float | None = None,
+                 backoff_max: float | None = None,
+                 pool_maxsize: int | None = None,
+                 rate_limits: ty.Optional[ty.Dict[str, float]] = None) -> None:
+        self.cache = cache
+        self.closed_after_days = self.DEFAULT_CLOSED_AFTER_DAYS if closed_after_days is None else closed_after_days
+        self.timeout = self.DEFAULT_TIMEOUT if timeout is None else timeout
+        self.limiter = RateLimiter(rate_limits)
+
+        # Retries with exponential backoff and jitter on throttling and server errors,
+        # ``Retry-After`` wins over the computed backoff when the server sends one.
+        retry = Retry(total=self.DEFAULT_RETRIES if retries is None else retries,
+                      backoff_factor=self.DEFAULT_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+                      backoff_jitter=self.DEFAULT_BACKOFF_JITTER if backoff_jitter is None else backoff_jitter,
+                      backoff_max=self.DEFAULT_BACKOFF_MAX if backoff_max is None else backoff_max,
+                      status_forcelist=self.RETRY_STATUSES,
+                      allowed_methods=('GET', ),
+                      respect_retry_after_header=True,
+                      raise_on_status=False)
+        pool_maxsize = pool_maxsize or self.DEFAULT_POOL_MAXSIZE
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+
         self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update(**{
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/116.0'
         })
 
+    @classmethod
+    def from_config(cls, config: ty.Dict[str, ty.Any], pool_maxsize: int | None = None) -> "Requester":
+        """
+        Build from the whole config, the ``http`` and ``cache`` sections are used.
+        """
+        http = config.get('http') or dict()
+        cache = config.get('cache') or dict()
+        timeout = http.get('timeout')
+        if isinstance(timeout, list):
+            timeout = tuple(timeout)
+
+        return cls(cache=ResponseCache.from_config(cache),
+                   closed_after_days=cache.get('closed_after_days'),
+                   timeout=timeout,
+                   retries=http.get('retries'),
+                   backoff_factor=http.get('backoff_factor'),
+                   backoff_jitter=http.get('backoff_jitter'),
+                   backoff_max=http.get('backoff_max'),
+                   pool_maxsize=http.get('pool_maxsize') or pool_maxsize,
+                   rate_limits=http.get('rate_limits'))
+
+    def request(self, url: str, **kwargs: ty.Any) -> requests.Response:
+        """
+        GET ``url`` once the host's rate limit allows it, with the configured timeout.
+        """
+        self.limiter.acquire(urlsplit(url).hostname)
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url=url, **kwargs)
+
     @staticmethod
     def build_date(year: int, month: int) -> datetime.date:
         next_month = month + 1
@@ -40,7 +171,7 @@ class Requester(object):
         
         return year - 1, year
     
-    def build_url(self, district: int, year: int, month: int) -> str:
+    def build_url(self, district: int, year: int, month: int, current_year: int | str | None = None) -> str:
         to_date = self.build_date(year=year, month=month)
         tm_year = self.build_tm_year(year=year, month=month)
 
@@ -48,11 +179,28 @@ class Requester(object):
             district=district,
             tm_year='%s-%s' % tm_year,
             to_date=to_date.strftime('%D'),
-            current_year=datetime.date.today().year
+            current_year=current_year or datetime.date.today().year
         )
 
         return url
 
+    def cache_key(self, district: int, year: int, month: int) -> str:
+        """
+        The URL of the report with its current year segment pinned, the segment changes on
+        every 1st of January while the report it points to does not.
+        """
+        return self.build_url(district=district, year=year, month=month, current_year='current')
+
+    def is_closed(self, year: int, month: int) -> bool:
+        """
+        Whether the program year of the period is over, its reports no longer change.
+        """
+        _, end_year = self.build_tm_year(year=year, month=month)
+        month_leap, date_leap = TOASTMASTER_YEAR_LEAP
+        closed_at = datetime.date(year=end_year, month=month_leap, day=date_leap) \
+            + datetime.timedelta(days=self.closed_after_days)
+        return datetime.date.today() >= closed_at
+
     @staticmethod
     def extract_charset(content_type: str) -> str:
         content_type = content_type.lower()
@@ -64,18 +212,90 @@ class Requester(object):
         _, encoding = charset.split('=')
         return encoding
 
+    def get(self, url: str, permanent: bool = False, stream: bool = False,
+            key: str | None = None) -> ty.Tuple[requests.Response | None, CacheEntry | None]:
+        """
+        GET through the cache, either the response or the cache entry to serve is returned.
+        The response is cached under ``key``, the URL by default.
+
+        Permanent entries are served as they are, the others are revalidated and
+        served when the server answers ``304 Not Modified``.
+        """
+        entry = self.cache.get(key or url) if self.cache else None
+
+        if entry is not None and entry.permanent:
+            self.cache.touch(entry)
+            return None, entry
+
+        headers = entry.conditional_headers() if entry else dict()
+        res = self.request(url, headers=headers, stream=stream)
+
+        if entry is not None and res.status_code == 304:
+            res.close()
+            entry['permanent'] = permanent
+            self.cache.touch(entry)
+            return None, entry
+
+        res.raise_for_status()
+        return res, None
+
+    def fetch_raw(self, district: int, year: int, month: int) -> ty.Tuple[bytes, str]:
+        """
+        Like ``fetch`` but the body is returned undecoded, with its encoding.
+        """
+        url = self.build_url(district=district, year=year, month=month)
+        key = self.cache_key(district=district, year=year, month=month)
+        logger.info('GET %s', url)
+        permanent = self.is_closed(year=year, month=month)
+
+        with metrics.registry.timer('fetch', url=url) as fields:
+            res, entry = self.get(url, permanent=permanent, key=key)
+
+            if entry is not None:
+                data = self.cache.read(entry)
+                content_type = entry['content_type']
+            else:
+                data = res.content
+                content_type = res.headers.get('Content-Type', '')
+                if self.cache:
+                    self.cache.put(key, data, res.headers, permanent=permanent)
+
+            fields.update(bytes=len(data), cached=entry is not None)
+
+        return data, self.extract_charset(content_type=content_type)
+
     def fetch(self, district: int, year: int, month: int):
+        data, encoding = self.fetch_raw(district=district, year=year, month=month)
+
+        with metrics.registry.timer('decode', bytes=len(data)):
+            return data.decode(encoding=encoding)
+
+    def stream(self, district: int, year: int, month: int, chunk_size: int | None = None) -> ty.TextIO:
+        """
+        Like ``fetch`` but only the headers are read, the body is decoded lazily
+        from a text stream, ``chunk_size`` bytes at a time. Close it when done.
+        """
         url = self.build_url(district=district, year=year, month=month)
-        print(url)
-        res = self.session.get(url=url)
-        res.raise_for_status()
+        key = self.cache_key(district=district, year=year, month=month)
+        logger.info('GET %s', url)
+        permanent = self.is_closed(year=year, month=month)
 
-        data = res.content
-        content_type = res.headers.get('Content-Type', '')
-        encoding = self.extract_charset(content_type=content_type)
+        with metrics.registry.timer('fetch', url=url, streamed=True) as fields:
+            res, entry = self.get(url, permanent=permanent, stream=True, key=key)
+            fields.update(cached=entry is not None)
 
-        data = data.decode(encoding=encoding)
-        return data
+        if entry is not None:
+            raw = self.cache.open(entry)
+            content_type = entry['content_type']
+        else:
+            chunks = res.iter_content(chunk_size=chunk_size or self.STREAM_CHUNK_SIZE)
+            if self.cache:
+                chunks = tee(chunks, self.cache.writer(key, res.headers, permanent=permanent))
+            raw = io.BufferedReader(IterStream(chunks, on_close=res.close))
+            content_type = res.headers.get('Content-Type', '')
+
+        encoding = self.extract_charset(content_type=content_type)
+        return io.TextIOWrapper(raw, encoding=encoding, newline='')
 
     def fetch_club_detail(self, club_id: str,
                           extractor: "BaseExtractor" | None = None) -> ty.Dict[str, str] | ty.AnyStr:
@@ -84,7 +304,7 @@ class Requester(object):
             club_id = club_id[3:]
 
         url = self.FIND_CLUBS_BASE_URL % dict(club_id=club_id)
-        res = self.session.get(url=url)
+        res = self.request(url)
         res.raise_for_status()
 
         content = res.content
@@ -0,0 +1,128 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import logging
+
+import pandas as pd
+import sqlalchemy as sa
+
+from . import schema
+
+
+logger = logging.getLogger(__name__)
+
+# Rollups from the finest to the coarsest, every one is summed up from the one before.
+LEVELS = (
+    ('area', schema.district_perf_area, ('district', 'division', 'area')),
+    ('division', schema.district_perf_division, ('district', 'division')),
+    ('district', schema.district_perf_district, ('district', )),
+)
+
+PERIOD = ('report_year', 'report_month')
+AREA_KEY = PERIOD + LEVELS[0][2]
+
+# distinguished_status codes counted by the rollups
+STATUSES = dict(distinguished='D', select_distinguished='S', presidents_distinguished='P')
+
+Key = ty.Tuple[ty.Any, ...]
+
+
+def area_measures(table: sa.Table) -> ty.List[sa.ColumnElement]:
+    """
+    The rollup measures of club rows of ``table``.
+    """
+    measures = [sa.func.count().label('clubs')]
+    measures.extend(sa.func.coalesce(sa.func.sum(table.c[c]), 0).label(c)
+                    for c in ('new_members', 'total_renewals', 'total_to_date'))
+    measures.extend(sa.func.count().filter(table.c.distinguished_status == status).label(name)
+                    for name, status in STATUSES.items())
+    return measures
+
+
+def frame_keys(df: pd.DataFrame) -> ty.Set[Key]:
+    """
+    Areas of a period the rows of ``df`` belong to.
+    """
+    keys = df[list(AREA_KEY)].drop_duplicates()
+    return {(int(y), int(m), str(d), str(dv), str(a)) for y, m, d, dv, a in keys.itertuples(index=False)}
+
+
+def stored_keys(conn: sa.engine.Connection, df: pd.DataFrame, table: sa.Table = schema.district_perf) -> ty.Set[Key]:
+    """
+    Areas the clubs of ``df`` are in as stored, before ``df`` replaces them: a club
+    moved to another area leaves its previous area to be recomputed too.
+    """
+    keys = set()
+    for (year, month), part in df.groupby(list(PERIOD), sort=False):
+        stmt = sa.select(*[table.c[c] for c in AREA_KEY]).distinct().where(
+            table.c.report_year == int(year), table.c.report_month == int(month),
+            table.c.club.in_([int(c) for c in part['club'].dropna().unique()]))
+        keys.update(tuple(row) for row in conn.execute(stmt))
+    return keys
+
+
+def refresh(conn: sa.engine.Connection, keys: ty.Iterable[Key], table: sa.Table = schema.district_perf) -> int:
+    """
+    Recompute the rollups of the areas ``keys`` (report year, month, district, division,
+    area) and of their divisions and districts, in the transaction of ``conn``.
+    Returns the number of rollup rows written.
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return 0
+
+    written = 0
+    source = table
+    for level, rollup, columns in LEVELS:
+        key = PERIOD + columns
+        level_keys = sorted({k[:len(key)] for k in keys})
+
+        conn.execute(sa.delete(rollup).where(sa.tuple_(*[rollup.c[c] for c in key]).in_(level_keys)))
+
+        if source is table:
+            measures = area_measures(table)
+        else:
+            measures = [sa.func.sum(source.c[m]).label(m) for m in schema.ROLLUP_MEASURES]
+        group = [source.c[c] for c in key]
+        select = sa.select(*group, *measures).where(sa.tuple_(*group).in_(level_keys)).group_by(*group)
+
+        written += conn.execute(sa.insert(rollup).from_select(list(key) + list(schema.ROLLUP_MEASURES),
+                                                              select)).rowcount
+        source = rollup
+
+    return written
+
+
+def rebuild(engine: sa.engine.Engine, years: ty.Optional[ty.Iterable[int]] = None,
+            table: sa.Table = schema.district_perf) -> ty.Dict[str, int]:
+    """
+    Backfill the rollups of every report period in ``table``, or of the periods of
+    ``years``, one transaction per period. Returns the rollup rows per level.
+    """
+    periods = sa.select(table.c.report_year, table.c.report_month).distinct().order_by(
+        table.c.report_year, table.c.report_month)
+    if years:
+        periods = periods.where(table.c.report_year.in_([int(y) for y in years]))
+
+    with engine.connect() as conn:
+        periods = conn.execute(periods).all()
+
+    result = {level: 0 for level, _, _ in LEVELS}
+    for year, month in periods:
+        with engine.begin() as conn:
+            # areas of the period that lost all their clubs are dropped with the rest
+            for _, rollup, _ in LEVELS:
+                conn.execute(sa.delete(rollup).where(rollup.c.report_year == year, rollup.c.report_month == month))
+
+            keys = conn.execute(sa.select(*[table.c[c] for c in AREA_KEY]).distinct().where(
+                table.c.report_year == year, table.c.report_month == month)).all()
+            refresh(conn, [tuple(k) for k in keys], table=table)
+
+            for level, rollup, _ in LEVELS:
+                result[level] += conn.execute(sa.select(sa.func.count()).select_from(rollup).where(
+                    rollup.c.report_year == year, rollup.c.report_month == month)).scalar()
+
+        logger.info('rollups of %d-%02d rebuilt', year, month)
+
+    return result
@@ -0,0 +1,40 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import threading
+
+
+Unit = ty.Dict[str, ty.Any]
+
+
+class Scheduler(object):
+    """
+    Concurrency limits of the fetch stage: ``workers`` fetches at once, its default
+    number of workers, and per host ``hosts``, a mapping of host name to the maximum
+    number of in-flight requests, each held by a fetch through ``slot``.
+    """
+
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, workers: int | None = None,
+                 hosts: ty.Optional[ty.Dict[str, int]] = None) -> None:
+        self.workers = workers or self.DEFAULT_WORKERS
+        self.hosts = dict(hosts or dict())
+        self._slots: ty.Dict[str, threading.BoundedSemaphore] = dict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]]) -> "Scheduler":
+        config = config or dict()
+        return cls(workers=config.get('workers'), hosts=config.get('hosts'))
+
+    def slot(self, host: str | None) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._slots.get(host)
+            if semaphore is None:
+                limit = self.hosts.get(host) or self.workers
+                semaphore = threading.BoundedSemaphore(limit)
+                self._slots[host] = semaphore
+
+        return semaphore
@@ -0,0 +1,132 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty  # noqa: F401
+
+import sqlalchemy as sa
+
+
+metadata = sa.MetaData()
+
+# Keep in sync with `etc/000-create_table.sql` and the later migrations, declared statically
+# so the loaders never have to reflect the catalog. Range partitioned by report_year since
+# `etc/004-partition_district_perf.sql`, where the primary key is (id, report_year).
+district_perf = sa.Table(
+    'district_perf', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('report_year', sa.Integer, nullable=False),
+    sa.Column('report_month', sa.Integer, nullable=False),
+    sa.Column('district', sa.String(8), nullable=False),
+    sa.Column('division', sa.String(8), nullable=False),
+    sa.Column('area', sa.String(8), nullable=False),
+    sa.Column('club', sa.Integer, nullable=False),
+    sa.Column('club_name', sa.String, nullable=False),
+    sa.Column('new_members', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('late_renewals', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('oct_renewals', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('apr_renewals', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('total_renewals', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('total_chart', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('total_to_date', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('distinguished_status', sa.String(8)),
+    sa.Column('charter_suspend_date', sa.String),
+    sa.Column('charter_date', sa.Date),
+    sa.Column('suspend_date', sa.Date),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+    sa.UniqueConstraint('report_year', 'report_month', 'club', name='district_pref_uniq'),
+)
+
+# Keep in sync with `etc/001-create_report_digest.sql`.
+report_digest = sa.Table(
+    'report_digest', metadata,
+    sa.Column('district', sa.String(8), primary_key=True),
+    sa.Column('report_year', sa.Integer, primary_key=True),
+    sa.Column('report_month', sa.Integer, primary_key=True),
+    sa.Column('digest', sa.String(64), nullable=False),
+    sa.Column('rows', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+)
+
+# Keep in sync with `etc/002-create_club_detail.sql`.
+club_detail = sa.Table(
+    'club_detail', metadata,
+    sa.Column('club', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('name', sa.String),
+    sa.Column('address', sa.ARRAY(sa.String)),
+    sa.Column('district', sa.String(8)),
+    sa.Column('division', sa.String(8)),
+    sa.Column('area', sa.String(8)),
+    sa.Column('meeting_day', sa.SmallInteger),
+    sa.Column('time_begin', sa.String(8)),
+    sa.Column('time_end', sa.String(8)),
+    sa.Column('lat', sa.Float),
+    sa.Column('lon', sa.Float),
+    sa.Column('lat_local', sa.Float),
+    sa.Column('lon_local', sa.Float),
+    sa.Column('error', sa.String),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+)
+
+# Keep in sync with `etc/003-create_job_ledger.sql`, a SQLite ledger is created on the fly.
+job_ledger = sa.Table(
+    'job_ledger', metadata,
+    sa.Column('district', sa.String(8), primary_key=True),
+    sa.Column('report_year', sa.Integer, primary_key=True),
+    sa.Column('report_month', sa.Integer, primary_key=True),
+    sa.Column('status', sa.String(16), nullable=False),
+    sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('bytes', sa.BigInteger),
+    sa.Column('rows', sa.Integer),
+    sa.Column('seconds', sa.Float),
+    sa.Column('error', sa.String),
+    sa.Column('started_at', sa.DateTime(timezone=True)),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+)
+
+# Keep in sync with `etc/006-create_work_queue.sql`.
+work_queue = sa.Table(
+    'work_queue', metadata,
+    sa.Column('id', sa.BigInteger, primary_key=True),
+    sa.Column('district', sa.String(8), nullable=False),
+    sa.Column('report_year', sa.Integer, nullable=False),
+    sa.Column('report_month', sa.Integer, nullable=False),
+    sa.Column('status', sa.String(16), nullable=False, server_default='pending'),
+    sa.Column('attempts', sa.Integer, nullable=False, server_default='0'),
+    sa.Column('worker', sa.String),
+    sa.Column('lease_until', sa.DateTime(timezone=True)),
+    sa.Column('rows', sa.Integer),
+    sa.Column('error', sa.String),
+    sa.Column('enqueued_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+    sa.UniqueConstraint('district', 'report_year', 'report_month', name='work_queue_unit'),
+)
+
+
+# Keep in sync with `etc/007-create_rollups.sql`, totals per area, division and district of a period.
+ROLLUP_MEASURES = ('clubs', 'new_members', 'total_renewals', 'total_to_date',
+                   'distinguished', 'select_distinguished', 'presidents_distinguished')
+
+
+def rollup_table(name: str, *keys: str) -> sa.Table:
+    return sa.Table(
+        name, metadata,
+        sa.Column('report_year', sa.Integer, primary_key=True, autoincrement=False),
+        sa.Column('report_month', sa.Integer, primary_key=True, autoincrement=False),
+        *[sa.Column(key, sa.String(8), primary_key=True) for key in keys],
+        *[sa.Column(measure, sa.Integer, nullable=False, server_default='0') for measure in ROLLUP_MEASURES],
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False,
+                  server_default=sa.func.current_timestamp()),
+    )
+
+
+district_perf_area = rollup_table('district_perf_area', 'district', 'division', 'area')
+district_perf_division = rollup_table('district_perf_division', 'district', 'division')
+district_perf_district = rollup_table('district_perf_district', 'district')
+
+# Versions of the `etc` scripts applied by `migrations.Migrator`, created on the fly.
+schema_migrations = sa.Table(
+    'schema_migrations', metadata,
+    sa.Column('version', sa.Integer, primary_key=True, autoincrement=False),
+    sa.Column('name', sa.String, nullable=False),
+    sa.Column('applied_at', sa.DateTime(timezone=True), nullable=False, server_default=sa.func.current_timestamp()),
+)
@@ -0,0 +1,269 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import os
+import math
+import uuid
+import datetime
+
+import numpy as np
+import sqlalchemy as sa
+
+from . import schema
+from .common.eviltransform import earthR, wgs2gcj_batch
+
+
+FRAMES = ('local', 'wgs84')
+
+
+def unit_vectors(lat: ty.Any, lon: ty.Any) -> np.ndarray:
+    """
+    Points on the unit sphere, shape ``(n, 3)``.
+    """
+    lat = np.radians(np.ravel(np.asarray(lat, dtype=np.float64)))
+    lon = np.radians(np.ravel(np.asarray(lon, dtype=np.float64)))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord(meters: float) -> float:
+    """
+    Straight-line distance between two points of the unit sphere ``meters`` apart.
+    """
+    return 2 * math.sin(min(meters / earthR, math.pi) / 2)
+
+
+def meters(chords: np.ndarray) -> np.ndarray:
+    return 2 * np.arcsin(np.clip(chords / 2, 0, 1)) * earthR
+
+
+class ClubIndex(object):
+    """
+    Spatial index of club locations for radius and nearest neighbour queries.
+
+    Clubs are indexed by their ``lat_local``/``lon_local``, i.e. GCJ-02 in mainland China
+    and WGS-84 elsewhere, the frame of the maps clubs are shown on. Points are placed on
+    the unit sphere and bucketed in a uniform grid of ``cell_km`` cubes, sorted by cell,
+    so a query only measures the clubs of the few cells around it.
+
+    ``update`` and ``remove`` change single clubs, ``sync`` applies the clubs crawled
+    since the last one. The index is saved to a ``.npz`` file.
+    """
+
+    DEFAULT_CELL_KM = 5.0
+    # beyond this many cells a query measures every club instead
+    MAX_CELLS = 4096
+
+    def __init__(self, cell_km: float | None = None) -> None:
+        self.cell_km = float(cell_km or self.DEFAULT_CELL_KM)
+        self.cell = chord(self.cell_km * 1000)
+        # cells along an axis, with a margin so that neighbours never wrap around
+        self.side = int(math.ceil(2 / self.cell)) + 3
+        self.synced_at: datetime.datetime | None = None
+        self._build(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _cells(self, xyz: np.ndarray) -> np.ndarray:
+        return np.floor((xyz + 1) / self.cell).astype(np.int64) + 1
+
+    def _keys(self, cells: np.ndarray) -> np.ndarray:
+        return (cells[..., 0] * self.side + cells[..., 1]) * self.side + cells[..., 2]
+
+    def _build(self, ids: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> None:
+        xyz = unit_vectors(lat, lon)
+        keys = self._keys(self._cells(xyz))
+        order = np.argsort(keys, kind='stable')
+
+        self.ids = np.asarray(ids, dtype=np.int64)[order]
+        self.lat = np.asarray(lat, dtype=np.float64)[order]
+        self.lon = np.asarray(lon, dtype=np.float64)[order]
+        self.xyz = xyz[order]
+        self.keys = keys[order]
+        self._offsets: ty.Dict[int, np.ndarray] = dict()
+
+    @classmethod
+    def build(cls, ids: ty.Any, lat: ty.Any, lon: ty.Any, cell_km: float | None = None) -> "ClubIndex":
+        index = cls(cell_km=cell_km)
+        index.update(ids, lat, lon)
+        return index
+
+    def update(self, ids: ty.Any, lat: ty.Any, lon: ty.Any) -> None:
+        """
+        Add clubs, or move them when indexed already.
+        """
+        ids = np.ravel(np.asarray(ids, dtype=np.int64))
+        lat = np.ravel(np.asarray(lat, dtype=np.float64))
+        lon = np.ravel(np.asarray(lon, dtype=np.float64))
+        # the last location of a club given twice wins
+        _, last = np.unique(ids[::-1], return_index=True)
+        last = len(ids) - 1 - last
+
+        keep = ~np.isin(self.ids, ids)
+        self._build(np.concatenate((self.ids[keep], ids[last])),
+                    np.concatenate((self.lat[keep], lat[last])),
+                    np.concatenate((self.lon[keep], lon[last])))
+
+    def remove(self, ids: ty.Any) -> None:
+        keep = ~np.isin(self.ids, np.ravel(np.asarray(ids, dtype=np.int64)))
+        self._build(self.ids[keep], self.lat[keep], self.lon[keep])
+
+    def _neighbours(self, rings: int) -> np.ndarray:
+        """
+        Key offsets of the cells at most ``rings`` cells away on every axis.
+        """
+        if rings not in self._offsets:
+            steps = np.arange(-rings, rings + 1)
+            cube = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+            self._offsets[rings] = self._keys(cube)
+        return self._offsets[rings]
+
+    def _candidates(self, point: np.ndarray, rings: int) -> np.ndarray:
+        """
+        Positions of the clubs in the cells around ``point``.
+        """
+        if (2 * rings + 1) ** 3 > min(self.MAX_CELLS, max(len(self.ids), 1)):
+            return np.arange(len(self.ids))
+
+        keys = self._keys(self._cells(point)) + self._neighbours(rings)
+        begin = np.searchsorted(self.keys, keys, side='left')
+        end = np.searchsorted(self.keys, keys, side='right')
+        found = end > begin
+        if not found.any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(b, e) for b, e in zip(begin[found], end[found])])
+
+    def _queries(self, lat: ty.Any, lon: ty.Any, frame: str) -> np.ndarray:
+        if frame not in FRAMES:
+            raise ValueError('Unknown frame: %s' % frame)
+        if frame == 'wgs84':
+            lat, lon = wgs2gcj_batch(lat, lon)
+        return unit_vectors(lat, lon)
+
+    def radius(self, lat: ty.Any, lon: ty.Any, km: float,
+               frame: str = 'local') -> ty.List[ty.Tuple[np.ndarray, np.ndarray]]:
+        """
+        Clubs within ``km`` of every query point, as (club ids, meters) nearest first.
+        """
+        limit = chord(km * 1000)
+        rings = int(math.ceil(limit / self.cell))
+
+        result = list()
+        for point in self._queries(lat, lon, frame):
+            positions = self._candidates(point, rings)
+            distances = np.linalg.norm(self.xyz[positions] - point, axis=1)
+            within = distances <= limit
+            positions, distances = positions[within], distances[within]
+            order = np.argsort(distances, kind='stable')
+            result.append((self.ids[positions[order]], meters(distances[order])))
+
+        return result
+
+    def knn(self, lat: ty.Any, lon: ty.Any, k: int, frame: str = 'local') -> ty.Tuple[np.ndarray, np.ndarray]:
+        """
+        The ``k`` clubs nearest to every query point as two ``(points, k)`` arrays of club
+        ids and meters, padded with -1 and infinity when fewer clubs are indexed.
+        """
+        points = self._queries(lat, lon, frame)
+        ids = np.full((len(points), k), -1, dtype=np.int64)
+        distances = np.full((len(points), k), np.inf)
+        n = min(k, len(self.ids))
+        if not n:
+            return ids, distances
+
+        for i, point in enumerate(points):
+            rings = 1
+            while True:
+                positions = self._candidates(point, rings)
+                everything = len(positions) == len(self.ids)
+                if len(positions) >= n or everything:
+                    chords = np.linalg.norm(self.xyz[positions] - point, axis=1)
+                    nearest = np.argpartition(chords, n - 1)[:n]
+                    # the cells within ``rings`` hold every club closer than ``rings`` cells
+                    if everything or chords[nearest].max() <= rings * self.cell:
+                        break
+                rings *= 2
+
+            order = nearest[np.argsort(chords[nearest], kind='stable')]
+            ids[i, :n] = self.ids[positions[order]]
+            distances[i, :n] = meters(chords[order])
+
+        return ids, distances
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to ``path`` atomically.
+        """
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+
+        temp = os.path.join(directory, '.%s.tmp' % uuid.uuid4().hex)
+        try:
+            with open(temp, 'wb') as f:
+                np.savez(f, ids=self.ids, lat=self.lat, lon=self.lon, cell_km=self.cell_km,
+                         synced_at=self.synced_at.isoformat() if self.synced_at else '')
+            os.replace(temp, path)
+        finally:
+            if os.path.exists(temp):
+                os.unlink(temp)
+
+    @classmethod
+    def load(cls, path: str) -> "ClubIndex":
+        with np.load(os.path.expanduser(path)) as data:
+            index = cls.build(data['ids'], data['lat'], data['lon'], cell_km=float(data['cell_km']))
+            synced_at = str(data['synced_at'])
+
+        index.synced_at = datetime.datetime.fromisoformat(synced_at) if synced_at else None
+        return index
+
+    def sync(self, engine: sa.engine.Engine) -> int:
+        """
+        Apply the clubs crawled since the last sync, all of them the first time. Clubs
+        that lost their location are removed. Returns the number of clubs read.
+        """
+        table = schema.club_detail
+        stmt = sa.select(table.c.club,
+                         sa.func.coalesce(table.c.lat_local, table.c.lat),
+                         sa.func.coalesce(table.c.lon_local, table.c.lon),
+                         table.c.fetched_at)
+        if self.synced_at is not None:
+            stmt = stmt.where(table.c.fetched_at > self.synced_at)
+
+        with engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        if not rows:
+            return 0
+
+        clubs, lat, lon, fetched_at = zip(*rows)
+        lat = np.array(lat, dtype=np.float64)
+        lon = np.array(lon, dtype=np.float64)
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        clubs = np.array(clubs, dtype=np.int64)
+
+        self.remove(clubs[~located])
+        self.update(clubs[located], lat[located], lon[located])
+        self.synced_at = max(fetched_at)
+
+        return len(rows)
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]],
+                    engine: sa.engine.Engine, rebuild: bool = False) -> "ClubIndex":
+        """
+        Load the index saved at ``path`` and sync it with ``engine``, built from scratch
+        when there is no file yet or on ``rebuild``.
+        """
+        config = config or dict()
+        path = config.get('path')
+        if path and not rebuild and os.path.exists(os.path.expanduser(path)):
+            index = cls.load(path)
+        else:
+            index = cls(cell_km=config.get('cell_km'))
+
+        index.sync(engine)
+        if path:
+            index.save(path)
+        return index
@@ -0,0 +1,75 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import unittest
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_district_report(self):
+        from dpr_export.persistence import clean
+        from dpr_export.benchmarks.synthetic import district_report
+
+        report = district_report(100, seed=1)
+        df = clean(report)
+
+        self.assertEqual(report, district_report(100, seed=1))
+        self.assertEqual(100, len(df))
+        self.assertTrue(df['charter_date'].notna().any())
+        self.assertTrue(df['suspend_date'].notna().any())
+
+    def test_club_detail_page(self):
+        from dpr_export.extractors.club_detail import ClubDetailExtractor
+        from dpr_export.extractors.club_detail_fast import FastClubDetailExtractor
+        from dpr_export.benchmarks.synthetic import club_detail_page
+
+        html = club_detail_page(1234567, district=88)
+        result = ClubDetailExtractor().extract(html)
+
+        self.assertEqual('Synthetic 1234567 Toastmasters Club', result['name'])
+        self.assertEqual('88', result['district'])
+        self.assertEqual(4, len(result['address']))
+        self.assertIsNotNone(result['location_ti'])
+        self.assertEqual(result, FastClubDetailExtractor().extract(html))
+
+
+class TestSuite(unittest.TestCase):
+
+    def test_run_and_compare(self):
+        import copy
+        from dpr_export.benchmarks.suite import run, compare
+
+        results = run(sizes=[20], pages=2, repeat=1, processes=[1])
+
+        self.assertIn('clean[20]', results['results'])
+        self.assertIn('parse_report[20]x1', results['results'])
+        self.assertIn('gcj2wgs_exact_batch[20]', results['results'])
+        self.assertIn('FastClubDetailExtractor.extract[2]', results['results'])
+        self.assertIn('import[dpr_export.app]', results['results'])
+        self.assertNotIn('save_copy[20]', results['results'])
+        self.assertEqual([20], results['meta']['sizes'])
+
+        slower = copy.deepcopy(results)
+        slower['results']['clean[20]']['seconds'] *= 2
+
+        self.assertEqual([], compare(results, results))
+        self.assertEqual(['clean[20]'], [r[0] for r in compare(results, slower)])
+
+
+class TestImportTime(unittest.TestCase):
+
+    # the timing is left to `python -m dpr_export.benchmarks.importtime`, wall-clock
+    # assertions only fail on busy hosts
+    def test_no_heavy_imports(self):
+        from dpr_export.benchmarks.importtime import heavy_imports
+
+        self.assertEqual([], heavy_imports('dpr_export.app'))
+
+    def test_help_without_config(self):
+        from click.testing import CliRunner
+        from dpr_export.app import cli
+
+        result = CliRunner().invoke(cli, ['--config', '/nonexistent/config.yaml', 'run', '--help'])
+
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn('--refresh', result.output)
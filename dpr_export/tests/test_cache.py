@@ -0,0 +1,158 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import datetime
+import tempfile
+import unittest
+
+from .test_persistence import REPORT
+from .test_requester import StubHandler, StubServerTestCase
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        from dpr_export.cache import ResponseCache
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_put_get(self):
+        self.cache.put('http://a/1', b'body', {'ETag': '"x"'}, permanent=False)
+        self.cache.put('http://a/2', b'body', {}, permanent=True)
+
+        entry = self.cache.get('http://a/1')
+        self.assertEqual(b'body', self.cache.read(entry))
+        self.assertEqual({'If-None-Match': '"x"'}, entry.conditional_headers())
+        self.assertIsNone(self.cache.get('http://a/3'))
+
+        info = self.cache.info()
+        self.assertEqual(2, info['entries'])
+        self.assertEqual(1, info['objects'])
+        self.assertEqual(4, info['bytes'])
+
+    def test_evict(self):
+        self.cache.put('http://a/1', b'1' * 10, {}, permanent=True)
+        self.cache.put('http://a/2', b'2' * 10, {}, permanent=False)
+        self.cache.put('http://a/3', b'3' * 10, {}, permanent=False)
+
+        self.assertEqual(1, self.cache.evict(20))
+        self.assertIsNone(self.cache.get('http://a/2'))
+        self.assertIsNotNone(self.cache.get('http://a/1'))
+
+    def test_max_bytes(self):
+        from dpr_export.cache import ResponseCache
+
+        cache = ResponseCache(self.directory.name, max_bytes=100)
+        scans = list()
+        entries = cache.entries
+        cache.entries = lambda: scans.append(1) or entries()
+
+        for i in range(10):
+            cache.put('http://a/%d' % i, b'%d' % i * 10, {}, permanent=False)
+        cache.put('http://a/same', b'0' * 10, {}, permanent=False)
+        self.assertEqual(100, cache.total_bytes)
+        # counted once from the index, not read again on every put
+        self.assertEqual(1, len(scans))
+
+        # the least recently used entries go, down to EVICT_TO of max_bytes, a body
+        # another entry still references stays
+        cache.put('http://a/10', b'x' * 10, {}, permanent=False)
+        self.assertEqual(2, len(scans))
+        self.assertEqual(90, cache.total_bytes)
+        self.assertIsNone(cache.get('http://a/0'))
+        self.assertIsNone(cache.get('http://a/1'))
+        self.assertEqual(b'0' * 10, cache.read(cache.get('http://a/same')))
+        self.assertEqual(90, cache.info()['bytes'])
+
+    def test_purge(self):
+        self.cache.put('http://a/1', b'1', {}, permanent=True)
+        self.cache.put('http://a/2', b'2', {}, permanent=False)
+
+        self.assertEqual(1, self.cache.purge(volatile_only=True))
+        self.assertEqual(1, self.cache.purge())
+        self.assertEqual(0, self.cache.info()['entries'])
+
+
+class ConditionalHandler(StubHandler):
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == '"v1"':
+            with self.server.lock:
+                self.server.requests.append(dict(path=self.path, headers=dict(self.headers)))
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = REPORT.encode('utf-8')
+        with self.server.lock:
+            self.server.requests.append(dict(path=self.path, headers=dict(self.headers)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv; charset=utf-8')
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestRequesterCache(StubServerTestCase):
+
+    handler = ConditionalHandler
+
+    def setUp(self):
+        from dpr_export.cache import ResponseCache
+
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.directory.name)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_closed_year_is_permanent(self):
+        requester = self.requester(cache=self.cache)
+
+        self.assertEqual(REPORT, requester.fetch(district=88, year=2019, month=6))
+        self.assertEqual(REPORT, requester.fetch(district=88, year=2019, month=6))
+        with requester.stream(district=88, year=2019, month=6) as stream:
+            self.assertEqual(REPORT, stream.read())
+
+        self.assertEqual(1, len(self.server.requests))
+
+    def test_open_year_is_revalidated(self):
+        requester = self.requester(cache=self.cache)
+        today = datetime.date.today()
+
+        with requester.stream(district=88, year=today.year, month=today.month) as stream:
+            self.assertEqual(REPORT, stream.read())
+        self.assertEqual(REPORT, requester.fetch(district=88, year=today.year, month=today.month))
+
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual('"v1"', self.server.requests[1]['headers'].get('If-None-Match'))
+
+    def test_key_survives_new_year(self):
+        import types
+        from unittest import mock
+        import dpr_export.requester
+
+        class FrozenDate(datetime.date):
+            frozen = None
+
+            @classmethod
+            def today(cls):
+                return cls.frozen
+
+        requester = self.requester(cache=self.cache)
+        frozen = types.SimpleNamespace(date=FrozenDate, timedelta=datetime.timedelta)
+
+        with mock.patch.object(dpr_export.requester, 'datetime', frozen):
+            for today in (datetime.date(2023, 12, 31), datetime.date(2024, 1, 1)):
+                FrozenDate.frozen = today
+                self.assertIn('~~2000-%d' % today.year, requester.build_url(district=88, year=2019, month=6))
+                self.assertEqual(REPORT, requester.fetch(district=88, year=2019, month=6))
+
+        self.assertEqual(1, len(self.server.requests))
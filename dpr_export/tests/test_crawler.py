@@ -0,0 +1,94 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import time
+import unittest
+
+from .test_persistence import DATABASE_URL, REPORT
+from .test_requester import StubHandler, StubServerTestCase
+
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'club_detail.html')
+
+
+def club_detail_html() -> bytes:
+    with open(FIXTURE, 'rb') as f:
+        return f.read()
+
+
+class TestExtractClubDetail(unittest.TestCase):
+
+    def test_extract(self):
+        from dpr_export.crawler import extract_club_detail
+
+        row = extract_club_detail(7919786, club_detail_html(), None)
+
+        self.assertIsNone(row['error'])
+        self.assertEqual('88', row['district'])
+        self.assertEqual(2, row['meeting_day'])
+        self.assertEqual(39.7631, row['lat'])
+
+    def test_extract_error(self):
+        from dpr_export.crawler import extract_club_detail
+
+        self.assertEqual('HTTPError', extract_club_detail(1, None, 'HTTPError')['error'])
+        self.assertTrue(extract_club_detail(1, b'<html></html>', None)['error'])
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_acquire(self):
+        from dpr_export.ratelimit import TokenBucket
+
+        bucket = TokenBucket(rate=20, burst=1)
+        begin = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - begin, 0.15)
+
+
+class ClubHandler(StubHandler):
+
+    responses = [(200, {'Content-Type': 'text/html; charset=utf-8'}, club_detail_html())]
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestClubCrawler(StubServerTestCase):
+
+    handler = ClubHandler
+
+    def setUp(self):
+        from dpr_export.db import create_engine
+        from dpr_export.persistence import Persistence, clean, unique_key
+
+        super().setUp()
+        self.engine = create_engine(DATABASE_URL)
+        with self.engine.begin() as conn:
+            for table, script in (('district_perf', '000-create_table.sql'),
+                                  ('club_detail', '002-create_club_detail.sql')):
+                with open(os.path.join(os.path.dirname(__file__), '..', '..', 'etc', script)) as f:
+                    conn.exec_driver_sql('DROP TABLE IF EXISTS %s CASCADE' % table)
+                    conn.exec_driver_sql(f.read())
+
+        Persistence(self.engine).save(unique_key(clean(REPORT), year=2023, month=6))
+
+    def tearDown(self):
+        super().tearDown()
+        self.engine.dispose()
+
+    def test_run(self):
+        from dpr_export.crawler import ClubCrawler
+
+        requester = self.requester()
+        requester.FIND_CLUBS_BASE_URL = self.base_url + '/Find-a-Club/%(club_id)s'
+
+        crawler = ClubCrawler(self.engine, requester, workers=2, processes=1, batch_size=3)
+        self.assertEqual(4, len(crawler.pending()))
+
+        stats = crawler.run()
+        self.assertEqual(4, stats['clubs'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual([], crawler.pending())
+        self.assertIn('/Find-a-Club/07919786', [r['path'] for r in self.server.requests])
@@ -0,0 +1,53 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import unittest
+
+import numpy as np
+
+
+class TestEvilTransformBatch(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(42)
+        # mostly inside China, with a few points outside of it
+        self.lat = np.concatenate([rng.uniform(18, 53, 500), [-33.86, 51.5, 40.71]])
+        self.lng = np.concatenate([rng.uniform(73, 135, 500), [151.2, -0.12, -74.0]])
+
+    def assert_matches(self, scalar, batch, places=9):
+        expected = np.array([scalar(lat, lng) for lat, lng in zip(self.lat, self.lng)])
+        lat, lng = batch(self.lat, self.lng)
+
+        np.testing.assert_allclose(expected[:, 0], lat, rtol=0, atol=10 ** -places)
+        np.testing.assert_allclose(expected[:, 1], lng, rtol=0, atol=10 ** -places)
+
+    def test_out_of_china(self):
+        from dpr_export.common import eviltransform
+
+        expected = [eviltransform.outOfChina(lat, lng) for lat, lng in zip(self.lat, self.lng)]
+        self.assertEqual(expected, eviltransform.outOfChina_batch(self.lat, self.lng).tolist())
+
+    def test_transforms(self):
+        from dpr_export.common import eviltransform
+
+        for name in ('wgs2gcj', 'gcj2wgs', 'gcj2bd', 'bd2gcj', 'wgs2bd', 'bd2wgs'):
+            self.assert_matches(getattr(eviltransform, name), getattr(eviltransform, name + '_batch'))
+
+    def test_gcj2wgs_exact(self):
+        from dpr_export.common import eviltransform
+
+        self.assert_matches(eviltransform.gcj2wgs_exact, eviltransform.gcj2wgs_exact_batch, places=7)
+
+    def test_distance(self):
+        from dpr_export.common import eviltransform
+
+        matrix = eviltransform.distance_matrix(self.lat[:20], self.lng[:20])
+        self.assertEqual((20, 20), matrix.shape)
+
+        for i in range(20):
+            for j in range(20):
+                expected = eviltransform.distance(self.lat[i], self.lng[i], self.lat[j], self.lng[j])
+                self.assertAlmostEqual(expected, matrix[i, j], delta=1e-3)
+
+        # acos loses precision next to 1, identical points are within a meter
+        np.testing.assert_allclose(np.diag(matrix), 0, atol=1)
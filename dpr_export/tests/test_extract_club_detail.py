@@ -50,3 +50,31 @@ class TestExtractClubDetail(unittest.TestCase):
         self.assertEqual('88', district)
         self.assertEqual('D', division)
         self.assertEqual('4', area)
+
+
+class TestFastClubDetailExtractor(unittest.TestCase):
+
+    def setUp(self):
+        import os
+
+        with open(os.path.join(os.path.dirname(__file__), 'fixtures', 'club_detail.html'), 'rb') as f:
+            self.html = f.read()
+
+    def test_extract_identical(self):
+        from dpr_export.extractors.club_detail import ClubDetailExtractor
+        from dpr_export.extractors.club_detail_fast import FastClubDetailExtractor
+
+        variants = (
+            self.html,
+            self.html.decode('utf-8'),
+            self.html.replace(b'<p>Club Number:', b'<p><!-- club --><b>Info</b> Club Number:'),
+            self.html.replace(b'China', b'<!-- PRC -->China'),
+        )
+
+        for html in variants:
+            expected = ClubDetailExtractor().extract(html)
+            self.assertEqual(expected, FastClubDetailExtractor().extract(html))
+
+        result = FastClubDetailExtractor().extract(self.html)
+        self.assertEqual(('88', 'D', '4'), (result['district'], result['division'], result['area']))
+        self.assertEqual((39.7631, 116.21457), result['location_ti'])
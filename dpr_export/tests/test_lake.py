@@ -0,0 +1,112 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import tempfile
+import importlib.util
+import unittest
+
+from .test_persistence import REPORT
+from .test_requester import StubServerTestCase
+
+
+PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+def report_frame(year=2023, month=6):
+    from dpr_export.persistence import clean, unique_key
+
+    return unique_key(clean(REPORT), year=year, month=month)
+
+
+@unittest.skipUnless(PYARROW, 'pyarrow is not installed')
+class TestParquetLake(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_read(self):
+        from dpr_export.lake import ParquetLake
+
+        lake = ParquetLake(self.directory.name)
+        self.assertEqual(4, lake.write(report_frame(2023)))
+        self.assertEqual(4, lake.write(report_frame(2022)))
+
+        self.assertEqual([('88', 2022, 6), ('88', 2023, 6)], lake.partitions())
+        self.assertTrue(os.path.exists(os.path.join(lake.partition_path('88', 2023, 6), lake.FILE_NAME)))
+
+        df = lake.read(filters=[('report_year', '=', 2023), ('division', '=', 'D')])
+        self.assertEqual([7919786, 1234567], df['club'].tolist())
+        self.assertEqual('category', str(df['district'].dtype))
+        self.assertEqual('Int32', str(df['new_members'].dtype))
+        self.assertEqual('datetime64[ns]', str(df['charter_date'].dtype))
+        self.assertEqual(report_frame()['charter_date'].iloc[0], df['charter_date'].iloc[0])
+
+        table = lake.scan(columns=['club', 'total_to_date'], filters=[('total_to_date', '>=', 10)])
+        self.assertEqual(['club', 'total_to_date'], table.column_names)
+        self.assertEqual(4, table.num_rows)
+
+    def test_rewrite_replaces_partition(self):
+        from dpr_export.lake import ParquetLake
+
+        lake = ParquetLake(self.directory.name)
+        lake.write(report_frame())
+        lake.write(report_frame().iloc[:2])
+
+        self.assertEqual(2, len(lake.read()))
+        self.assertEqual([lake.FILE_NAME], os.listdir(lake.partition_path('88', 2023, 6)))
+
+    def test_abort(self):
+        from dpr_export.lake import ParquetLake
+
+        lake = ParquetLake(self.directory.name)
+        lake.write(report_frame())
+
+        with self.assertRaises(RuntimeError):
+            with lake.writer() as writer:
+                writer.write(report_frame().iloc[:1])
+                raise RuntimeError()
+
+        self.assertEqual(4, len(lake.read()))
+        self.assertEqual([lake.FILE_NAME], os.listdir(lake.partition_path('88', 2023, 6)))
+
+
+@unittest.skipUnless(PYARROW, 'pyarrow is not installed')
+class TestAppLake(StubServerTestCase):
+
+    def setUp(self):
+        import yaml
+
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.directory.name, 'config.yaml')
+
+        config = dict(lake=dict(directory=os.path.join(self.directory.name, 'lake')),
+                      streaming=dict(enabled=True, rows=2),
+                      fetch=[dict(district=88, periods=[dict(year=2023, month=6), dict(year=2022, month=6)])])
+        with open(self.config, 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_run_without_database(self):
+        from dpr_export.app import App
+
+        app = App().configure(self.config).setup()
+        app.requester.BASE_URL = self.requester().BASE_URL
+        app.run()
+
+        self.assertIsNone(app.persistence)
+        self.assertEqual([('88', 2022, 6), ('88', 2023, 6)], app.lake.partitions())
+        self.assertEqual(8, len(app.lake.read()))
+
+        # both program years are closed, a second run has nothing left to fetch
+        plan = app.plan()
+        self.assertEqual([], plan['units'])
+        self.assertEqual(2, len(plan['skipped']))
+        self.assertEqual(2, len(app.plan(refresh=True)['units']))
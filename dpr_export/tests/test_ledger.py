@@ -0,0 +1,157 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import importlib.util
+import unittest
+
+from .test_requester import StubHandler, StubServerTestCase
+
+
+class TestLedger(unittest.TestCase):
+
+    def setUp(self):
+        import sqlalchemy as sa
+        from dpr_export.ledger import Ledger
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = sa.create_engine('sqlite:///%s' % os.path.join(self.directory.name, 'ledger.sqlite'))
+        self.ledger = Ledger(self.engine)
+        self.units = [dict(district=88, year=2023, month=6), dict(district=85, year=2023, month=6)]
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.directory.cleanup()
+
+    def test_lifecycle(self):
+        from dpr_export.ledger import Ledger
+
+        ledger = self.ledger
+        self.assertEqual(2, ledger.add(self.units))
+
+        self.assertTrue(ledger.claim(self.units[0]))
+        self.assertFalse(ledger.claim(self.units[0]))
+        ledger.fetched(self.units[0], 1024)
+        ledger.done(self.units[0], rows=4)
+
+        self.assertTrue(ledger.claim(self.units[1]))
+        ledger.failed(self.units[1], ValueError('broken'))
+
+        self.assertFalse(ledger.claim(self.units[0]))
+        self.assertEqual([self.units[1]], ledger.unfinished())
+
+        summary = ledger.summary()
+        self.assertEqual(dict(units=1, attempts=1, bytes=1024, rows=4), {k: summary['done'][k] for k in
+                                                                         ('units', 'attempts', 'bytes', 'rows')})
+        self.assertEqual('ValueError: broken', ledger.failures()[0]['error'])
+
+        # failed units are claimed again, with one more attempt
+        self.assertTrue(ledger.claim(self.units[1]))
+        ledger.done(self.units[1], rows=4)
+        self.assertEqual([], ledger.unfinished())
+        self.assertEqual(3, ledger.summary()['done']['attempts'])
+
+        # adding them again queues them for another run, once the last one is over
+        ledger.add(self.units)
+        self.assertEqual([], ledger.unfinished())
+        Ledger(self.engine, lease_seconds=-1).add(self.units)
+        self.assertEqual(2, len(ledger.unfinished()))
+
+    def test_stale_lease(self):
+        from dpr_export.ledger import Ledger
+
+        self.ledger.add(self.units)
+        self.assertTrue(self.ledger.claim(self.units[0]))
+
+        # the worker holding the unit died, its lease runs out
+        self.assertFalse(self.ledger.claim(self.units[0]))
+        self.assertTrue(Ledger(self.engine, lease_seconds=-1).claim(self.units[0]))
+
+    def test_add_running(self):
+        from dpr_export.ledger import Ledger
+
+        self.ledger.add(self.units)
+        self.assertTrue(self.ledger.claim(self.units[0]))
+        self.ledger.renew(self.units[0])
+
+        # another run of the same reports leaves the one being exported alone
+        self.ledger.add(self.units)
+        self.assertFalse(self.ledger.claim(self.units[0]))
+        self.assertEqual(1, self.ledger.summary()['running']['units'])
+
+        # unless its worker died
+        Ledger(self.engine, lease_seconds=-1).add(self.units)
+        self.assertEqual(2, self.ledger.summary()['pending']['units'])
+
+    def test_concurrent_claims(self):
+        self.ledger.add(self.units)
+        claims = list()
+
+        def claim():
+            claims.append(self.ledger.claim(self.units[0]))
+
+        threads = [threading.Thread(target=claim) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, claims.count(True))
+
+
+class FailingHandler(StubHandler):
+
+    def do_GET(self):
+        if self.server.failing and '~85~' in self.path:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+class TestAppResume(StubServerTestCase):
+
+    handler = FailingHandler
+
+    def setUp(self):
+        import yaml
+
+        super().setUp()
+        self.server.failing = True
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.directory.name, 'config.yaml')
+
+        config = dict(lake=dict(directory=os.path.join(self.directory.name, 'lake')),
+                      ledger=dict(url='sqlite:///%s' % os.path.join(self.directory.name, 'ledger.sqlite')),
+                      fetch=[dict(districts=[88, 85], periods=[dict(year=2023, month=6), dict(year=2022, month=6)])])
+        with open(self.config, 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_resume(self):
+        from dpr_export.app import App
+
+        app = App().configure(self.config).setup()
+        app.requester.BASE_URL = self.requester().BASE_URL
+
+        app.run()
+
+        self.assertEqual(2, app.ledger.summary()['failed']['units'])
+        self.assertEqual([dict(district=85, year=2022, month=6), dict(district=85, year=2023, month=6)],
+                         app.ledger.unfinished())
+
+        self.server.failing = False
+        self.server.requests.clear()
+        app.resume()
+
+        self.assertEqual(2, len(self.server.requests))
+        self.assertTrue(all('~85~' in r['path'] for r in self.server.requests))
+        self.assertEqual([], app.ledger.unfinished())
+        self.assertEqual(4, app.ledger.summary()['done']['units'])
@@ -0,0 +1,97 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import json
+import tempfile
+import unittest
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timer(self):
+        from dpr_export.metrics import Metrics
+
+        registry = Metrics()
+        with registry.timer('fetch', url='http://example.com') as fields:
+            fields['bytes'] = 1024
+        registry.record('fetch', 0.5, bytes=1024)
+        registry.record('parse', 0.25, rows=10)
+
+        summary = registry.summary()
+        self.assertEqual(summary['fetch']['count'], 2)
+        self.assertEqual(summary['fetch']['bytes'], 2048)
+        self.assertGreaterEqual(summary['fetch']['seconds'], 0.5)
+        self.assertEqual(summary['parse']['rows_per_second'], 40.0)
+
+    def test_timer_records_on_error(self):
+        from dpr_export.metrics import Metrics
+
+        registry = Metrics()
+        with self.assertRaises(ValueError):
+            with registry.timer('load'):
+                raise ValueError()
+
+        self.assertEqual(registry.summary()['load']['count'], 1)
+
+    def test_sink(self):
+        from dpr_export.metrics import Metrics
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.jsonl')
+            registry = Metrics().configure(path)
+            registry.record('parse', 0.1, rows=3)
+            registry.record('load', 0.2, rows=3, loader='copy')
+            registry.close()
+
+            with open(path) as f:
+                events = [json.loads(line) for line in f]
+
+        self.assertEqual([e['stage'] for e in events], ['parse', 'load'])
+        self.assertEqual(events[1]['loader'], 'copy')
+
+    def test_prometheus(self):
+        from dpr_export.metrics import Metrics
+
+        registry = Metrics()
+        registry.record('fetch', 1.5, bytes=100)
+
+        text = registry.prometheus()
+        self.assertIn('# TYPE dpr_export_stage_seconds_total counter', text)
+        self.assertIn('dpr_export_stage_bytes_total{stage="fetch"} 100', text)
+        self.assertIn('dpr_export_stage_seconds_total{stage="fetch"} 1.5', text)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_report(self):
+        from dpr_export.profiling import Profiler
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.txt')
+            with Profiler(path):
+                sorted(str(i) for i in range(10000))
+
+            with open(path) as f:
+                report = f.read()
+
+            self.assertTrue(os.path.exists(path + '.prof'))
+
+        self.assertIn('peak', report)
+        self.assertIn('cumulative', report)
+
+    def test_pipeline_threads(self):
+        from dpr_export.profiling import Profiler
+        from dpr_export.pipeline import Pipeline, Stage
+
+        def crunch(item):
+            return sorted(str(i) for i in range(item))
+
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler(os.path.join(directory, 'profile.txt'))
+            with profiler:
+                Pipeline([Stage('crunch', crunch, workers=2)]).run([1000] * 4)
+
+            functions = {name for _, _, name in profiler.stats().stats}
+
+        self.assertIn('crunch', functions)
@@ -0,0 +1,109 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+from .test_persistence import DATABASE_URL, REPORT
+
+
+class TestMigrations(unittest.TestCase):
+
+    def test_migrations(self):
+        from dpr_export.migrations import migrations
+
+        result = migrations()
+
+        self.assertEqual(list(range(len(result))), [m.version for m in result])
+        self.assertEqual('create_table', result[0].name)
+        self.assertIn('partition by range (report_year)', result[4].sql())
+
+    def test_directory(self):
+        from dpr_export.migrations import migrations
+
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ('010-b.sql', '002-a.sql', 'config.example.yaml', 'notes.sql'):
+                open(os.path.join(directory, filename), 'w').close()
+
+            self.assertEqual([(2, 'a'), (10, 'b')], [(m.version, m.name) for m in migrations(directory)])
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestMigrator(unittest.TestCase):
+
+    SCHEMA = 'dpr_test_migrations'
+
+    def setUp(self):
+        import sqlalchemy as sa
+
+        self.engine = sa.create_engine(DATABASE_URL, connect_args=dict(options='-csearch_path=%s' % self.SCHEMA))
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP SCHEMA IF EXISTS %s CASCADE' % self.SCHEMA)
+            conn.exec_driver_sql('CREATE SCHEMA %s' % self.SCHEMA)
+
+    def tearDown(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP SCHEMA IF EXISTS %s CASCADE' % self.SCHEMA)
+        self.engine.dispose()
+
+    def report(self, year):
+        from dpr_export.persistence import clean, unique_key
+        return unique_key(clean(REPORT), year=year, month=6)
+
+    def scalar(self, sql):
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql(sql).scalar()
+
+    def test_migrate(self):
+        from dpr_export.migrations import Migrator, migrations, is_partitioned, partitions
+        from dpr_export.persistence import Persistence
+
+        migrator = Migrator(self.engine)
+        self.assertEqual([0, 1, 2, 3], [m.version for m in migrator.migrate(target=3)])
+
+        # a table loaded before partitioning keeps its rows
+        rows = Persistence(self.engine).save(self.report(2023))
+        versions = [m.version for m in migrations()]
+        self.assertEqual(versions[4:], [m.version for m in migrator.migrate()])
+        self.assertEqual([], migrator.migrate())
+        self.assertEqual(versions, sorted(migrator.applied()))
+
+        with self.engine.connect() as conn:
+            self.assertTrue(is_partitioned(conn, 'district_perf'))
+            self.assertEqual({2023: 'district_perf_y2023'}, partitions(conn, 'district_perf'))
+        self.assertEqual(rows, self.scalar('SELECT count(*) FROM district_perf_y2023'))
+
+        # indexes of the parent are created on its partitions
+        indexes = self.scalar("SELECT string_agg(indexdef, ';') FROM pg_indexes WHERE tablename = 'district_perf_y2023'")
+        self.assertIn('(district, division, area, report_year, report_month) INCLUDE', indexes)
+        self.assertIn('USING brin (updated_at)', indexes)
+
+    def test_save_partitioned(self):
+        from dpr_export.migrations import Migrator
+        from dpr_export.persistence import Persistence
+
+        Migrator(self.engine).migrate()
+
+        for loader in ('upsert', 'copy'):
+            persistence = Persistence(self.engine, loader=loader)
+            self.assertEqual(['district_perf_y2022'], persistence.attach_partitions([2022]))
+
+            with persistence.connect():
+                rows = persistence.save(self.report(2024))
+                persistence.save(self.report(2024))
+                persistence.save_chunks((self.report(2025), ), report=dict(district=88, year=2025, month=6))
+
+            self.assertEqual(0, self.scalar('SELECT count(*) FROM ONLY district_perf'))
+            self.assertEqual(rows, self.scalar('SELECT count(*) FROM district_perf_y2024'))
+            self.assertEqual(rows, self.scalar('SELECT count(*) FROM district_perf_y2025'))
+
+    def test_save_not_partitioned(self):
+        from dpr_export.migrations import Migrator
+        from dpr_export.persistence import Persistence
+
+        Migrator(self.engine).migrate(target=3)
+        persistence = Persistence(self.engine)
+
+        self.assertEqual([], persistence.attach_partitions([2024]))
+        self.assertEqual(persistence.save(self.report(2024)), self.scalar('SELECT count(*) FROM district_perf'))
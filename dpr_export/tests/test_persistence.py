@@ -1,9 +1,208 @@
 # -*- coding:utf-8 -*-
 import typing as ty
+import os
+import datetime
 import unittest
 
+import pandas as pd
+
+
+REPORT = '''District,Division,Area,Club,Club Name,New,Late Ren.,Oct. Ren.,Apr. Ren.,Total Ren.,Total Chart,Total to Date,Distinguished Status,Charter Date/Suspend Date
+88,D,04,7919786,Alpha Toastmasters Club,3,0,10,8,18,0,21,P,Charter 03/23/23
+88,D,04,1234567,Beta Toastmasters Club,0,1,5,0,6,0,6,,Charter 12/01/21 Susp 03/31/23
+88,A,01,2345678,Gamma Toastmasters Club,1,0,0,0,0,0,1,,Susp 03/31/23
+88,A,02,3456789,Delta Toastmasters Club,2,0,4,4,8,0,10,S,
+Month of Jun, As of 07/01/2023
+'''
+
+
+DATABASE_URL = os.environ.get('DPR_TEST_DATABASE_URL')
+
 
 class TestPersistence(unittest.TestCase):
     
     def test_clean_df(self):
-        ...
\ No newline at end of file
+        from dpr_export.persistence import clean
+
+        df = clean(REPORT)
+
+        self.assertEqual(4, len(df))
+        self.assertIn('club_name', df.columns)
+        self.assertEqual(datetime.date(2023, 3, 23), df['charter_date'].iloc[0].date())
+        self.assertEqual(datetime.date(2023, 3, 31), df['suspend_date'].iloc[1].date())
+        self.assertTrue(pd.isna(df['charter_date'].iloc[2]))
+        self.assertTrue(pd.isna(df['suspend_date'].iloc[3]))
+
+    def test_clean_dtypes(self):
+        from dpr_export.persistence import clean, unique_key
+
+        df = unique_key(clean(REPORT), year=2023, month=6)
+
+        self.assertEqual('category', str(df['district'].dtype))
+        self.assertEqual('category', str(df['distinguished_status'].dtype))
+        self.assertEqual('Int32', str(df['new_members'].dtype))
+        self.assertEqual('Int32', str(df['report_year'].dtype))
+        self.assertEqual('datetime64[ns]', str(df['charter_date'].dtype))
+        self.assertEqual(['4', '4', '1', '2'], df['area'].astype(str).tolist())
+        self.assertEqual([2023] * 4, df['report_year'].tolist())
+        self.assertEqual([6] * 4, df['report_month'].tolist())
+
+    def test_parse_report_raw(self):
+        from dpr_export.persistence import clean, parse_report
+
+        unit = dict(district=88, year=2023, month=6)
+        report = parse_report(dict(unit=unit, data=REPORT.encode('utf-16'), encoding='utf-16'))
+
+        self.assertEqual(clean(REPORT)['club_name'].tolist(), report['frame']['club_name'].tolist())
+        self.assertEqual(['parse', 'transform'], [stage for stage, _, _ in report['timings']])
+        self.assertNotIn('data', report)
+
+    def test_typed(self):
+        from dpr_export.persistence import typed
+
+        df = typed(pd.DataFrame({'club': [1.0, None], 'division': ['A', 'B'], 'other': [0.5, 1.5]}))
+
+        self.assertEqual('Int32', str(df['club'].dtype))
+        self.assertEqual('category', str(df['division'].dtype))
+        self.assertEqual('float64', str(df['other'].dtype))
+
+    def test_clean_chunks(self):
+        import io
+        from dpr_export.persistence import clean, clean_chunks
+
+        expected = clean(REPORT)
+
+        for chunksize in (1, 2, 3, 4, 5, 10):
+            chunks = list(clean_chunks(io.StringIO(REPORT), chunksize=chunksize))
+            df = pd.concat(chunks)
+
+            self.assertTrue(all(len(chunk) for chunk in chunks))
+            self.assertEqual(expected['club'].astype(int).tolist(), df['club'].astype(int).tolist())
+            self.assertEqual(expected['suspend_date'].isna().tolist(), df['suspend_date'].isna().tolist())
+
+    def test_charter_suspend_dates_matches_scalar(self):
+        from dpr_export.persistence import charter_or_suspend_date, charter_suspend_dates
+
+        values = ['Charter 03/23/23', 'Charter 12/01/21 Susp 03/31/23', 'Susp 03/31/23', None]
+        result = charter_suspend_dates(pd.Series(values, dtype='string'))
+
+        for i, value in enumerate(values):
+            expected = charter_or_suspend_date(value)
+            for j, field in enumerate(('charter_date', 'suspend_date')):
+                actual = result[field].iloc[i]
+                actual = None if pd.isna(actual) else actual.date()
+                self.assertEqual(expected[j], actual)
+
+    def test_integral_columns(self):
+        from dpr_export.persistence import integral_columns
+
+        df = pd.DataFrame({'new_members': [1.0, None, 3.0], 'ratio': [0.5, 1.0, None]})
+        result = integral_columns(df)
+
+        self.assertEqual('Int64', str(result['new_members'].dtype))
+        self.assertEqual('float64', str(result['ratio'].dtype))
+        self.assertEqual([1, None, 3], [None if pd.isna(v) else v for v in result['new_members']])
+
+    def test_save_unknown_loader(self):
+        from dpr_export.persistence import save
+
+        with self.assertRaises(ValueError):
+            save(pd.DataFrame(), None, loader='unknown')
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestPersistenceDatabase(unittest.TestCase):
+
+    def setUp(self):
+        from dpr_export.db import create_engine
+
+        self.engine = create_engine(DATABASE_URL)
+        with self.engine.begin() as conn:
+            for table, script in (('district_perf', '000-create_table.sql'),
+                                  ('report_digest', '001-create_report_digest.sql')):
+                with open(os.path.join(os.path.dirname(__file__), '..', '..', 'etc', script)) as f:
+                    conn.exec_driver_sql('DROP TABLE IF EXISTS %s CASCADE' % table)
+                    conn.exec_driver_sql(f.read())
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def report(self):
+        from dpr_export.persistence import clean, unique_key
+        return unique_key(clean(REPORT), year=2023, month=6)
+
+    def test_loaders(self):
+        import sqlalchemy as sa
+        from dpr_export.persistence import Persistence
+
+        for loader in ('upsert', 'copy'):
+            persistence = Persistence(self.engine, loader=loader)
+            statements = list()
+            with persistence.connect() as connection:
+                sa.event.listen(connection, 'before_cursor_execute',
+                                lambda conn, cursor, statement, *args: statements.append(statement))
+                persistence.save(self.report())
+                persistence.save(self.report())
+
+            # the static schema spares every catalog query
+            self.assertEqual([], [s for s in statements if 'pg_catalog' in s or 'information_schema' in s])
+            self.assertEqual(len(statements), persistence.stats['statements'])
+            self.assertEqual(2, persistence.stats['saves'])
+            self.assertEqual(2, persistence.stats['connections_reused'])
+
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql('SELECT club, suspend_date FROM district_perf ORDER BY club').fetchall()
+
+            self.assertEqual(4, len(rows))
+            self.assertEqual(datetime.date(2023, 3, 31), rows[0][1])
+
+    def test_chunks(self):
+        from dpr_export.persistence import Persistence
+
+        unit = dict(district=88, year=2023, month=6)
+        for loader in ('upsert', 'copy'):
+            persistence = Persistence(self.engine, loader=loader)
+            new_members = 5 if loader == 'upsert' else 7
+            df = self.report()
+            df['new_members'] = new_members
+
+            # the copy loader stages every chunk in the same transaction
+            self.assertEqual(4, persistence.save_chunks((df[:1], df[1:3], df[3:]), report=unit))
+
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql('SELECT new_members FROM district_perf').scalars().all()
+            self.assertEqual([new_members] * 4, rows)
+
+    def test_incremental(self):
+        from dpr_export.persistence import Persistence, report_digest
+
+        unit = dict(district=88, year=2023, month=6)
+        digest = report_digest(REPORT)
+
+        for loader in ('upsert', 'copy'):
+            persistence = Persistence(self.engine, loader=loader, incremental=True)
+            with persistence.connect():
+                if not persistence.is_unchanged(digest=digest, **unit):
+                    persistence.save(self.report(), report=unit, digest=digest)
+
+                df = self.report()
+                df.loc[0, 'new_members'] = 42
+                persistence.save(df, report=unit, digest='changed')
+
+                self.assertFalse(persistence.is_unchanged(digest=digest, **unit))
+                self.assertTrue(persistence.is_unchanged(digest='changed', **unit))
+
+            self.assertEqual(1, persistence.stats['reports_skipped'])
+            # upsert starts from an empty table, copy from the rows upsert left behind
+            self.assertEqual(5 if loader == 'upsert' else 2, persistence.stats['rows_written'])
+
+    def test_loaded(self):
+        from dpr_export.persistence import Persistence
+
+        persistence = Persistence(self.engine)
+        persistence.save(self.report())
+
+        self.assertEqual({('88', 2023, 6)}, persistence.loaded())
+        self.assertEqual({('88', 2023, 6)}, persistence.loaded([(2023, 6), (2022, 6)]))
+        self.assertEqual(set(), persistence.loaded([(2023, 5)]))
+        self.assertEqual(set(), persistence.loaded([]))
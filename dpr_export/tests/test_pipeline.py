@@ -0,0 +1,129 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import time
+import threading
+import unittest
+
+from .test_persistence import DATABASE_URL
+from .test_requester import StubServerTestCase
+
+
+def square(x):
+    return x * x
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_run(self):
+        from dpr_export.pipeline import Pipeline, Stage
+
+        results = list()
+        lock = threading.Lock()
+
+        def collect(x):
+            with lock:
+                results.append(x)
+
+        pipeline = Pipeline([
+            Stage('double', lambda x: x * 2, workers=4),
+            Stage('odd', lambda x: x if x % 4 else None, workers=2),
+            Stage('square', square, workers=2, kind='process'),
+            Stage('collect', collect),
+        ], queue_size=2)
+        stats = pipeline.run(range(20))
+
+        self.assertEqual(sorted((x * 2) ** 2 for x in range(20) if (x * 2) % 4), sorted(results))
+        self.assertEqual(20, stats['double']['processed'])
+        self.assertEqual(10, stats['odd']['dropped'])
+        self.assertEqual(10, stats['collect']['processed'])
+        self.assertLessEqual(stats['collect']['queue_peak'], 2)
+
+    def test_back_pressure(self):
+        from dpr_export.pipeline import Pipeline, Stage
+
+        produced = list()
+
+        def items():
+            for i in range(50):
+                produced.append(i)
+                yield i
+
+        def slow(x):
+            time.sleep(0.01)
+            # the feeder cannot run further ahead than the queues between the stages hold
+            self.assertLessEqual(len(produced) - x, 2 * 3 + 3)
+
+        Pipeline([Stage('fast', lambda x: x), Stage('slow', slow)], queue_size=3).run(items())
+
+    def test_error(self):
+        from dpr_export.pipeline import Pipeline, Stage
+
+        def fail(x):
+            if x == 5:
+                raise RuntimeError('boom')
+            return x
+
+        with self.assertRaises(RuntimeError):
+            Pipeline([Stage('fail', fail, workers=2), Stage('sink', lambda x: None)]).run(range(1000))
+
+    def test_on_error(self):
+        from dpr_export.pipeline import Pipeline, Stage
+
+        failed = list()
+        results = list()
+
+        def fail(x):
+            if x % 10 == 5:
+                raise RuntimeError('boom')
+            return x
+
+        pipeline = Pipeline([Stage('fail', fail, workers=2, on_error=lambda item, e: failed.append(item)),
+                             Stage('sink', results.append)])
+        stats = pipeline.run(range(100))
+
+        self.assertEqual(list(range(5, 100, 10)), sorted(failed))
+        self.assertEqual(90, len(results))
+        self.assertEqual(10, stats['fail']['dropped'])
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestAppRun(StubServerTestCase):
+
+    def setUp(self):
+        import tempfile
+        import yaml
+
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.directory.name, 'config.yaml')
+
+        config = dict(database_url=DATABASE_URL,
+                      pipeline=dict(parse=dict(workers=2, kind='process')),
+                      fetch=[dict(district=d, periods=[dict(year=2023, month=6), dict(year=2022, month=6)])
+                             for d in (88, 85)])
+        with open(self.config, 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def test_run(self):
+        from dpr_export.app import App
+
+        app = App().configure(self.config).setup()
+        app.requester.BASE_URL = self.requester().BASE_URL
+
+        with app.engine.begin() as conn:
+            with open(os.path.join(os.path.dirname(__file__), '..', '..', 'etc', '000-create_table.sql')) as f:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS district_perf CASCADE')
+                conn.exec_driver_sql(f.read())
+
+        app.run()
+
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(4, app.persistence.stats['saves'])
+        with app.engine.connect() as conn:
+            self.assertEqual(8, conn.exec_driver_sql('SELECT count(*) FROM district_perf').scalar())
@@ -0,0 +1,64 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import datetime
+import unittest
+
+
+class TestPlanner(unittest.TestCase):
+
+    def planner(self, **kwargs):
+        from dpr_export.planner import Planner
+        from dpr_export.requester import Requester
+
+        kwargs.setdefault('today', datetime.date(2024, 3, 15))
+        return Planner(Requester(), **kwargs)
+
+    def test_months(self):
+        periods = self.planner().periods('2022-11', '2023-02')
+        self.assertEqual([(2022, 11), (2022, 12), (2023, 1), (2023, 2)], periods)
+
+    def test_future_periods_dropped(self):
+        periods = self.planner().periods('2024-01', '2024-12')
+        self.assertEqual([(2024, 1), (2024, 2), (2024, 3)], periods)
+
+    def test_program_year_end(self):
+        periods = self.planner().periods('2021-07', None, granularity='program-year-end')
+        self.assertEqual([(2022, 6), (2023, 6), (2024, 3)], periods)
+
+        periods = self.planner().periods('2022-01', '2022-12', granularity='program-year-end')
+        self.assertEqual([(2022, 6), (2022, 12)], periods)
+
+    def test_unknown_granularity(self):
+        with self.assertRaises(ValueError):
+            self.planner().periods('2022-01', granularity='week')
+
+    def test_districts(self):
+        planner = self.planner(districts=[1, 10, 11, 85, 88, 'U'])
+
+        self.assertEqual(['1', '10', '11', '88'], planner.expand_districts(['1*', 88, '1']))
+        self.assertEqual(['U', '85'], planner.expand_districts(['U', '8[0-5]']))
+
+    def test_plan(self):
+        fetch = [
+            dict(districts=[88, 85], **{'from': '2022-07', 'granularity': 'program-year-end'}),
+            dict(district=88, periods=[dict(year=2023, month=6), dict(year=2019, month=6)]),
+        ]
+        units = self.planner().plan(fetch)
+
+        self.assertEqual([dict(district=88, year=2023, month=6),
+                          dict(district=88, year=2024, month=3),
+                          dict(district=85, year=2023, month=6),
+                          dict(district=85, year=2024, month=3),
+                          dict(district=88, year=2019, month=6)], units)
+
+    def test_missing(self):
+        planner = self.planner()
+        units = [dict(district=88, year=2019, month=6), dict(district=88, year=2020, month=6),
+                 dict(district=88, year=datetime.date.today().year + 1, month=6)]
+        loaded = {('88', 2019, 6), ('88', datetime.date.today().year + 1, 6)}
+
+        todo, skipped = planner.missing(units, loaded)
+
+        self.assertEqual([units[0]], skipped)
+        self.assertEqual(units[1:], todo)
@@ -0,0 +1,147 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .test_persistence import REPORT
+
+
+class StubHandler(BaseHTTPRequestHandler):
+
+    # list of (status, headers, body) served in order, the last one is repeated
+    responses = [(200, {'Content-Type': 'text/csv; charset=utf-8'}, REPORT.encode('utf-8'))]
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(dict(path=self.path, headers=dict(self.headers)))
+            index = min(len(server.requests), len(self.responses)) - 1
+
+        status, headers, body = self.responses[index]
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServerTestCase(unittest.TestCase):
+
+    handler = StubHandler
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+        self.server.lock = threading.Lock()
+        self.server.requests = list()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        host, port = self.server.server_address
+        self.base_url = 'http://%s:%s' % (host, port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def requester(self, **kwargs):
+        from dpr_export.requester import Requester
+
+        requester = Requester(**kwargs)
+        requester.BASE_URL = self.base_url + '/%(tm_year)s/export.aspx' \
+            '?type=CSV&report=districtperformance~%(district)s~%(to_date)s~~2000-%(current_year)s'
+        return requester
+
+
+class TestRequester(StubServerTestCase):
+
+    def test_build_url(self):
+        from dpr_export.requester import Requester
+
+        url = Requester().build_url(district=88, year=2023, month=6)
+        self.assertIn('/2022-2023/export.aspx', url)
+        self.assertIn('districtperformance~88~06/30/23~~', url)
+
+    def test_fetch(self):
+        data = self.requester().fetch(district=88, year=2023, month=6)
+        self.assertEqual(REPORT, data)
+
+    def test_fetch_raw(self):
+        data, encoding = self.requester().fetch_raw(district=88, year=2023, month=6)
+        self.assertEqual(REPORT, data.decode(encoding))
+
+    def test_stream(self):
+        with self.requester().stream(district=88, year=2023, month=6, chunk_size=7) as stream:
+            self.assertEqual(REPORT, stream.read())
+
+    def test_rate_limit(self):
+        import time
+
+        requester = self.requester(rate_limits={'127.0.0.1': 100})
+        bucket = requester.limiter.bucket('127.0.0.1')
+        bucket.tokens = 0
+
+        begin = time.monotonic()
+        requester.limiter.acquire('127.0.0.1')
+        self.assertGreaterEqual(time.monotonic() - begin, 0.005)
+        self.assertIsNone(requester.limiter.bucket('example.org'))
+
+
+class FlakyHandler(StubHandler):
+
+    responses = [
+        (503, {'Retry-After': '0'}, b'busy'),
+        (429, {'Retry-After': '0'}, b'slow down'),
+        (200, {'Content-Type': 'text/csv; charset=utf-8'}, REPORT.encode('utf-8')),
+    ]
+
+
+class TestRequesterRetry(StubServerTestCase):
+
+    handler = FlakyHandler
+
+    def test_retry(self):
+        requester = self.requester(backoff_factor=0, backoff_jitter=0)
+
+        self.assertEqual(REPORT, requester.fetch(district=88, year=2023, month=6))
+        self.assertEqual(3, len(self.server.requests))
+
+    def test_give_up(self):
+        import requests
+
+        requester = self.requester(retries=1, backoff_factor=0, backoff_jitter=0)
+
+        with self.assertRaises(requests.HTTPError) as ctx:
+            requester.fetch(district=88, year=2023, month=6)
+
+        self.assertEqual(429, ctx.exception.response.status_code)
+        self.assertEqual(2, len(self.server.requests))
+
+
+class SlowHandler(StubHandler):
+
+    def do_GET(self):
+        import time
+        time.sleep(0.5)
+        try:
+            super().do_GET()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class TestRequesterTimeout(StubServerTestCase):
+
+    handler = SlowHandler
+
+    def test_timeout(self):
+        import requests
+
+        requester = self.requester(timeout=(1, 0.1), retries=0)
+
+        with self.assertRaises(requests.ConnectionError):
+            requester.fetch(district=88, year=2023, month=6)
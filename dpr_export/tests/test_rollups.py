@@ -0,0 +1,132 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import unittest
+
+from .test_persistence import DATABASE_URL, REPORT
+
+
+def report(year=2023, month=6, district=None, clubs=0, moves=None):
+    """
+    The test report, in another ``district`` with club numbers shifted by ``clubs``, or
+    with clubs moved to other areas (``moves``: club name -> area).
+    """
+    from dpr_export.persistence import clean, unique_key
+
+    df = clean(REPORT)
+    if district is not None:
+        df['district'] = str(district)
+    df['club'] = df['club'] + clubs
+    for name, area in (moves or dict()).items():
+        df.loc[df['club_name'] == name, 'area'] = area
+    return unique_key(df, year=year, month=month)
+
+
+class TestRollupKeys(unittest.TestCase):
+
+    def test_frame_keys(self):
+        from dpr_export.rollups import frame_keys
+
+        self.assertEqual({(2023, 6, '88', 'D', '4'), (2023, 6, '88', 'A', '1'), (2023, 6, '88', 'A', '2')},
+                         frame_keys(report()))
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestRollups(unittest.TestCase):
+
+    SCHEMA = 'dpr_test_rollups'
+
+    def setUp(self):
+        import sqlalchemy as sa
+        from dpr_export.migrations import Migrator
+        from dpr_export.persistence import Persistence
+
+        self.engine = sa.create_engine(DATABASE_URL, connect_args=dict(options='-csearch_path=%s' % self.SCHEMA))
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP SCHEMA IF EXISTS %s CASCADE' % self.SCHEMA)
+            conn.exec_driver_sql('CREATE SCHEMA %s' % self.SCHEMA)
+        Migrator(self.engine).migrate()
+        self.persistence = Persistence(self.engine, rollups=True)
+
+    def tearDown(self):
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql('DROP SCHEMA IF EXISTS %s CASCADE' % self.SCHEMA)
+        self.engine.dispose()
+
+    def rows(self, table, *columns):
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql('SELECT %s FROM %s ORDER BY %s' % (
+                ', '.join(columns), table, ', '.join(columns))).all()
+
+    def grouped(self, *keys):
+        """
+        Rollups computed the slow way, straight from the club rows.
+        """
+        with self.engine.connect() as conn:
+            return conn.exec_driver_sql(
+                "SELECT %(keys)s, count(*), sum(new_members), sum(total_renewals), sum(total_to_date), "
+                "count(*) FILTER (WHERE distinguished_status = 'D'), "
+                "count(*) FILTER (WHERE distinguished_status = 'S'), "
+                "count(*) FILTER (WHERE distinguished_status = 'P') "
+                "FROM district_perf GROUP BY %(keys)s ORDER BY %(keys)s" % dict(keys=', '.join(keys))).all()
+
+    def assertConsistent(self):
+        from dpr_export.rollups import LEVELS, PERIOD
+        from dpr_export.schema import ROLLUP_MEASURES
+
+        for level, table, columns in LEVELS:
+            keys = PERIOD + columns
+            self.assertEqual(self.grouped(*keys), self.rows(table.name, *keys + ROLLUP_MEASURES), level)
+
+    def test_save(self):
+        self.persistence.save(report())
+
+        self.assertEqual([('A', '1', 1, 1, 0), ('A', '2', 1, 2, 8), ('D', '4', 2, 3, 24)],
+                         self.rows('district_perf_area', 'division', 'area', 'clubs', 'new_members',
+                                   'total_renewals'))
+        self.assertEqual([('88', 4, 6, 38, 0, 1, 1)],
+                         self.rows('district_perf_district', 'district', 'clubs', 'new_members', 'total_to_date',
+                                   'distinguished', 'select_distinguished', 'presidents_distinguished'))
+        self.assertConsistent()
+        self.assertEqual(3 + 2 + 1, self.persistence.stats['rollup_rows'])
+
+    def test_moved_club(self):
+        self.persistence.save(report())
+        self.persistence.save(report(moves={'Gamma Toastmasters Club': '2'}))
+
+        # area 1 lost its only club
+        self.assertEqual([('A', '2', 2), ('D', '4', 2)], self.rows('district_perf_area', 'division', 'area', 'clubs'))
+        self.assertConsistent()
+
+    def test_untouched(self):
+        self.persistence.save(report())
+        self.persistence.save(report(year=2022))
+        before = self.rows('district_perf_area', 'report_year', 'district', 'area', 'updated_at')
+
+        self.persistence.save(report(district=85, clubs=1))
+        self.persistence.save(report(district=85, clubs=1))
+
+        after = self.rows('district_perf_area', 'report_year', 'district', 'area', 'updated_at')
+        self.assertEqual(before, [row for row in after if row[1] == '88'])
+        self.assertEqual(3, len([row for row in after if row[1] == '85']))
+        self.assertConsistent()
+
+    def test_chunks(self):
+        df = report()
+        self.persistence.save_chunks((df[:2], df[2:]), report=dict(district=88, year=2023, month=6))
+        self.assertConsistent()
+
+    def test_rebuild(self):
+        from dpr_export.persistence import Persistence
+        from dpr_export.rollups import rebuild
+
+        persistence = Persistence(self.engine)
+        persistence.save(report())
+        persistence.save(report(year=2022, district=85))
+        self.assertEqual([], self.rows('district_perf_district', 'district'))
+
+        self.assertEqual(dict(area=6, division=4, district=2), rebuild(self.engine))
+        self.assertConsistent()
+
+        self.assertEqual(dict(area=3, division=2, district=1), rebuild(self.engine, years=[2022]))
+        self.assertConsistent()
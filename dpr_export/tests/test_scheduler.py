@@ -0,0 +1,41 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import threading
+import time
+import unittest
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_from_config(self):
+        from dpr_export.scheduler import Scheduler
+
+        self.assertEqual(Scheduler.DEFAULT_WORKERS, Scheduler.from_config(None).workers)
+        self.assertEqual(8, Scheduler.from_config(dict(workers=8)).workers)
+
+    def test_host_limit(self):
+        from dpr_export.scheduler import Scheduler
+
+        scheduler = Scheduler(workers=8, hosts={'example.org': 2})
+        lock = threading.Lock()
+        state = dict(active=0, peak=0)
+
+        def fetch():
+            with scheduler.slot('example.org'):
+                with lock:
+                    state['active'] += 1
+                    state['peak'] = max(state['peak'], state['active'])
+                time.sleep(0.05)
+                with lock:
+                    state['active'] -= 1
+
+        threads = [threading.Thread(target=fetch) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, state['peak'])
+        self.assertIs(scheduler.slot('example.org'), scheduler.slot('example.org'))
+        self.assertIsNot(scheduler.slot('example.org'), scheduler.slot('other.org'))
@@ -0,0 +1,168 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from .test_persistence import DATABASE_URL
+
+
+def clubs(points: int = 2000, seed: int = 1):
+    rnd = np.random.default_rng(seed)
+    # a dense metro area, a country and a few clubs far away
+    lat = np.concatenate((39.7 + rnd.random(points // 2) * 0.3, 25 + rnd.random(points // 2 - 3) * 20,
+                          [-33.9, 64.1, 89.9]))
+    lon = np.concatenate((-86.3 + rnd.random(points // 2) * 0.3, -120 + rnd.random(points // 2 - 3) * 50,
+                          [151.2, -21.9, 0.0]))
+    return np.arange(1, points + 1) * 7, lat, lon
+
+
+class TestClubIndex(unittest.TestCase):
+
+    def setUp(self):
+        from dpr_export.spatial import ClubIndex
+
+        self.ids, self.lat, self.lon = clubs()
+        self.index = ClubIndex.build(self.ids, self.lat, self.lon, cell_km=2)
+        self.qlat = np.concatenate((self.lat[::97], [39.85, 0.0, -89.0]))
+        self.qlon = np.concatenate((self.lon[::97], [-86.15, 0.0, 10.0]))
+
+    def brute_force(self):
+        # acos is off by up to 0.1 m for nearby points, hence the tolerances below
+        from dpr_export.common.eviltransform import distance_matrix
+
+        return distance_matrix(self.qlat, self.qlon, self.lat, self.lon)
+
+    def test_radius(self):
+        expected = self.brute_force()
+        result = self.index.radius(self.qlat, self.qlon, km=5)
+
+        self.assertEqual(len(self.qlat), len(result))
+        for row, (ids, meters) in zip(expected, result):
+            self.assertEqual(set(self.ids[row <= 5000]), set(ids))
+            np.testing.assert_allclose(meters, np.sort(row[row <= 5000]), atol=0.5)
+            self.assertTrue(np.all(np.diff(meters) >= 0))
+
+    def test_knn(self):
+        expected = self.brute_force()
+        ids, meters = self.index.knn(self.qlat, self.qlon, k=5)
+
+        self.assertEqual((len(self.qlat), 5), ids.shape)
+        np.testing.assert_allclose(meters, np.sort(expected, axis=1)[:, :5], atol=0.5)
+        np.testing.assert_array_equal(ids[:, 0][:-3], self.ids[::97])
+
+    def test_knn_few_clubs(self):
+        from dpr_export.spatial import ClubIndex
+
+        index = ClubIndex.build([1, 2], [10.0, 10.1], [20.0, 20.0])
+        ids, meters = index.knn([10.0], [20.0], k=3)
+
+        self.assertEqual([1, 2, -1], ids[0].tolist())
+        self.assertEqual(0.0, meters[0, 0])
+        self.assertEqual(np.inf, meters[0, 2])
+
+        ids, meters = ClubIndex().knn([10.0], [20.0], k=2)
+        self.assertEqual([-1, -1], ids[0].tolist())
+
+    def test_frame(self):
+        from dpr_export.spatial import ClubIndex
+        from dpr_export.common.eviltransform import wgs2gcj
+
+        # Beijing clubs are indexed in GCJ-02
+        lat, lon = wgs2gcj(39.9, 116.4)
+        index = ClubIndex.build([1], [lat], [lon])
+
+        self.assertLess(index.knn(39.9, 116.4, k=1, frame='wgs84')[1][0, 0], 0.01)
+        self.assertGreater(index.knn(39.9, 116.4, k=1)[1][0, 0], 100)
+        self.assertRaises(ValueError, index.knn, 39.9, 116.4, 1, 'bd09')
+
+    def test_update_remove(self):
+        self.index.update([7, 1000000], [0.0, 0.001], [0.0, 0.0])
+        ids, meters = self.index.knn(0.0, 0.0, k=2)
+
+        self.assertEqual(len(self.ids) + 1, len(self.index))
+        self.assertEqual([7, 1000000], ids[0].tolist())
+
+        self.index.remove([7])
+        self.assertEqual([1000000], self.index.radius(0.0, 0.0, km=1)[0][0].tolist())
+        self.assertEqual(len(self.ids), len(self.index))
+
+    def test_save_load(self):
+        from dpr_export.spatial import ClubIndex
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'clubs.npz')
+            self.index.save(path)
+            index = ClubIndex.load(path)
+
+            self.assertEqual(['clubs.npz'], os.listdir(directory))
+
+        self.assertEqual(2.0, index.cell_km)
+        self.assertIsNone(index.synced_at)
+        np.testing.assert_array_equal(self.index.knn(self.qlat, self.qlon, 3)[0], index.knn(self.qlat, self.qlon, 3)[0])
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestClubIndexSync(unittest.TestCase):
+
+    CLUBS = (990000001, 990000002, 990000003)
+
+    def setUp(self):
+        import sqlalchemy as sa
+        from dpr_export import schema
+
+        self.engine = sa.create_engine(DATABASE_URL)
+        self.table = schema.club_detail
+        self.delete()
+
+    def tearDown(self):
+        self.delete()
+
+    def delete(self):
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete().where(self.table.c.club.in_(self.CLUBS)))
+
+    def upsert(self, rows):
+        import sqlalchemy as sa
+        from sqlalchemy.dialects.postgresql import insert
+
+        stmt = insert(self.table)
+        stmt = stmt.on_conflict_do_update(index_elements=[self.table.c.club],
+                                          set_=dict(lat=stmt.excluded.lat, lon=stmt.excluded.lon,
+                                                    lat_local=stmt.excluded.lat_local,
+                                                    lon_local=stmt.excluded.lon_local,
+                                                    fetched_at=sa.func.clock_timestamp()))
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+    def test_sync(self):
+        from dpr_export.spatial import ClubIndex
+
+        a, b, c = self.CLUBS
+        self.upsert([dict(club=a, lat=39.9, lon=116.4, lat_local=39.901, lon_local=116.406),
+                     dict(club=b, lat=-33.9, lon=151.2, lat_local=None, lon_local=None),
+                     dict(club=c, lat=None, lon=None, lat_local=None, lon_local=None)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            config = dict(path=os.path.join(directory, 'clubs.npz'))
+            index = ClubIndex.from_config(config, self.engine)
+            located = set(index.ids.tolist())
+
+            self.assertIn(a, located)
+            self.assertIn(b, located)
+            self.assertNotIn(c, located)
+            self.assertLess(index.knn(39.901, 116.406, 1)[1][0, 0], 0.01)
+
+            # only the clubs crawled since are read again
+            self.upsert([dict(club=b, lat=None, lon=None, lat_local=None, lon_local=None),
+                         dict(club=c, lat=-33.9, lon=151.2, lat_local=-33.9, lon_local=151.2)])
+            index = ClubIndex.load(config['path'])
+            self.assertEqual(2, index.sync(self.engine))
+
+            located = set(index.ids.tolist())
+            self.assertNotIn(b, located)
+            self.assertIn(c, located)
+            self.assertEqual(0, index.sync(self.engine))
@@ -0,0 +1,226 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import os
+import threading
+import unittest
+
+from .test_persistence import DATABASE_URL
+from .test_requester import StubServerTestCase
+
+
+ETC = os.path.join(os.path.dirname(__file__), '..', '..', 'etc')
+
+
+def create_tables(engine, *scripts):
+    with engine.begin() as conn:
+        for table, script in scripts:
+            with open(os.path.join(ETC, script)) as f:
+                conn.exec_driver_sql('DROP TABLE IF EXISTS %s CASCADE' % table)
+                conn.exec_driver_sql(f.read())
+
+
+def units(districts=range(1, 11), years=(2022, 2023)):
+    return [dict(district=d, year=y, month=6) for d in districts for y in years]
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        import sqlalchemy as sa
+        from dpr_export.workqueue import WorkQueue
+
+        self.engine = sa.create_engine(DATABASE_URL)
+        create_tables(self.engine, ('work_queue', '006-create_work_queue.sql'))
+        self.queue = WorkQueue(self.engine, max_attempts=2)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def expire(self, worker):
+        import sqlalchemy as sa
+
+        table = self.queue.table
+        with self.engine.begin() as conn:
+            conn.execute(sa.update(table).where(table.c.worker == worker).values(
+                lease_until=sa.func.now() - sa.text("interval '1 second'")))
+
+    def test_claim(self):
+        self.assertEqual(20, self.queue.enqueue(units()))
+        self.assertEqual(20, self.queue.enqueue(units()))
+
+        claimed = self.queue.claim('a', limit=3)
+        self.assertEqual(units()[:3], claimed)
+
+        for unit in claimed:
+            self.assertTrue(self.queue.done(unit, 'a', rows=4))
+        self.assertFalse(self.queue.drained())
+        self.assertEqual(dict(units=3, attempts=3, rows=12), self.queue.summary()['done'])
+
+        # running units are left alone, finished ones queued again
+        running = self.queue.claim('a')
+        self.assertEqual(19, self.queue.enqueue(units()))
+        self.assertEqual(1, self.queue.summary()['running']['units'])
+
+        self.queue.done(running[0], 'a')
+        while self.queue.claim('a', limit=5):
+            pass
+        self.assertEqual(19, self.queue.summary()['running']['units'])
+
+    def test_concurrent_claims(self):
+        self.queue.enqueue(units(districts=range(1, 51)))
+        claimed = list()
+        lock = threading.Lock()
+
+        def work(worker):
+            while True:
+                got = self.queue.claim(worker, limit=2)
+                if not got:
+                    return
+                with lock:
+                    claimed.extend((u['district'], u['year']) for u in got)
+
+        threads = [threading.Thread(target=work, args=('w%d' % i, )) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(100, len(claimed))
+        self.assertEqual(100, len(set(claimed)))
+
+    def test_lease(self):
+        self.queue.enqueue(units(districts=[88], years=[2023]))
+        self.assertEqual(1, len(self.queue.claim('dead')))
+        self.assertEqual([], self.queue.claim('alive'))
+
+        # a worker that died lets its lease expire, another one takes over
+        self.expire('dead')
+        self.assertEqual(1, len(self.queue.claim('alive')))
+        self.assertEqual(0, self.queue.heartbeat('dead'))
+        self.assertEqual(1, self.queue.heartbeat('alive'))
+
+        # until the unit used up its attempts
+        self.expire('alive')
+        self.assertEqual([], self.queue.claim('other'))
+        self.assertEqual(1, self.queue.summary()['failed']['units'])
+        self.assertTrue(self.queue.drained())
+
+    def test_stale_worker(self):
+        unit = units(districts=[88], years=[2023])[0]
+        self.queue.enqueue([unit])
+        self.queue.claim('stale')
+        self.expire('stale')
+        self.queue.claim('current')
+
+        # the worker that lost its lease finishing or failing late changes nothing
+        self.assertFalse(self.queue.failed(unit, 'stale', 'boom'))
+        self.assertFalse(self.queue.done(unit, 'stale', rows=4))
+        self.assertEqual([], self.queue.claim('other'))
+        self.assertEqual(dict(units=1, attempts=2, rows=0), self.queue.summary()['running'])
+
+        self.assertTrue(self.queue.done(unit, 'current', rows=4))
+        self.assertFalse(self.queue.failed(unit, 'current', 'boom'))
+        self.assertEqual(dict(units=1, attempts=2, rows=4), self.queue.summary()['done'])
+
+    def test_heartbeats(self):
+        self.queue.enqueue(units(districts=[88], years=[2023]))
+        self.queue.claim('a')
+        self.expire('a')
+
+        with self.queue.heartbeats('a', interval=0.05):
+            threading.Event().wait(0.3)
+        self.assertEqual([], self.queue.claim('b'))
+
+    def test_failed(self):
+        unit = units(districts=[88], years=[2023])[0]
+        self.queue.enqueue([unit])
+
+        self.queue.failed(self.queue.claim('a')[0], 'a', RuntimeError('boom'))
+        self.assertEqual(1, self.queue.summary()['pending']['units'])
+
+        self.queue.failed(self.queue.claim('a')[0], 'a', 'boom')
+        self.assertEqual(dict(units=1, attempts=2, rows=0), self.queue.summary()['failed'])
+        self.assertEqual([], self.queue.claim('a'))
+
+
+@unittest.skipUnless(DATABASE_URL, 'DPR_TEST_DATABASE_URL is not set')
+class TestAppWorkers(StubServerTestCase):
+
+    def setUp(self):
+        import tempfile
+        import yaml
+
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = os.path.join(self.directory.name, 'config.yaml')
+
+        config = dict(database_url=DATABASE_URL,
+                      queue=dict(poll_seconds=0.1, prefetch=2),
+                      fetch=[dict(districts=[88, 85], periods=[dict(year=2023, month=6), dict(year=2022, month=6)])])
+        with open(self.config, 'w') as f:
+            yaml.safe_dump(config, f)
+
+    def tearDown(self):
+        super().tearDown()
+        self.directory.cleanup()
+
+    def app(self):
+        from dpr_export.app import App
+
+        app = App().configure(self.config).setup()
+        app.requester.BASE_URL = self.requester().BASE_URL
+        return app
+
+    def test_workers(self):
+        coordinator = self.app()
+        create_tables(coordinator.engine, ('district_perf', '000-create_table.sql'),
+                      ('work_queue', '006-create_work_queue.sql'))
+
+        self.assertEqual(4, coordinator.enqueue())
+        # a worker crashed holding a report, the others pick it up once its lease expired
+        coordinator.queue.claim('crashed')
+        with coordinator.engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE work_queue SET lease_until = now() - interval '1 second'")
+
+        workers = [self.app() for _ in range(2)]
+        threads = [threading.Thread(target=app.work, kwargs=dict(worker='w%d' % i)) for i, app in enumerate(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(4, len(self.server.requests))
+        self.assertEqual(dict(units=4, attempts=5, rows=16), coordinator.queue.summary()['done'])
+        with coordinator.engine.connect() as conn:
+            self.assertEqual(8, conn.exec_driver_sql('SELECT count(*) FROM district_perf').scalar())
+            self.assertEqual(0, conn.exec_driver_sql("SELECT count(*) FROM work_queue WHERE worker = 'crashed'").scalar())
+
+    def test_abort(self):
+        app = self.app()
+        app.config['queue']['prefetch'] = 1
+        create_tables(app.engine, ('district_perf', '000-create_table.sql'),
+                      ('work_queue', '006-create_work_queue.sql'))
+        app.enqueue()
+
+        def lost(*args, **kwargs):
+            raise ConnectionError('database is gone')
+
+        # a failure the worker cannot even record stops the pipeline with its only slot taken
+        app.requester.fetch_raw = lost
+        app.queue.failed = lost
+        errors = list()
+
+        def work():
+            try:
+                app.work(worker='w')
+            except ConnectionError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=work, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(1, len(errors))
@@ -0,0 +1,209 @@
+# -*- coding:utf-8 -*-
+from __future__ import annotations
+
+import typing as ty
+import os
+import socket
+import logging
+import threading
+import contextlib
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert
+
+from . import schema
+
+
+logger = logging.getLogger(__name__)
+
+Unit = ty.Dict[str, ty.Any]
+
+
+def worker_name() -> str:
+    return '%s-%d' % (socket.gethostname(), os.getpid())
+
+
+class WorkQueue(object):
+    """
+    Reports to export shared by any number of workers, in the ``work_queue`` table of the
+    exporter's PostgreSQL database (``etc/006-create_work_queue.sql``).
+
+    A coordinator ``enqueue``s units, workers ``claim`` them with ``FOR UPDATE SKIP LOCKED``
+    so that no two get the same unit and none waits for another. A claimed unit is leased
+    for ``lease_seconds`` and the lease renewed by ``heartbeats`` while the worker lives;
+    the unit of a worker that died is claimed again once its lease expired. A failed unit
+    is queued again until it failed ``max_attempts`` times.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    DEFAULT_LEASE_SECONDS = 60
+    DEFAULT_MAX_ATTEMPTS = 3
+
+    def __init__(self, engine: sa.engine.Engine, lease_seconds: int | None = None,
+                 max_attempts: int | None = None) -> None:
+        self.engine = engine
+        self.table = schema.work_queue
+        self.lease_seconds = lease_seconds or self.DEFAULT_LEASE_SECONDS
+        self.max_attempts = max_attempts or self.DEFAULT_MAX_ATTEMPTS
+
+    @classmethod
+    def from_config(cls, config: ty.Optional[ty.Dict[str, ty.Any]], engine: sa.engine.Engine) -> "WorkQueue":
+        config = config or dict()
+        return cls(engine, lease_seconds=config.get('lease_seconds'), max_attempts=config.get('max_attempts'))
+
+    @property
+    def lease(self) -> sa.ColumnElement:
+        return sa.func.now() + sa.func.make_interval(0, 0, 0, 0, 0, 0, self.lease_seconds)
+
+    def _key(self, unit: Unit) -> sa.ColumnElement[bool]:
+        table = self.table
+        return sa.and_(table.c.district == str(unit['district']),
+                       table.c.report_year == unit['year'],
+                       table.c.report_month == unit['month'])
+
+    def enqueue(self, units: ty.Iterable[Unit]) -> int:
+        """
+        Queue ``units``, finished ones are queued again, running ones are left alone.
+        Returns the number of units queued.
+        """
+        rows = [dict(district=str(u['district']), report_year=u['year'], report_month=u['month'])
+                for u in units]
+        if not rows:
+            return 0
+
+        table = self.table
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            constraint='work_queue_unit',
+            set_=dict(status=self.PENDING, attempts=0, worker=None, lease_until=None, error=None,
+                      enqueued_at=sa.func.now(), updated_at=sa.func.now()),
+            where=table.c.status != self.RUNNING)
+
+        with self.engine.begin() as conn:
+            return conn.execute(stmt, rows).rowcount
+
+    def claim(self, worker: str, limit: int = 1) -> ty.List[Unit]:
+        """
+        Lease up to ``limit`` pending units, or units whose lease expired, to ``worker``.
+        """
+        table = self.table
+        expired = sa.and_(table.c.status == self.RUNNING, table.c.lease_until < sa.func.now())
+        # a unit whose workers keep dying with it is given up like one that keeps failing
+        give_up = sa.update(table).where(expired, table.c.attempts >= self.max_attempts).values(
+            status=self.FAILED, error='Lease expired %d times' % self.max_attempts, lease_until=None,
+            updated_at=sa.func.now())
+
+        claimable = sa.select(table.c.id).where(
+            sa.or_(table.c.status == self.PENDING, expired)
+        ).order_by(table.c.id).limit(limit).with_for_update(skip_locked=True)
+
+        stmt = sa.update(table).where(table.c.id.in_(claimable.scalar_subquery())).values(
+            status=self.RUNNING, worker=worker, attempts=table.c.attempts + 1, lease_until=self.lease,
+            error=None, updated_at=sa.func.now(),
+        ).returning(table.c.district, table.c.report_year, table.c.report_month, table.c.attempts)
+
+        with self.engine.begin() as conn:
+            conn.execute(give_up)
+            claimed = conn.execute(stmt).all()
+
+        units = list()
+        for district, year, month, attempts in claimed:
+            if attempts > 1:
+                logger.info('claimed again, attempt %d: %s-%s-%s', attempts, district, year, month)
+            units.append(dict(district=int(district) if district.isdigit() else district, year=year, month=month))
+        return units
+
+    def heartbeat(self, worker: str) -> int:
+        """
+        Renew the leases of every unit ``worker`` is running, returns their number.
+        """
+        table = self.table
+        stmt = sa.update(table).where(table.c.worker == worker, table.c.status == self.RUNNING).values(
+            lease_until=self.lease, updated_at=sa.func.now())
+
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).rowcount
+
+    @contextlib.contextmanager
+    def heartbeats(self, worker: str, interval: float | None = None) -> ty.Iterator[None]:
+        """
+        Renew the leases of ``worker`` in the background, three times per lease by default.
+        """
+        stop = threading.Event()
+        interval = interval or self.lease_seconds / 3
+
+        def beat():
+            while not stop.wait(interval):
+                try:
+                    self.heartbeat(worker)
+                except Exception as e:  # the next beat may get through, the lease lasts longer
+                    logger.warning('heartbeat failed: %s: %s', type(e).__name__, e)
+
+        thread = threading.Thread(target=beat, name='dpr-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _held(self, unit: Unit, worker: str) -> sa.ColumnElement[bool]:
+        table = self.table
+        return sa.and_(self._key(unit), table.c.worker == worker, table.c.status == self.RUNNING)
+
+    def done(self, unit: Unit, worker: str, rows: int | None = None) -> bool:
+        """
+        Mark the unit ``worker`` runs done. Returns ``False`` when the worker lost it, its
+        lease expired and another worker claimed it, which is left alone.
+        """
+        with self.engine.begin() as conn:
+            updated = conn.execute(sa.update(self.table).where(self._held(unit, worker)).values(
+                status=self.DONE, rows=rows, lease_until=None, updated_at=sa.func.now())).rowcount
+
+        if not updated:
+            logger.warning('%s no longer holds %s, not marked done', worker, unit)
+        return bool(updated)
+
+    def failed(self, unit: Unit, worker: str, error: BaseException | str) -> bool:
+        """
+        Queue the unit ``worker`` runs again, or give up on it once it failed ``max_attempts``
+        times. Returns ``False`` when the worker lost it, like ``done``.
+        """
+        if isinstance(error, BaseException):
+            error = '%s: %s' % (type(error).__name__, error)
+
+        table = self.table
+        status = sa.case((table.c.attempts < self.max_attempts, self.PENDING), else_=self.FAILED)
+        with self.engine.begin() as conn:
+            updated = conn.execute(sa.update(table).where(self._held(unit, worker)).values(
+                status=status, error=error, lease_until=None, updated_at=sa.func.now())).rowcount
+
+        if not updated:
+            logger.warning('%s no longer holds %s, not marked failed', worker, unit)
+        return bool(updated)
+
+    def drained(self) -> bool:
+        """
+        Whether no unit is pending or running anymore.
+        """
+        table = self.table
+        stmt = sa.select(sa.exists().where(table.c.status.in_((self.PENDING, self.RUNNING))))
+
+        with self.engine.connect() as conn:
+            return not conn.execute(stmt).scalar()
+
+    def summary(self) -> ty.Dict[str, ty.Dict[str, int]]:
+        """
+        Units, attempts and rows per status.
+        """
+        table = self.table
+        stmt = sa.select(table.c.status, sa.func.count(), sa.func.sum(table.c.attempts),
+                         sa.func.sum(table.c.rows)).group_by(table.c.status)
+
+        with self.engine.connect() as conn:
+            return {status: dict(units=units, attempts=int(attempts or 0), rows=int(rows or 0))
+                    for status, units, attempts, rows in conn.execute(stmt)}
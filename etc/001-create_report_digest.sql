@@ -0,0 +1,11 @@
+create table if not exists report_digest
+(
+    district     character varying(8)  not null,
+    report_year  integer               not null,
+    report_month integer               not null,
+    digest       character varying(64) not null,
+    rows         integer               not null default 0,
+    updated_at   timestamptz           not null default current_timestamp,
+
+    primary key (district, report_year, report_month)
+);
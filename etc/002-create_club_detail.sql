@@ -0,0 +1,18 @@
+create table if not exists club_detail
+(
+    club         integer              primary key,
+    name         character varying             default null,
+    address      character varying[]           default null,
+    district     character varying(8)          default null,
+    division     character varying(8)          default null,
+    area         character varying(8)          default null,
+    meeting_day  smallint                      default null,
+    time_begin   character varying(8)          default null,
+    time_end     character varying(8)          default null,
+    lat          double precision              default null,
+    lon          double precision              default null,
+    lat_local    double precision              default null,
+    lon_local    double precision              default null,
+    error        character varying             default null,
+    fetched_at   timestamptz          not null default current_timestamp
+);
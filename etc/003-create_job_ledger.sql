@@ -0,0 +1,18 @@
+create table if not exists job_ledger
+(
+    district     character varying(8)  not null,
+    report_year  integer               not null,
+    report_month integer               not null,
+    status       character varying(16) not null,
+    attempts     integer               not null default 0,
+    bytes        bigint                         default null,
+    rows         integer                        default null,
+    seconds      double precision               default null,
+    error        character varying              default null,
+    started_at   timestamptz                    default null,
+    updated_at   timestamptz           not null,
+
+    primary key (district, report_year, report_month)
+);
+
+create index if not exists job_ledger_status on job_ledger (status);
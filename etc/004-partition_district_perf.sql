@@ -0,0 +1,62 @@
+-- district_perf becomes range partitioned by report_year, one partition per program year
+-- named district_perf_y<year>. Existing rows are moved into the partitions of their years,
+-- partitions of new years are attached by the exporter before it loads them.
+alter table district_perf rename to district_perf_heap;
+alter table district_perf_heap rename constraint district_pref_uniq to district_perf_heap_uniq;
+alter table district_perf_heap rename constraint district_perf_pkey to district_perf_heap_pkey;
+alter sequence district_perf_id_seq owned by none;
+
+create table district_perf
+(
+    id                   integer              not null default nextval('district_perf_id_seq'),
+    report_year          integer              not null,
+    report_month         integer              not null,
+    district             character varying(8) not null,
+    division             character varying(8) not null,
+    area                 character varying(8) not null,
+    club                 integer              not null,
+    club_name            character varying    not null,
+    new_members          integer              not null default 0,
+    late_renewals        integer              not null default 0,
+    oct_renewals         integer              not null default 0,
+    apr_renewals         integer              not null default 0,
+    total_renewals       integer              not null default 0,
+    total_chart          integer              not null default 0,
+    total_to_date        integer              not null default 0,
+    distinguished_status character varying(8),
+    charter_suspend_date character varying             default null,
+    charter_date         date                          default null,
+    suspend_date         date                          default null,
+    updated_at           timestamptz          not null default current_timestamp,
+
+    -- unique keys of a partitioned table must contain the partition key
+    constraint "district_perf_pkey" primary key (id, report_year),
+    constraint "district_pref_uniq" unique (report_year, report_month, club)
+) partition by range (report_year);
+
+alter sequence district_perf_id_seq owned by district_perf.id;
+
+do
+$$
+    declare
+        year integer;
+    begin
+        for year in select distinct report_year from district_perf_heap order by 1
+            loop
+                execute format('create table %I partition of district_perf for values from (%s) to (%s)',
+                               'district_perf_y' || year, year, year + 1);
+            end loop;
+    end
+$$;
+
+insert into district_perf (id, report_year, report_month, district, division, area, club, club_name,
+                           new_members, late_renewals, oct_renewals, apr_renewals, total_renewals, total_chart,
+                           total_to_date, distinguished_status, charter_suspend_date, charter_date, suspend_date,
+                           updated_at)
+select id, report_year, report_month, district, division, area, club, club_name,
+       new_members, late_renewals, oct_renewals, apr_renewals, total_renewals, total_chart,
+       total_to_date, distinguished_status, charter_suspend_date, charter_date, suspend_date,
+       updated_at
+from district_perf_heap;
+
+drop table district_perf_heap;
@@ -0,0 +1,8 @@
+-- Reports by district, division and area over many periods are answered from the index alone,
+-- created on every partition, present and future.
+create index if not exists district_perf_district_period on district_perf
+    (district, division, area, report_year, report_month)
+    include (club, new_members, total_renewals, total_to_date, distinguished_status);
+
+-- updated_at grows with the load order, a BRIN index finds recent changes at a tiny size.
+create index if not exists district_perf_updated_at on district_perf using brin (updated_at);
@@ -0,0 +1,20 @@
+create table if not exists work_queue
+(
+    id           bigserial primary key,
+    district     character varying(8)  not null,
+    report_year  integer               not null,
+    report_month integer               not null,
+    status       character varying(16) not null default 'pending',
+    attempts     integer               not null default 0,
+    worker       character varying              default null,
+    lease_until  timestamptz                    default null,
+    rows         integer                        default null,
+    error        character varying              default null,
+    enqueued_at  timestamptz           not null default current_timestamp,
+    updated_at   timestamptz           not null default current_timestamp,
+
+    constraint "work_queue_unit" unique (district, report_year, report_month)
+);
+
+-- workers look for pending units and expired leases only
+create index if not exists work_queue_claimable on work_queue (id) where status in ('pending', 'running');
@@ -0,0 +1,55 @@
+-- Totals of district_perf per area, division and district of every report period, kept up to
+-- date by the exporter when `rollups` is enabled, backfilled by `python -m dpr_export rollups`.
+create table if not exists district_perf_area
+(
+    report_year              integer              not null,
+    report_month             integer              not null,
+    district                 character varying(8) not null,
+    division                 character varying(8) not null,
+    area                     character varying(8) not null,
+    clubs                    integer              not null default 0,
+    new_members              integer              not null default 0,
+    total_renewals           integer              not null default 0,
+    total_to_date            integer              not null default 0,
+    distinguished            integer              not null default 0,
+    select_distinguished     integer              not null default 0,
+    presidents_distinguished integer              not null default 0,
+    updated_at               timestamptz          not null default current_timestamp,
+
+    primary key (report_year, report_month, district, division, area)
+);
+
+create table if not exists district_perf_division
+(
+    report_year              integer              not null,
+    report_month             integer              not null,
+    district                 character varying(8) not null,
+    division                 character varying(8) not null,
+    clubs                    integer              not null default 0,
+    new_members              integer              not null default 0,
+    total_renewals           integer              not null default 0,
+    total_to_date            integer              not null default 0,
+    distinguished            integer              not null default 0,
+    select_distinguished     integer              not null default 0,
+    presidents_distinguished integer              not null default 0,
+    updated_at               timestamptz          not null default current_timestamp,
+
+    primary key (report_year, report_month, district, division)
+);
+
+create table if not exists district_perf_district
+(
+    report_year              integer              not null,
+    report_month             integer              not null,
+    district                 character varying(8) not null,
+    clubs                    integer              not null default 0,
+    new_members              integer              not null default 0,
+    total_renewals           integer              not null default 0,
+    total_to_date            integer              not null default 0,
+    distinguished            integer              not null default 0,
+    select_distinguished     integer              not null default 0,
+    presidents_distinguished integer              not null default 0,
+    updated_at               timestamptz          not null default current_timestamp,
+
+    primary key (report_year, report_month, district)
+);